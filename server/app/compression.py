@@ -0,0 +1,314 @@
+"""
+This module implements the compression of responses, negotiated with the
+Accept-Encoding header of requests: bodies of responses are compressed with brotli,
+when the brotli package is installed, or gzip. Static files are served from
+precompressed .br and .gz files, when they exist next to the original files.
+"""
+import asyncio
+import gzip
+import os
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Tuple
+from urllib.parse import unquote
+
+from blacksheep import Request, Response
+from blacksheep.common.files.asyncfs import FilesHandler
+from blacksheep.common.files.pathsutils import get_mime_type_from_name
+from blacksheep.contents import Content, StreamedContent
+from blacksheep.server.application import Application
+from blacksheep.server.files import get_file_getter
+
+from domain.settings import Settings
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+
+Handler = Callable[[Request], Awaitable[Response]]
+
+# content types of responses that are compressed by default
+DEFAULT_COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+    "text/",
+)
+
+# bodies bigger than this are compressed in a thread, not to block the event loop
+EXECUTOR_MIN_SIZE = 256 * 1024
+
+# compression levels that favour speed, since responses are compressed on the fly
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def gzip_compress(data: bytes) -> bytes:
+    return gzip.compress(data, compresslevel=GZIP_LEVEL)
+
+
+def brotli_compress(data: bytes) -> bytes:
+    return brotli.compress(data, quality=BROTLI_QUALITY)
+
+
+def get_supported_encodings() -> Dict[str, Callable[[bytes], bytes]]:
+    # ordered by preference, when clients accept more encodings with the same weight
+    encodings: Dict[str, Callable[[bytes], bytes]] = {}
+
+    if brotli is not None:
+        encodings["br"] = brotli_compress
+
+    encodings["gzip"] = gzip_compress
+    return encodings
+
+
+def get_mime_type(file_path: str) -> bytes:
+    return get_mime_type_from_name(file_path).encode()
+
+
+# extensions of precompressed files, by encoding
+SIDECAR_EXTENSIONS = {"br": ".br", "gzip": ".gz"}
+
+
+def parse_accept_encoding(value: str) -> Dict[str, float]:
+    """
+    Returns the weights of the encodings listed in the value of an Accept-Encoding
+    header, for example: "gzip, deflate, br;q=0.5".
+    """
+    weights: Dict[str, float] = {}
+
+    for part in value.split(","):
+        encoding, _, parameters = part.partition(";")
+        encoding = encoding.strip().lower()
+
+        if not encoding:
+            continue
+
+        weight = 1.0
+        parameter = parameters.strip()
+
+        if parameter.startswith("q="):
+            try:
+                weight = float(parameter[2:])
+            except ValueError:
+                weight = 0.0
+
+        weights[encoding] = weight
+
+    return weights
+
+
+def select_encoding(
+    request: Request, encodings: Iterable[str]
+) -> Optional[Tuple[str, float]]:
+    """
+    Returns the encoding with the highest weight in the Accept-Encoding header of
+    the given request, among the given encodings, or None if none is accepted.
+    """
+    header = request.get_first_header(b"Accept-Encoding")
+
+    if not header:
+        return None
+
+    weights = parse_accept_encoding(header.decode())
+    default_weight = weights.get("*", 0.0)
+    selected: Optional[Tuple[str, float]] = None
+
+    for encoding in encodings:
+        weight = weights.get(encoding, default_weight)
+
+        if weight > 0 and (selected is None or weight > selected[1]):
+            selected = (encoding, weight)
+
+    return selected
+
+
+def add_vary_header(response: Response) -> None:
+    """
+    Tells caches that the response depends on the Accept-Encoding header, which is
+    required also for responses that are not compressed, when they could be.
+    """
+    for header in response.get_headers(b"Vary"):
+        values = {value.strip().lower() for value in header.split(b",")}
+
+        if b"accept-encoding" in values or b"*" in values:
+            return
+
+    response.add_header(b"Vary", b"Accept-Encoding")
+
+
+def set_encoding_headers(response: Response, encoding: str) -> None:
+    response.add_header(b"Content-Encoding", encoding.encode())
+    add_vary_header(response)
+
+    etag = response.get_first_header(b"ETag")
+
+    # a strong entity tag identifies a specific representation: compressed bodies
+    # keep the same entity tag as a weak one, matched by If-None-Match anyway
+    if etag and etag.startswith(b'"'):
+        response.set_header(b"ETag", b"W/" + etag)
+
+
+class CompressionMiddleware:
+    """
+    Middleware compressing the bodies of responses, when clients accept a supported
+    encoding, bodies are bigger than a minimum size and their content type is
+    allowed. Streamed responses, like archives of folders, are not compressed.
+    """
+
+    def __init__(
+        self,
+        min_size: int = 1024,
+        content_types: Iterable[str] = DEFAULT_COMPRESSIBLE_TYPES,
+        executor_min_size: int = EXECUTOR_MIN_SIZE,
+    ) -> None:
+        self._min_size = min_size
+        self._content_types = tuple(
+            content_type.encode() for content_type in content_types
+        )
+        self._executor_min_size = executor_min_size
+        self._encodings = get_supported_encodings()
+
+    def _is_negotiable(self, response: Response) -> bool:
+        content = response.content
+
+        return (
+            content is not None
+            and response.status == 200
+            and content.body is not None
+            and not response.has_header(b"Content-Encoding")
+            and content.type.lower().startswith(self._content_types)
+        )
+
+    async def __call__(self, request: Request, handler: Handler) -> Response:
+        response = await handler(request)
+
+        if not self._is_negotiable(response):
+            return response
+
+        # responses of compressible types vary by encoding, even when they are not
+        # compressed for the current request
+        add_vary_header(response)
+
+        if len(response.content.body) < self._min_size:
+            return response
+
+        selected = select_encoding(request, self._encodings)
+
+        if selected is None:
+            return response
+
+        encoding = selected[0]
+        compress = self._encodings[encoding]
+        content = response.content
+        body = content.body
+
+        if len(body) >= self._executor_min_size:
+            body = await asyncio.get_event_loop().run_in_executor(None, compress, body)
+        else:
+            body = compress(body)
+
+        response.content = Content(content.type, body)
+        set_encoding_headers(response, encoding)
+        return response
+
+
+class PrecompressedFilesMiddleware:
+    """
+    Middleware serving precompressed versions of static files, served by
+    `app.serve_files`, from sidecar files with .br and .gz extensions.
+    """
+
+    def __init__(
+        self,
+        source_folder: str,
+        index_document: str = "index.html",
+        fallback_document: Optional[str] = None,
+    ) -> None:
+        self._source_folder = os.path.abspath(source_folder)
+        self._index_document = index_document
+        self._fallback_document = fallback_document
+        self._files_handler = FilesHandler()
+        # serving precompressed files doesn't require the brotli package
+        self._encodings = list(SIDECAR_EXTENSIONS)
+
+    def _get_file_path(self, tail: str) -> Optional[str]:
+        # resolves the file served for a path, like the handler of static files
+        path = os.path.abspath(os.path.join(self._source_folder, tail))
+
+        if path != self._source_folder and not path.startswith(
+            self._source_folder + os.sep
+        ):
+            return None
+
+        if os.path.isdir(path):
+            path = os.path.join(path, self._index_document)
+
+        if os.path.isfile(path):
+            return path
+
+        if self._fallback_document is not None:
+            return os.path.join(self._source_folder, self._fallback_document)
+
+        return None
+
+    async def __call__(self, request: Request, handler: Handler) -> Response:
+        response = await handler(request)
+        route_values = request.route_values or {}
+
+        # only full responses of the route of static files are handled
+        if (
+            "tail" not in route_values
+            or request.method != "GET"
+            or response.status != 200
+            or response.content is None
+            or response.has_header(b"Content-Range")
+        ):
+            return response
+
+        file_path = self._get_file_path(unquote(route_values["tail"]).lstrip("/"))
+
+        # files with extensions that are not served are replaced by the fallback
+        # document: the content type tells whether the resolved file was served
+        if file_path is None or response.content.type != get_mime_type(file_path):
+            return response
+
+        accepted = [
+            encoding
+            for encoding in self._encodings
+            if os.path.isfile(file_path + SIDECAR_EXTENSIONS[encoding])
+        ]
+        selected = select_encoding(request, accepted)
+
+        if accepted:
+            add_vary_header(response)
+
+        if selected is None:
+            return response
+
+        encoding = selected[0]
+        sidecar_path = file_path + SIDECAR_EXTENSIONS[encoding]
+
+        response.content = StreamedContent(
+            response.content.type,
+            get_file_getter(
+                self._files_handler, sidecar_path, os.path.getsize(sidecar_path)
+            ),
+        )
+        # ranges of bytes would refer to the compressed file
+        response.remove_header(b"Accept-Ranges")
+        set_encoding_headers(response, encoding)
+        return response
+
+
+def configure_compression(app: Application, settings: Settings) -> None:
+    app.middlewares.append(
+        CompressionMiddleware(
+            settings.compression_min_size,
+            settings.compression_types or DEFAULT_COMPRESSIBLE_TYPES,
+        )
+    )
+    app.middlewares.append(
+        PrecompressedFilesMiddleware("app/static", fallback_document="index.html")
+    )
@@ -0,0 +1,52 @@
+"""
+This module implements conditional GET requests: responses include the entity tag
+of their content, and requests with a matching If-None-Match header are answered
+with 304 Not Modified, without reading and serializing the content.
+"""
+from typing import Any, Awaitable, Callable, Optional, TypeVar
+
+from blacksheep import Request, Response
+from blacksheep.server.responses import json
+
+from core.etags import etag_matches
+
+T = TypeVar("T")
+
+
+def get_not_modified_response(etag: str) -> Response:
+    return Response(
+        304, [(b"ETag", etag.encode()), (b"Cache-Control", b"no-cache")], None
+    )
+
+
+async def get_conditional_response(
+    request: Request,
+    get_content: Callable[[], Awaitable[T]],
+    get_etag: Callable[[T], str],
+    get_current_etag: Optional[Callable[[], Awaitable[str]]] = None,
+) -> Response:
+    """
+    Returns a JSON response with the given content and its entity tag, or a 304
+    Not Modified response if the request's If-None-Match header matches the
+    current entity tag, obtained with `get_current_etag` if possible, which should
+    be cheaper than reading the content.
+    """
+    if_none_match = request.get_first_header(b"If-None-Match")
+
+    if if_none_match and get_current_etag is not None:
+        current_etag = await get_current_etag()
+
+        if etag_matches(if_none_match.decode(), current_etag):
+            return get_not_modified_response(current_etag)
+
+    content: Any = await get_content()
+    etag = get_etag(content)
+
+    if if_none_match and etag_matches(if_none_match.decode(), etag):
+        return get_not_modified_response(etag)
+
+    response = json(content)
+    response.add_header(b"ETag", etag.encode())
+    # clients must revalidate cached responses, which is cheap
+    response.add_header(b"Cache-Control", b"no-cache")
+    return response
@@ -1,21 +1,26 @@
-from typing import List
+from typing import List, Optional
 from uuid import UUID
 
-from blacksheep import Response
+from blacksheep import Request, Response
 from blacksheep.server.authorization import auth
+from blacksheep.server.bindings import FromJSON
 from blacksheep.server.controllers import ApiController, get, post
 
+from app.conditional import get_conditional_response
 from app.decorators.cachecontrol import cache_control
 from domain import Roles
 from domain.albums import (
     Album,
+    AlbumChangesPage,
     AlbumsHandler,
     ContainerReadAuthContext,
     CreateAlbumInput,
     DownloadURL,
+    NodeDownloadURL,
     UpdateAlbumInput,
+    get_albums_etag,
 )
-from domain.vfs import FileSystemNode
+from domain.vfs import DEFAULT_NODES_PAGE_SIZE, NodesPage, get_nodes_etag
 
 
 class AlbumsController(ApiController):
@@ -29,18 +34,26 @@ class AlbumsController(ApiController):
         return "albums"
 
     @get("/")
-    async def get_albums(self) -> List[Album]:
+    async def get_albums(self, request: Request) -> Response:
         """
-        Gets the list of albums configured in the system.
+        Gets the list of albums configured in the system. Supports conditional
+        requests with If-None-Match.
         """
-        return await self.manager.get_albums()
+        return await get_conditional_response(
+            request, self.manager.get_albums, get_albums_etag
+        )
 
     @get("/:album_id")
-    async def get_album_details(self, album_id: UUID) -> Album:
+    async def get_album_details(self, request: Request, album_id: UUID) -> Response:
         """
-        Gets details about an album, by its id.
+        Gets details about an album, by its id. Supports conditional requests with
+        If-None-Match.
         """
-        return await self.manager.get_album(album_id)
+        return await get_conditional_response(
+            request,
+            lambda: self.manager.get_album(album_id),
+            lambda album: get_albums_etag([album]),
+        )
 
     @auth(Roles.ADMIN)
     @post("/:album_id")
@@ -61,11 +74,59 @@ class AlbumsController(ApiController):
         return await self.manager.get_album_container_context(album_id)
 
     @get("/:album_id/nodes")
-    async def get_album_nodes(self, album_id: UUID) -> List[FileSystemNode]:
+    async def get_album_nodes(self, request: Request, album_id: UUID) -> Response:
         """
-        Gets the list of root folders of an album, by id.
+        Gets the list of root folders of an album, by id. Supports conditional
+        requests with If-None-Match.
         """
-        return await self.manager.get_album_nodes(album_id)
+        return await get_conditional_response(
+            request,
+            lambda: self.manager.get_album_nodes(album_id),
+            get_nodes_etag,
+            lambda: self.manager.get_current_album_nodes_etag(album_id),
+        )
+
+    @get("/:album_id/tree")
+    async def get_album_tree(self, request: Request, album_id: UUID) -> Response:
+        """
+        Gets all nodes of an album in a single response, in a columnar format:
+        the properties of the node at index i are at index i of each list, and
+        `parents` contains the index of the parent of each node, or -1 for root
+        nodes. Supports conditional requests with If-None-Match.
+        """
+        return await get_conditional_response(
+            request,
+            lambda: self.manager.get_album_tree(album_id),
+            lambda tree: tree.etag,
+            lambda: self.manager.get_current_album_tree_etag(album_id),
+        )
+
+    @get("/:album_id/changes")
+    async def get_album_changes(
+        self, album_id: UUID, since: Optional[str] = None
+    ) -> AlbumChangesPage:
+        """
+        Gets the changes of the nodes of an album following the token returned by
+        the previous request. Without `since`, returns only a token: clients should
+        obtain it before reading the album, then apply the changes that follow.
+        When `reset` is true, changes were deleted and the album must be read again.
+        """
+        return await self.manager.get_album_changes(album_id, since)
+
+    @get("/:album_id/nodes/page")
+    async def get_album_nodes_page(
+        self,
+        album_id: UUID,
+        page_size: int = DEFAULT_NODES_PAGE_SIZE,
+        continuation_token: Optional[str] = None,
+    ) -> NodesPage:
+        """
+        Gets a page of the root nodes of an album, by id. The next page is obtained
+        passing the continuation token of the previous page.
+        """
+        return await self.manager.get_album_nodes_page(
+            album_id, page_size, continuation_token
+        )
 
     @auth(Roles.ADMIN)
     @post("/")
@@ -86,3 +147,13 @@ class AlbumsController(ApiController):
         including a temporary access token to authorize the download.
         """
         return DownloadURL(url=await self.manager.get_file_url(node_id))
+
+    @post("/files")
+    async def download_files(
+        self, node_ids: FromJSON[List[UUID]]
+    ) -> List[NodeDownloadURL]:
+        """
+        Gets the download URLs of many files at once, including temporary access
+        tokens to authorize downloads. Nodes that are not found are omitted.
+        """
+        return await self.manager.get_files_urls(node_ids.value)
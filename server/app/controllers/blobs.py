@@ -3,13 +3,19 @@ from blacksheep.server.controllers import ApiController, post
 
 from domain import Roles
 from domain.blobs import BlobsHandler, InitializeUploadInput, InitializeUploadOutput
+from domain.uploads import (
+    InitializeUploadsInput,
+    InitializeUploadsOutput,
+    UploadsHandler,
+)
 
 
 class BlobsController(ApiController):
-    def __init__(self, manager: BlobsHandler) -> None:
+    def __init__(self, manager: BlobsHandler, uploads: UploadsHandler) -> None:
         super().__init__()
 
         self.manager = manager
+        self.uploads = uploads
 
     @classmethod
     def class_name(cls) -> str:
@@ -25,3 +31,18 @@ class BlobsController(ApiController):
         access token that can be used to upload the file directly to Blob Storage.
         """
         return await self.manager.initialize_upload(data)
+
+    @auth(Roles.ADMIN)
+    @post("/initialize-uploads")
+    async def initialize_uploads(
+        self, data: InitializeUploadsInput
+    ) -> InitializeUploadsOutput:
+        """
+        Initializes the upload of many files at once, from a manifest of file names,
+        sizes, types and optional content hashes, providing temporary access tokens
+        for all of them. Optionally, nodes are stored for the files being uploaded:
+        pictures are then processed when uploads are completed, see
+        `/api/nodes/process-pictures`. When content deduplication is enabled, files
+        already stored in the album are marked as uploaded, and get no token.
+        """
+        return await self.uploads.initialize_uploads(data)
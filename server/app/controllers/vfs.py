@@ -1,36 +1,59 @@
-from typing import List
+from typing import List, Optional
 from uuid import UUID
 
-from blacksheep import Response
+from blacksheep import Request, Response
 from blacksheep.server.bindings import FromJSON
 from blacksheep.server.controllers import ApiController, delete, get, patch, post
+from blacksheep.server.responses import file
 
+from app.conditional import get_conditional_response
+from domain.archives import ArchivesHandler
 from domain.vfs import (
+    DEFAULT_NODES_PAGE_SIZE,
     CopyOperationInput,
     CreateNodeInput,
     FileSystemHandler,
     FileSystemNode,
     FileSystemNodePathFragment,
+    NodesPage,
     UpdateNodeInput,
+    get_node_etag,
+    get_nodes_etag,
 )
 
 
 class VirtualFileSystemController(ApiController):
-    def __init__(self, manager: FileSystemHandler) -> None:
+    def __init__(self, manager: FileSystemHandler, archives: ArchivesHandler) -> None:
         super().__init__()
 
         self.manager = manager
+        self.archives = archives
 
     @classmethod
     def class_name(cls) -> str:
         return "nodes"
 
     @get("/:node_id")
-    async def get_node(self, node_id: UUID) -> FileSystemNode:
+    async def get_node(self, request: Request, node_id: UUID) -> Response:
         """
-        Gets a single node.
+        Gets a single node, with its children if it is a folder. Supports
+        conditional requests with If-None-Match.
         """
-        return await self.manager.get_node(node_id)
+        return await get_conditional_response(
+            request,
+            lambda: self.manager.get_node(node_id),
+            get_node_etag,
+            lambda: self.manager.get_current_node_etag(node_id),
+        )
+
+    @get("/:node_id/archive")
+    async def download_archive(self, node_id: UUID) -> Response:
+        """
+        Downloads a ZIP archive with all files of a folder and its subfolders, or
+        with a single file. Files are streamed from storage into the archive.
+        """
+        archive = await self.archives.get_archive(node_id)
+        return file(archive.read, "application/zip", file_name=archive.name)
 
     @patch("/:node_id")
     async def update_node(
@@ -63,12 +86,34 @@ class VirtualFileSystemController(ApiController):
     @get("/:node_id/nodes")
     async def get_node_children(
         self,
+        request: Request,
         node_id: UUID,
-    ) -> List[FileSystemNode]:
+    ) -> Response:
         """
-        Gets the children of a given node, by its id.
+        Gets the children of a given node, by its id. Supports conditional requests
+        with If-None-Match.
         """
-        return await self.manager.get_node_children(node_id)
+        return await get_conditional_response(
+            request,
+            lambda: self.manager.get_node_children(node_id),
+            get_nodes_etag,
+            lambda: self.manager.get_current_node_children_etag(node_id),
+        )
+
+    @get("/:node_id/nodes/page")
+    async def get_node_children_page(
+        self,
+        node_id: UUID,
+        page_size: int = DEFAULT_NODES_PAGE_SIZE,
+        continuation_token: Optional[str] = None,
+    ) -> NodesPage:
+        """
+        Gets a page of the children of a given node, by its id. The next page is
+        obtained passing the continuation token of the previous page.
+        """
+        return await self.manager.get_node_children_page(
+            node_id, page_size, continuation_token
+        )
 
     @get("/:node_id/path")
     async def get_node_path(
@@ -87,6 +132,16 @@ class VirtualFileSystemController(ApiController):
         """
         return await self.manager.create_nodes(data)
 
+    @post("/process-pictures")
+    async def process_pictures(
+        self, node_ids: FromJSON[List[UUID]]
+    ) -> List[FileSystemNode]:
+        """
+        Processes the pictures of nodes created before their files were uploaded,
+        once their uploads are completed.
+        """
+        return await self.manager.process_pictures(node_ids.value)
+
     @post("/move")
     async def move_nodes(self, data: CopyOperationInput) -> List[FileSystemNode]:
         """
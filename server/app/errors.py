@@ -16,7 +16,12 @@ from essentials.exceptions import (
 )
 from sqlalchemy.exc import IntegrityError
 
-from core.errors import AcceptedExceptionWithData, ConflictError, PreconfitionFailed
+from core.errors import (
+    AcceptedExceptionWithData,
+    ConflictError,
+    PreconfitionFailed,
+    TooManyRequestsError,
+)
 
 
 def configure_error_handlers(app: Application) -> None:
@@ -64,6 +69,13 @@ def configure_error_handlers(app: Application) -> None:
             status=412,
         )
 
+    async def too_many_requests(
+        app: Application, request: Request, exc: Exception
+    ) -> Response:
+        response = json({"error": str(exc)}, status=429)
+        response.add_header(b"Retry-After", b"30")
+        return response
+
     app.exceptions_handlers.update(
         {
             ObjectNotFound: not_found_handler,
@@ -76,5 +88,6 @@ def configure_error_handlers(app: Application) -> None:
             ConflictError: conflict,
             IntegrityError: conflict,
             PreconfitionFailed: precondition_failed,
+            TooManyRequestsError: too_many_requests,
         }
     )
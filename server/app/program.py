@@ -11,10 +11,12 @@ from app.security.httpsmiddleware import HSTSMiddleware
 from domain.settings import Settings
 
 from .auth import configure_auth
+from .compression import configure_compression
 from .di import dependency_injection_middleware
 from .docs import docs
 from .errors import configure_error_handlers
 from .logs import configure_logging
+from .serialization import configure_json
 from .services import configure_services
 
 
@@ -37,6 +39,7 @@ def build_app() -> Application:
     )
 
     configure_services(app, settings)
+    configure_json(settings)
     configure_logging(app, settings)
 
     app.middlewares.append(dependency_injection_middleware)
@@ -49,6 +52,9 @@ def build_app() -> Application:
     configure_auth(app, settings)
     configure_error_handlers(app)
 
+    if settings.compression:
+        configure_compression(app, settings)
+
     ensure_folder("app/static")
     app.serve_files("app/static", fallback_document="index.html", allow_anonymous=True)
 
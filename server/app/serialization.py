@@ -0,0 +1,56 @@
+"""
+This module configures an optional JSON serializer for requests and responses,
+based on orjson, which serializes dataclasses, UUIDs, times and enums natively.
+Other objects are handled by encoders selected once per type.
+"""
+from base64 import urlsafe_b64encode
+from datetime import timedelta
+from decimal import Decimal
+from typing import Any, Callable, Dict, Type
+
+import orjson
+from blacksheep.plugins import json as json_plugin
+from pydantic import BaseModel
+
+from domain.settings import Settings
+
+Encoder = Callable[[Any], Any]
+
+_encoders: Dict[Type, Encoder] = {}
+
+
+def get_encoder(obj_type: Type) -> Encoder:
+    """
+    Returns a function that converts objects of the given type to values that
+    orjson can serialize, consistently with the default serializer of BlackSheep.
+    """
+    if issubclass(obj_type, BaseModel):
+        return lambda obj: obj.dict()
+    if issubclass(obj_type, Decimal):
+        return str
+    if issubclass(obj_type, timedelta):
+        return lambda obj: obj.total_seconds()
+    if issubclass(obj_type, bytes):
+        return lambda obj: urlsafe_b64encode(obj).decode()
+
+    raise TypeError(f"Type is not JSON serializable: {obj_type.__name__}")
+
+
+def default(obj: Any) -> Any:
+    obj_type = type(obj)
+
+    try:
+        encoder = _encoders[obj_type]
+    except KeyError:
+        encoder = _encoders[obj_type] = get_encoder(obj_type)
+
+    return encoder(obj)
+
+
+def dumps(obj: Any) -> str:
+    return orjson.dumps(obj, default=default, option=orjson.OPT_NON_STR_KEYS).decode()
+
+
+def configure_json(settings: Settings) -> None:
+    if settings.fast_json:
+        json_plugin.use(loads=orjson.loads, dumps=dumps)
@@ -11,8 +11,10 @@ from blacksheepsqlalchemy import use_sqlalchemy
 
 from core.events import ServicesRegistrationContext
 from data.azstorage.services import register_storage_blob, use_storage_table
+from data.queues.services import register_pictures_queue
 from data.sql.services import register_sql_services
 from domain.context import register_user_services
+from domain.picturespipeline import PicturesPipeline
 from domain.services import register_handlers
 from domain.settings import Settings
 
@@ -23,17 +25,36 @@ def configure_services(app: Application, settings: Settings) -> None:
 
     container.add_instance(settings)
 
-    register_handlers(container, context)
+    register_handlers(container, context, settings)
+
+    if settings.background_pictures_processing:
+        # configured first, so the pipeline is stopped before other services
+        configure_pictures_pipeline(app)
 
     if settings.db_connection_string:
         use_sqlalchemy(app, connection_string=settings.db_connection_string)
-        register_sql_services(container)
+        register_sql_services(container, settings)
     else:
         use_storage_table(app.services, settings, context)
 
-    register_storage_blob(container, settings)
+    register_storage_blob(container, settings, context)
 
     register_user_services(container)
 
+    register_pictures_queue(container, settings, context)
+
     app.on_start += context.initialize
     app.on_stop += context.dispose
+
+
+def configure_pictures_pipeline(app: Application) -> None:
+    # the pipeline is started after the application's services are built, because
+    # it resolves scoped services for each picture it processes
+    async def start_pipeline(app: Application) -> None:
+        await app.service_provider.get(PicturesPipeline).start(app.service_provider)
+
+    async def stop_pipeline(app: Application) -> None:
+        await app.service_provider.get(PicturesPipeline).stop()
+
+    app.after_start += start_pipeline
+    app.on_stop += stop_pipeline
@@ -0,0 +1,141 @@
+"""
+Compares the throughput of the blobs service between the legacy backend, which
+runs the synchronous Blob client in the default executor of the event loop, and
+the backend using the asynchronous Blob client with a shared pool of connections.
+
+By default, requests are sent to a minimal stand-in of the Blob service running in
+the same process, which replies after a fixed latency. To use Azurite instead,
+set the AZURITE_CONNECTION_STRING environment variable.
+"""
+import asyncio
+import os
+import time
+from typing import List
+
+import aiohttp
+from aiohttp import web
+from azure.core.pipeline.transport import AioHttpTransport
+from azure.storage.blob import BlobServiceClient as SyncBlobServiceClient
+from azure.storage.blob.aio import BlobServiceClient
+
+from core.pools import PoolClient
+from data.azstorage.blobs import AzureStorageBlobsService
+from domain.blobs import Container
+from tests.fakes import get_settings
+
+# well-known credentials of the storage emulator
+ACCOUNT_NAME = "devstoreaccount1"
+ACCOUNT_KEY = (
+    "Eby8vdM02xNOcqFlqUwJPLlmEtlCDXJ1OUzFT50uSRZ6IFsuFq2UVErCz4I6tq/"
+    "K1SZFPTOtr/KBHBeksoGMGw=="
+)
+PORT = 10999
+LATENCY = 0.02
+CONTAINERS = 20
+CONCURRENCY = [1, 10, 50, 200]
+
+LIST_CONTAINERS_RESPONSE = (
+    '<?xml version="1.0" encoding="utf-8"?>'
+    f'<EnumerationResults ServiceEndpoint="http://127.0.0.1:{PORT}/{ACCOUNT_NAME}/">'
+    "<Containers>"
+    + "".join(
+        f"<Container><Name>container-{i}</Name><Properties>"
+        "<Last-Modified>Sat, 01 Jan 2022 00:00:00 GMT</Last-Modified>"
+        '<Etag>"0x8D9CCA8F2C7B4E1"</Etag></Properties></Container>'
+        for i in range(CONTAINERS)
+    )
+    + "</Containers><NextMarker /></EnumerationResults>"
+)
+
+
+def get_connection_string() -> str:
+    return os.environ.get("AZURITE_CONNECTION_STRING") or (
+        "DefaultEndpointsProtocol=http;"
+        f"AccountName={ACCOUNT_NAME};AccountKey={ACCOUNT_KEY};"
+        f"BlobEndpoint=http://127.0.0.1:{PORT}/{ACCOUNT_NAME};"
+    )
+
+
+async def list_containers(request: web.Request) -> web.Response:
+    await asyncio.sleep(LATENCY)
+    return web.Response(
+        body=LIST_CONTAINERS_RESPONSE.encode(), content_type="application/xml"
+    )
+
+
+async def start_stand_in() -> web.AppRunner:
+    app = web.Application()
+    app.router.add_get(f"/{ACCOUNT_NAME}", list_containers)
+    app.router.add_get(f"/{ACCOUNT_NAME}/", list_containers)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", PORT).start()
+    return runner
+
+
+class LegacyBlobsService(PoolClient):
+    def __init__(self, blob_client: SyncBlobServiceClient) -> None:
+        super().__init__()
+        self.blob_client = blob_client
+
+    def _list_containers(self) -> List[Container]:
+        return [
+            Container(id=item.name, name=item.name, etag=item.etag)
+            for item in self.blob_client.list_containers()
+        ]
+
+    async def get_containers(self) -> List[Container]:
+        return await self.run(self._list_containers)
+
+
+async def measure(service, concurrency: int) -> float:
+    start = time.perf_counter()
+    results = await asyncio.gather(
+        *(service.get_containers() for _ in range(concurrency))
+    )
+    elapsed = time.perf_counter() - start
+    assert all(len(result) >= 1 for result in results)
+    return elapsed * 1000
+
+
+async def main() -> None:
+    runner = None
+
+    if not os.environ.get("AZURITE_CONNECTION_STRING"):
+        runner = await start_stand_in()
+
+    connection_string = get_connection_string()
+    legacy = LegacyBlobsService(
+        SyncBlobServiceClient.from_connection_string(connection_string)
+    )
+
+    settings = get_settings()
+    session = aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit=settings.blob_connections_limit)
+    )
+    blob_client = BlobServiceClient.from_connection_string(
+        connection_string,
+        transport=AioHttpTransport(session=session, session_owner=False),
+    )
+    pooled = AzureStorageBlobsService(blob_client, settings)
+
+    # warm up connections of both backends
+    await measure(legacy, 1)
+    await measure(pooled, 1)
+
+    print(f"{'concurrency':>11} {'legacy (ms)':>12} {'aio (ms)':>9}")
+
+    for concurrency in CONCURRENCY:
+        legacy_time = await measure(legacy, concurrency)
+        pooled_time = await measure(pooled, concurrency)
+        print(f"{concurrency:>11} {legacy_time:>12.1f} {pooled_time:>9.1f}")
+
+    await blob_client.close()
+    await session.close()
+
+    if runner is not None:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
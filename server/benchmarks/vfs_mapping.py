@@ -0,0 +1,143 @@
+"""
+Compares the time needed to read and map 100k nodes, between the previous
+mapping of nodes, which loaded ORM entities and parsed times with dateutil, and
+the lean mapping of the SQL and Table API providers.
+"""
+import asyncio
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, List
+from uuid import UUID
+
+from dateutil.parser import parse
+from sqlalchemy.sql.expression import select
+
+from data.azstorage.vfs import entity_to_image_data as table_image_data
+from data.azstorage.vfs import entity_to_node, node_to_entity
+from data.sql.dbmodel import NodeEntity
+from data.sql.mapping import get_uuid, map_optional_uuid
+from data.sql.vfs import SQLFileSystemDataProvider, entity_to_image_data
+from domain.vfs import FileSystemNode, FileSystemNodeType
+from tests.db import create_album, create_session, new_node
+
+NODES_COUNT = 100_000
+INSERT_BATCH_SIZE = 5000
+
+
+def legacy_node_entity_to_node(entity: NodeEntity) -> FileSystemNode:
+    return FileSystemNode(
+        id=get_uuid(entity.id),
+        album_id=get_uuid(entity.album_id),
+        parent_id=map_optional_uuid(entity.parent_id),
+        name=entity.name,
+        slug=entity.slug,
+        hidden=entity.hidden,
+        creation_time=entity.created_at,
+        last_modified_time=entity.updated_at,
+        file_id=entity.file_id,
+        file_extension=entity.file_extension,
+        file_size=entity.file_size,
+        node_type=FileSystemNodeType.FOLDER
+        if entity.folder
+        else FileSystemNodeType.FILE,
+        type=entity.type,
+        icon=entity.icon,
+        etag=entity.etag,
+        items=[],
+        image=entity_to_image_data(entity),
+        processing=entity.processing,
+        content_hash=entity.content_hash,
+    )
+
+
+def legacy_entity_to_node(data: dict) -> FileSystemNode:
+    return FileSystemNode(
+        id=UUID(data["RowKey"]),
+        album_id=UUID(data["AlbumId"]),
+        parent_id=UUID(data["PartitionKey"]),
+        node_type=FileSystemNodeType(data["NodeType"]),
+        name=data["Name"],
+        slug=data["Slug"],
+        type=data["Type"],
+        file_id=data["FileId"] if "FileId" in data else None,
+        file_extension=data["FileExtension"] if "FileExtension" in data else None,
+        file_size=int(data["FileSize"]) if "FileSize" in data else None,
+        icon=data["Icon"] if "Icon" in data else None,
+        etag=data["ETag"],
+        last_modified_time=parse(data["LastModifiedTime"]),
+        creation_time=parse(data["CreationTime"]),
+        hidden=bool(data["Hidden"]),
+        items=[],
+        image=table_image_data(data),
+        processing=bool(data.get("Processing", False)),
+        content_hash=data.get("ContentHash"),
+    )
+
+
+async def legacy_get_node_children(
+    provider: SQLFileSystemDataProvider, node_id: UUID
+) -> List[FileSystemNode]:
+    async with provider.session:
+        results = await provider.session.execute(
+            select(NodeEntity)
+            .where(NodeEntity.parent_id == str(node_id))
+            .order_by(NodeEntity.name)  # type: ignore
+        )
+        return [legacy_node_entity_to_node(record) for record in results.scalars()]
+
+
+async def measure_async(fn, *args) -> float:
+    start = time.perf_counter()
+    await fn(*args)
+    return (time.perf_counter() - start) * 1000
+
+
+def measure_mapping(
+    fn: Callable[[dict], FileSystemNode], entities: List[dict]
+) -> float:
+    start = time.perf_counter()
+    for entity in entities:
+        fn(entity)
+    return (time.perf_counter() - start) * 1000
+
+
+async def main() -> None:
+    with tempfile.TemporaryDirectory() as folder:
+        session = await create_session(Path(folder) / "bench.db")
+        album_id = await create_album(session)
+        provider = SQLFileSystemDataProvider(session)
+
+        parent = new_node(album_id, None, "Folder")
+        nodes = [
+            new_node(album_id, parent.id, f"{i}.jpg", FileSystemNodeType.FILE)
+            for i in range(NODES_COUNT)
+        ]
+        await provider.create_nodes([parent])
+
+        for index in range(0, NODES_COUNT, INSERT_BATCH_SIZE):
+            await provider.create_nodes(nodes[index : index + INSERT_BATCH_SIZE])
+
+        # entities as returned by the Table API, without properties that are not set
+        entities = [
+            {
+                key: value
+                for key, value in node_to_entity(node).items()
+                if value is not None
+            }
+            for node in nodes
+        ]
+
+        print(f"{'provider':>9} {'previous (ms)':>14} {'lean (ms)':>10}")
+
+        legacy = await measure_async(legacy_get_node_children, provider, parent.id)
+        lean = await measure_async(provider.get_node_children, parent.id)
+        print(f"{'SQL':>9} {legacy:>14.1f} {lean:>10.1f}")
+
+        legacy = measure_mapping(legacy_entity_to_node, entities)
+        lean = measure_mapping(entity_to_node, entities)
+        print(f"{'Table API':>9} {legacy:>14.1f} {lean:>10.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
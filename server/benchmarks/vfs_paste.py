@@ -0,0 +1,78 @@
+"""
+Compares the time needed to paste folders of growing size, between the bulk
+clone of the data provider and the legacy recursive paste, which reads and
+creates the children of each cloned folder with separate round trips.
+"""
+import asyncio
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional
+from uuid import UUID
+
+from data.sql.vfs import SQLFileSystemDataProvider
+from domain.vfs import FileSystemNode, FileSystemNodeType, clone_nodes_tree
+from tests.db import create_album, create_session, new_node
+
+# (number of subfolders, number of files in each subfolder)
+SIZES = [(5, 20), (20, 50), (100, 50), (300, 17)]
+
+
+def create_tree(album_id: UUID, folders: int, files: int) -> List[FileSystemNode]:
+    root = new_node(album_id, None, "Root")
+    nodes = [root]
+
+    for i in range(folders):
+        folder = new_node(album_id, root.id, f"Folder {i}")
+        nodes.append(folder)
+        nodes.extend(
+            new_node(album_id, folder.id, f"File {j}.jpg", FileSystemNodeType.FILE)
+            for j in range(files)
+        )
+
+    return nodes
+
+
+async def legacy_paste(
+    provider: SQLFileSystemDataProvider,
+    nodes: List[FileSystemNode],
+    target_parent_id: Optional[UUID],
+) -> None:
+    clones = clone_nodes_tree(nodes, target_parent_id, datetime.utcnow())
+    await provider.create_nodes(clones)
+
+    for original, clone in zip(nodes, clones):
+        if original.node_type == FileSystemNodeType.FOLDER:
+            children = await provider.get_node_children(original.id)
+            if children:
+                await legacy_paste(provider, children, clone.id)
+
+
+async def main() -> None:
+    with tempfile.TemporaryDirectory() as folder:
+        session = await create_session(Path(folder) / "bench.db")
+        album_id = await create_album(session)
+        provider = SQLFileSystemDataProvider(session)
+
+        print(f"{'nodes':>6} {'legacy (ms)':>12} {'bulk (ms)':>10}")
+
+        for folders, files in SIZES:
+            nodes = create_tree(album_id, folders, files)
+            await provider.create_nodes(nodes)
+            target = new_node(album_id, None, "Target")
+            await provider.create_nodes([target])
+
+            start = time.perf_counter()
+            await legacy_paste(provider, nodes[:1], target.id)
+            legacy = (time.perf_counter() - start) * 1000
+
+            start = time.perf_counter()
+            await provider.clone_nodes(nodes[:1], target.id, datetime.utcnow())
+            bulk = (time.perf_counter() - start) * 1000
+
+            print(f"{len(nodes):>6} {legacy:>12.1f} {bulk:>10.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
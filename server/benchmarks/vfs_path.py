@@ -0,0 +1,62 @@
+"""
+Compares the latency of reading the full path of a node, by depth of the node,
+between the closure table and the legacy fixed 4-levels self join, which
+requires one round trip every four levels.
+"""
+import asyncio
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+from data.sql.vfs import SQLFileSystemDataProvider
+from domain.vfs import FileSystemNodePathFragment
+from tests.db import create_album, create_session, new_node
+
+DEPTHS = [4, 10, 20, 40, 80]
+ITERATIONS = 200
+
+
+async def legacy_full_path(
+    provider: SQLFileSystemDataProvider, node_id
+) -> List[FileSystemNodePathFragment]:
+    parts = await provider.get_node_path(node_id)
+
+    while parts[0].parent_id is not None:
+        parts = await provider.get_node_path(parts[0].parent_id) + parts
+
+    return parts
+
+
+async def measure(fn, *args) -> float:
+    start = time.perf_counter()
+    for _ in range(ITERATIONS):
+        await fn(*args)
+    return (time.perf_counter() - start) / ITERATIONS * 1000
+
+
+async def main() -> None:
+    with tempfile.TemporaryDirectory() as folder:
+        session = await create_session(Path(folder) / "bench.db")
+        album_id = await create_album(session)
+        provider = SQLFileSystemDataProvider(session)
+
+        print(f"{'depth':>6} {'legacy (ms)':>12} {'closure (ms)':>13}")
+
+        for depth in DEPTHS:
+            nodes = []
+            parent_id = None
+            for i in range(depth):
+                node = new_node(album_id, parent_id, f"Folder {i}")
+                nodes.append(node)
+                parent_id = node.id
+            await provider.create_nodes(nodes)
+
+            leaf_id = nodes[-1].id
+            legacy = await measure(legacy_full_path, provider, leaf_id)
+            closure = await measure(provider.get_node_full_path, leaf_id)
+            print(f"{depth:>6} {legacy:>12.3f} {closure:>13.3f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
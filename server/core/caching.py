@@ -0,0 +1,161 @@
+"""
+This module implements a bounded, in-memory cache of values read from data stores,
+shared by all requests handled by a process.
+"""
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Hashable, Tuple, TypeVar
+
+logger = logging.getLogger("blacksheep.server")
+
+T = TypeVar("T")
+
+
+@dataclass
+class ReadCacheMetrics:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    invalidations: int = 0
+
+    @property
+    def lookups(self) -> int:
+        return self.hits + self.misses
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / self.lookups if self.lookups else 0.0
+
+
+class ReadCache:
+    """
+    LRU cache of values that expire after a time to live. Each value has a cost,
+    like the number of items of a list, and the least recently used values are
+    evicted when the total cost exceeds `max_cost`, bounding the memory used.
+
+    Values are invalidated explicitly when they change: a value read while any
+    key is invalidated is not stored, since it might have been read before the
+    change.
+    """
+
+    def __init__(
+        self,
+        max_cost: int = 10000,
+        ttl: float = 60,
+        report_every: int = 1000,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.max_cost = max_cost
+        self.ttl = ttl
+        self.report_every = report_every
+        self.metrics = ReadCacheMetrics()
+        self.cost = 0
+        self._clock = clock
+        self._version = 0
+        self._items: "OrderedDict[Hashable, Tuple[float, int, Any]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __contains__(self, key: Hashable) -> bool:
+        item = self._items.get(key)
+        return item is not None and item[0] > self._clock()
+
+    def _remove(self, key: Hashable) -> bool:
+        item = self._items.pop(key, None)
+
+        if item is None:
+            return False
+
+        self.cost -= item[1]
+        return True
+
+    def _get(self, key: Hashable) -> Tuple[bool, Any]:
+        item = self._items.get(key)
+
+        if item is not None:
+            if item[0] > self._clock():
+                self._items.move_to_end(key)
+                return True, item[2]
+
+            self._remove(key)
+
+        return False, None
+
+    def _set(self, key: Hashable, value: Any, cost: int) -> None:
+        self._remove(key)
+
+        if cost > self.max_cost:
+            return
+
+        self._items[key] = (self._clock() + self.ttl, cost, value)
+        self.cost += cost
+
+        while self.cost > self.max_cost:
+            _, (_, evicted_cost, _) = self._items.popitem(last=False)
+            self.cost -= evicted_cost
+            self.metrics.evictions += 1
+
+    async def get_or_read(
+        self,
+        key: Hashable,
+        read: Callable[[], Awaitable[T]],
+        cost: Callable[[T], int],
+    ) -> T:
+        """
+        Returns the value cached with the given key, or reads it with the given
+        function, caching it unless it is None.
+        """
+        found, value = self._get(key)
+
+        if found:
+            self.metrics.hits += 1
+            self._report()
+            return value
+
+        self.metrics.misses += 1
+        self._report()
+
+        version = self._version
+        value = await read()
+
+        if value is not None and version == self._version:
+            self._set(key, value, max(cost(value), 1))
+
+        return value
+
+    def invalidate(self, *keys: Hashable) -> None:
+        self._version += 1
+
+        for key in keys:
+            if self._remove(key):
+                self.metrics.invalidations += 1
+
+    def clear(self) -> None:
+        self._version += 1
+        self._items.clear()
+        self.cost = 0
+
+    def _report(self) -> None:
+        if self.metrics.lookups % self.report_every:
+            return
+
+        logger.info(
+            "Read cache hit rate: %.2f (%s lookups, %s entries)",
+            self.metrics.hit_rate,
+            self.metrics.lookups,
+            len(self._items),
+            extra={
+                "custom_dimensions": {
+                    "read_cache_hits": self.metrics.hits,
+                    "read_cache_misses": self.metrics.misses,
+                    "read_cache_hit_rate": self.metrics.hit_rate,
+                    "read_cache_evictions": self.metrics.evictions,
+                    "read_cache_invalidations": self.metrics.invalidations,
+                    "read_cache_size": len(self._items),
+                    "read_cache_cost": self.cost,
+                }
+            },
+        )
@@ -0,0 +1,18 @@
+import asyncio
+from typing import Awaitable, Iterable, List, TypeVar
+
+T = TypeVar("T")
+
+
+async def gather_limited(limit: int, awaitables: Iterable[Awaitable[T]]) -> List[T]:
+    """
+    Awaits the given awaitables concurrently, running at most `limit` of them at
+    the same time, and returns their results in the same order.
+    """
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run(awaitable: Awaitable[T]) -> T:
+        async with semaphore:
+            return await awaitable
+
+    return await asyncio.gather(*[run(awaitable) for awaitable in awaitables])
@@ -16,6 +16,11 @@ class PreconfitionFailed(Exception):
         super().__init__(message)
 
 
+class TooManyRequestsError(Exception):
+    def __init__(self, message: str = "Too many requests, try again later.") -> None:
+        super().__init__(message)
+
+
 class AcceptedExceptionWithData(AcceptedException):
     def __init__(self, message: str = "Accepted", data: Any = None):
         super().__init__(message=message)
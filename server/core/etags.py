@@ -0,0 +1,41 @@
+"""
+This module provides functions to handle entity tags of representations of items
+that have their own version, to support conditional requests.
+"""
+from hashlib import sha256
+from typing import Hashable, Mapping
+
+
+def get_versions_etag(versions: Mapping[Hashable, str]) -> str:
+    """
+    Returns a strong entity tag for a representation of the items with the given
+    ids and versions, which changes when any item is added, removed, or modified.
+    """
+    digest = sha256()
+
+    for item_id, version in sorted(
+        (str(item_id), version) for item_id, version in versions.items()
+    ):
+        digest.update(f"{item_id}:{version}\n".encode())
+
+    return f'"{digest.hexdigest()[:32]}"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """
+    Returns a value indicating whether the value of an If-None-Match header matches
+    the given entity tag, using the weak comparison required for this header.
+    """
+    if if_none_match.strip() == "*":
+        return True
+
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+
+        if candidate == etag:
+            return True
+
+    return False
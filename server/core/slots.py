@@ -0,0 +1,31 @@
+"""
+This module provides a decorator that stores the fields of dataclasses in
+__slots__, like the `slots` option of dataclasses in Python 3.10+, to reduce the
+memory used by large lists of objects and the cost of accessing their fields.
+"""
+from dataclasses import fields
+from typing import Type, TypeVar
+
+T = TypeVar("T")
+
+
+def with_slots(cls: Type[T]) -> Type[T]:
+    """
+    Returns a copy of the given dataclass, whose fields are stored in __slots__
+    instead of an instance dictionary. It must be applied over @dataclass.
+    """
+    field_names = tuple(field.name for field in fields(cls))
+    namespace = dict(cls.__dict__)
+
+    # default values of fields are kept by the generated __init__ method, and
+    # class attributes with the same names would conflict with slots
+    for name in field_names:
+        namespace.pop(name, None)
+
+    namespace.pop("__dict__", None)
+    namespace.pop("__weakref__", None)
+    namespace["__slots__"] = field_names
+
+    new_cls = type(cls)(cls.__name__, cls.__bases__, namespace)
+    new_cls.__qualname__ = cls.__qualname__
+    return new_cls
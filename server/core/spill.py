@@ -0,0 +1,91 @@
+"""
+This module implements a set of keys spilled to a temporary SQLite database, to
+join large sets of items with bounded memory, for example in batch jobs.
+"""
+import os
+import sqlite3
+import tempfile
+from typing import Iterator, List, Optional, Tuple
+
+# number of rows read at once when iterating items
+FETCH_SIZE = 1000
+
+
+class SortedSpill:
+    """
+    Set of string keys, each with an optional value, stored in a temporary SQLite
+    database that is deleted when the spill is closed. Keys are buffered in memory
+    and written in batches, and are read in sorted order, comparing their bytes.
+
+    Operations are blocking: this class is meant to be used by batch jobs.
+    """
+
+    def __init__(self, buffer_size: int = 10000, directory: Optional[str] = None):
+        file_descriptor, self.path = tempfile.mkstemp(suffix=".db", dir=directory)
+        os.close(file_descriptor)
+
+        self.buffer_size = buffer_size
+        self._buffer: List[Tuple[str, Optional[str]]] = []
+        self._connection = sqlite3.connect(self.path)
+        # the database is temporary: durability is not needed
+        self._connection.execute("PRAGMA journal_mode = OFF")
+        self._connection.execute("PRAGMA synchronous = OFF")
+        self._connection.execute(
+            "CREATE TABLE items (key TEXT PRIMARY KEY, value TEXT) WITHOUT ROWID"
+        )
+
+    def __enter__(self) -> "SortedSpill":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def __contains__(self, key: str) -> bool:
+        self.flush()
+        cursor = self._connection.execute("SELECT 1 FROM items WHERE key = ?", (key,))
+        return cursor.fetchone() is not None
+
+    def __len__(self) -> int:
+        self.flush()
+        return self._connection.execute("SELECT COUNT(*) FROM items").fetchone()[0]
+
+    def add(self, key: str, value: Optional[str] = None) -> None:
+        """
+        Adds a key to the set. If the key was already added, its first value is
+        kept.
+        """
+        self._buffer.append((key, value))
+
+        if len(self._buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._buffer:
+            return
+
+        self._connection.executemany(
+            "INSERT OR IGNORE INTO items (key, value) VALUES (?, ?)", self._buffer
+        )
+        self._connection.commit()
+        self._buffer.clear()
+
+    def items(self) -> Iterator[Tuple[str, Optional[str]]]:
+        """
+        Yields all keys with their values, sorted by key.
+        """
+        self.flush()
+        cursor = self._connection.execute("SELECT key, value FROM items ORDER BY key")
+
+        while True:
+            rows = cursor.fetchmany(FETCH_SIZE)
+
+            if not rows:
+                return
+
+            yield from rows
+
+    def close(self) -> None:
+        self._connection.close()
+
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -0,0 +1,32 @@
+"""
+This module provides functions to handle continuation tokens of paginated lists,
+which are opaque to clients.
+"""
+import base64
+import binascii
+import json
+from typing import Any, Dict
+
+from essentials.exceptions import InvalidArgument
+
+
+def encode_continuation_token(position: Dict[str, Any]) -> str:
+    data = json.dumps(position, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+
+def decode_continuation_token(token: str) -> Dict[str, Any]:
+    """
+    Returns the position described by a continuation token, raising InvalidArgument
+    if the token is not valid.
+    """
+    try:
+        data = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        position = json.loads(data)
+    except (binascii.Error, ValueError):
+        raise InvalidArgument("Invalid continuation token.")
+
+    if not isinstance(position, dict):
+        raise InvalidArgument("Invalid continuation token.")
+
+    return position
@@ -0,0 +1,82 @@
+"""
+This module implements streaming of ZIP archives, without buffering whole files
+in memory or on disk.
+
+Files are stored without compression, and the archive is written to an unseekable
+sink: in this case the zipfile module writes CRCs and sizes in data descriptors
+following the contents of each file, so chunks of bytes can be yielded as soon as
+they are written.
+"""
+import io
+import zipfile
+from dataclasses import dataclass
+from datetime import datetime
+from typing import AsyncIterable, AsyncIterator, Callable, Iterable, List
+
+# dates before 1980 cannot be represented in ZIP archives
+MIN_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+
+@dataclass
+class ZipEntry:
+    name: str
+    size: int
+    modified: datetime
+    read: Callable[[], AsyncIterable[bytes]]
+
+
+class _ChunksSink(io.RawIOBase):
+    """
+    Unseekable stream that collects written bytes, until they are drained.
+    """
+
+    def __init__(self) -> None:
+        self._chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:  # type: ignore
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _get_date_time(value: datetime) -> tuple:
+    return max(value.timetuple()[:6], MIN_DATE_TIME)
+
+
+async def stream_zip(entries: Iterable[ZipEntry]) -> AsyncIterator[bytes]:
+    """
+    Yields the bytes of a ZIP archive containing the given entries. The memory
+    used is bounded by the size of chunks returned by the entries' readers.
+    """
+    sink = _ChunksSink()
+
+    with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_STORED) as archive:
+        for entry in entries:
+            info = zipfile.ZipInfo(entry.name, _get_date_time(entry.modified))
+            info.file_size = entry.size
+
+            with archive.open(
+                info, mode="w", force_zip64=entry.size >= zipfile.ZIP64_LIMIT
+            ) as file:
+                async for chunk in entry.read():
+                    file.write(chunk)
+                    data = sink.drain()
+
+                    if data:
+                        yield data
+
+            data = sink.drain()
+
+            if data:
+                yield data
+
+    # the central directory is written when the archive is closed; empty chunks are
+    # never yielded, since they would terminate chunked responses
+    yield sink.drain()
@@ -1,53 +1,95 @@
 import urllib.parse
-from datetime import datetime, timedelta
-from typing import List, cast
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, List, cast
 
 from azure.core.exceptions import ResourceExistsError
 from azure.storage.blob import (
     BlobSasPermissions,
-    BlobServiceClient,
     ContainerSasPermissions,
     generate_blob_sas,
     generate_container_sas,
 )
+from azure.storage.blob.aio import BlobServiceClient
 
 from core.errors import ConflictError
-from core.pools import PoolClient
-from domain.blobs import BlobsService, Container
+from domain.blobs import BlobInfo, BlobsService, Container
 from domain.settings import Settings
 
 from .logs import log_blob_dep
+from .sas import SASCache
 
+READ_BLOB_SAS_VALIDITY = timedelta(hours=2)
+READ_CONTAINER_SAS_VALIDITY = timedelta(hours=24)
 
-def _list_containers(blob_client: BlobServiceClient) -> List[Container]:
-    containers: List[Container] = []
+# maximum number of sub-requests in a batch request of the Blob service
+MAX_BATCH_DELETE_BLOBS = 256
 
-    for item in blob_client.list_containers():
-        containers.append(Container(id=item.name, name=item.name, etag=item.etag))
+# maximum number of blobs returned by the Blob service in a single page
+LIST_BLOBS_PAGE_SIZE = 5000
 
-    return containers
 
-
-def _create_container(blob_client: BlobServiceClient, name: str) -> None:
-    try:
-        blob_client.create_container(name=name)
-    except ResourceExistsError:
-        raise ConflictError("A container with the given name already exists")
-
-
-class AzureStorageBlobsService(BlobsService, PoolClient):
+class AzureStorageBlobsService(BlobsService):
     def __init__(self, blob_client: BlobServiceClient, settings: Settings) -> None:
-        super().__init__()
         self.blob_client = blob_client
         self.settings = settings
+        self.sas_cache = SASCache(
+            max_size=settings.sas_cache_size,
+            bucket=timedelta(minutes=settings.sas_bucket_minutes),
+        )
 
     @log_blob_dep()
     async def get_containers(self) -> List[Container]:
-        return await self.run(_list_containers, self.blob_client)
+        containers: List[Container] = []
+
+        async for item in self.blob_client.list_containers():
+            containers.append(Container(id=item.name, name=item.name, etag=item.etag))
+
+        return containers
 
     @log_blob_dep()
     async def create_container(self, name: str) -> None:
-        return await self.run(_create_container, self.blob_client, name)
+        try:
+            await self.blob_client.create_container(name=name)
+        except ResourceExistsError:
+            raise ConflictError("A container with the given name already exists")
+
+    @log_blob_dep()
+    async def delete_blobs(self, container_name: str, files_names: List[str]) -> None:
+        container_client = self.blob_client.get_container_client(container_name)
+
+        for index in range(0, len(files_names), MAX_BATCH_DELETE_BLOBS):
+            # blobs that don't exist produce failed sub-responses, which are ignored
+            await container_client.delete_blobs(
+                *files_names[index : index + MAX_BATCH_DELETE_BLOBS],
+                delete_snapshots="include",
+                raise_on_any_failure=False,
+            )
+
+    async def read_blob(
+        self, container_name: str, file_name: str
+    ) -> AsyncIterator[bytes]:
+        downloader = await self.blob_client.get_blob_client(
+            container_name, file_name
+        ).download_blob()
+
+        # chunks are downloaded one at a time, so the memory used is bounded by
+        # the maximum size of chunks configured for the client
+        async for chunk in downloader.chunks():
+            yield chunk
+
+    async def list_blobs(self, container_name: str) -> AsyncIterator[BlobInfo]:
+        container_client = self.blob_client.get_container_client(container_name)
+
+        async for item in container_client.list_blobs(
+            results_per_page=LIST_BLOBS_PAGE_SIZE
+        ):
+            yield BlobInfo(
+                name=item.name,
+                size=item.size,
+                last_modified=item.last_modified.astimezone(timezone.utc).replace(
+                    tzinfo=None
+                ),
+            )
 
     def get_read_blob_sas(
         self,
@@ -56,29 +98,46 @@ class AzureStorageBlobsService(BlobsService, PoolClient):
         display_name: str,
     ) -> str:
         escaped_name = urllib.parse.quote(display_name)
-        token = generate_blob_sas(
-            account_name=self.settings.storage_account_name,
-            account_key=self.settings.storage_account_key,
-            container_name=container_name,
-            blob_name=file_name,
-            permission=BlobSasPermissions(read=True, create=False, write=False),
-            expiry=datetime.utcnow() + timedelta(hours=2),
-            content_disposition=f'attachment;filename="{escaped_name}"',
-        )
 
-        return cast(str, token)
+        def create_token(expiry: datetime) -> str:
+            return cast(
+                str,
+                generate_blob_sas(
+                    account_name=self.settings.storage_account_name,
+                    account_key=self.settings.storage_account_key,
+                    container_name=container_name,
+                    blob_name=file_name,
+                    permission=BlobSasPermissions(read=True, create=False, write=False),
+                    expiry=expiry,
+                    content_disposition=f'attachment;filename="{escaped_name}"',
+                ),
+            )
+
+        return self.sas_cache.get_token(
+            ("blob", container_name, file_name, "r", escaped_name),
+            READ_BLOB_SAS_VALIDITY,
+            create_token,
+        )
 
     def get_read_container_sas(self, container_name: str) -> str:
-        token = generate_container_sas(
-            account_name=self.settings.storage_account_name,
-            account_key=self.settings.storage_account_key,
-            container_name=container_name,
-            permission=ContainerSasPermissions(read=True),
-            expiry=datetime.utcnow() + timedelta(hours=24),
+        def create_token(expiry: datetime) -> str:
+            return cast(
+                str,
+                generate_container_sas(
+                    account_name=self.settings.storage_account_name,
+                    account_key=self.settings.storage_account_key,
+                    container_name=container_name,
+                    permission=ContainerSasPermissions(read=True),
+                    expiry=expiry,
+                ),
+            )
+
+        return self.sas_cache.get_token(
+            ("container", container_name, "r"),
+            READ_CONTAINER_SAS_VALIDITY,
+            create_token,
         )
 
-        return cast(str, token)
-
     def get_admin_blob_sas(self, container_name: str, file_name: str) -> str:
         token = generate_blob_sas(
             account_name=self.settings.storage_account_name,
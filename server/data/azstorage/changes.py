@@ -0,0 +1,210 @@
+from datetime import datetime
+from typing import List, Optional
+from uuid import UUID
+
+from azure.core import MatchConditions
+from azure.core.exceptions import (
+    ResourceExistsError,
+    ResourceModifiedError,
+    ResourceNotFoundError,
+)
+from azure.data.tables import UpdateMode
+from azure.data.tables.aio import TableServiceClient
+
+from core.concurrency import gather_limited
+from domain.changes import ChangesDataProvider, NodeChange, NodeChangeType
+
+from .logs import log_table_dep
+from .vfs import get_partitioned_batches, parse_datetime
+
+# the RowKey of the entity storing the last sequence number of each album, which
+# sorts before the keys of changes
+SEQUENCE_ROW_KEY = ""
+
+# maximum number of entities returned by the Table API in a page of results
+MAX_RESULTS_PER_PAGE = 1000
+
+
+def get_change_row_key(sequence: int) -> str:
+    # sequence numbers are padded, so changes are sorted by RowKey
+    return f"{sequence:016d}"
+
+
+def change_to_entity(album_id: UUID, change: NodeChange) -> dict:
+    return {
+        "PartitionKey": str(album_id),
+        "RowKey": get_change_row_key(change.sequence),
+        "NodeId": str(change.node_id),
+        "ParentId": str(change.parent_id) if change.parent_id else None,
+        "ChangeType": change.change_type.value,
+        "Time": change.time.isoformat(),
+    }
+
+
+def entity_to_change(data: dict) -> NodeChange:
+    parent_id = data.get("ParentId")
+    return NodeChange(
+        node_id=UUID(data["NodeId"]),
+        parent_id=UUID(parent_id) if parent_id else None,
+        change_type=NodeChangeType(data["ChangeType"]),
+        time=parse_datetime(data["Time"]),
+        sequence=int(data["RowKey"]),
+    )
+
+
+class TableAPIChangesDataProvider(ChangesDataProvider):
+    """
+    Stores the changes of each album in a partition having the id of the album as
+    key. Sequence numbers are allocated incrementing the last sequence number of
+    the album with optimistic concurrency, since the Table API doesn't support
+    atomic increments.
+    """
+
+    table_name = "nodeschanges"
+    max_concurrency = 10
+
+    def __init__(self, table_service_client: TableServiceClient) -> None:
+        super().__init__()
+        self.table_client = table_service_client.get_table_client(self.table_name)
+
+    async def _get_sequence_entity(self, album_id: UUID) -> Optional[dict]:
+        try:
+            return await self.table_client.get_entity(
+                partition_key=str(album_id), row_key=SEQUENCE_ROW_KEY
+            )
+        except ResourceNotFoundError:
+            return None
+
+    async def _allocate_sequences(
+        self, album_id: UUID, count: int, time: datetime
+    ) -> int:
+        """
+        Reserves the given number of sequence numbers for changes that happened up
+        to the given time, returning the last one.
+        """
+        while True:
+            entity = await self._get_sequence_entity(album_id)
+
+            if entity is None:
+                try:
+                    await self.table_client.create_entity(
+                        entity={
+                            "PartitionKey": str(album_id),
+                            "RowKey": SEQUENCE_ROW_KEY,
+                            "Sequence": count,
+                            "Time": time.isoformat(),
+                        }
+                    )
+                    return count
+                except ResourceExistsError:
+                    continue
+
+            sequence = int(entity["Sequence"]) + count
+
+            try:
+                await self.table_client.update_entity(
+                    entity={
+                        "PartitionKey": str(album_id),
+                        "RowKey": SEQUENCE_ROW_KEY,
+                        "Sequence": sequence,
+                        "Time": time.isoformat(),
+                    },
+                    mode=UpdateMode.MERGE,
+                    etag=entity.metadata["etag"],  # type: ignore
+                    match_condition=MatchConditions.IfNotModified,
+                )
+            except ResourceModifiedError:
+                continue
+
+            return sequence
+
+    @log_table_dep()
+    async def append_changes(self, album_id: UUID, changes: List[NodeChange]) -> int:
+        last_sequence = await self._allocate_sequences(
+            album_id, len(changes), max(change.time for change in changes)
+        )
+
+        for index, change in enumerate(changes):
+            change.sequence = last_sequence - len(changes) + 1 + index
+
+        await gather_limited(
+            self.max_concurrency,
+            (
+                self.table_client.submit_transaction(batch)
+                for batch in get_partitioned_batches(
+                    [
+                        ("create", change_to_entity(album_id, change))
+                        for change in changes
+                    ]
+                )
+            ),
+        )
+        return last_sequence
+
+    @log_table_dep()
+    async def get_changes(
+        self, album_id: UUID, since: int, limit: int
+    ) -> List[NodeChange]:
+        changes: List[NodeChange] = []
+        # pages can contain fewer entities than requested, even if more follow
+        pages = self.table_client.query_entities(
+            f"PartitionKey eq '{album_id}' "
+            f"and RowKey gt '{get_change_row_key(since)}'",
+            results_per_page=min(limit, MAX_RESULTS_PER_PAGE),
+        ).by_page()
+
+        async for page in pages:
+            async for entity in page:
+                changes.append(entity_to_change(entity))
+
+            if len(changes) >= limit:
+                break
+
+        return changes[:limit]
+
+    @log_table_dep()
+    async def get_last_sequence(self, album_id: UUID, until: datetime) -> int:
+        entity = await self._get_sequence_entity(album_id)
+
+        if entity is None:
+            return 0
+
+        # sequence numbers allocated for changes that happened before the given
+        # time belong to changes that are already stored
+        if parse_datetime(entity["Time"]) <= until:
+            return int(entity["Sequence"])
+
+        # otherwise, changes are read up to the first one that is not settled, since
+        # the last allocated sequence numbers might belong to changes being stored
+        last_sequence = 0
+
+        async for change in self.table_client.query_entities(
+            f"PartitionKey eq '{album_id}' and RowKey gt '{SEQUENCE_ROW_KEY}'",
+            select=["RowKey", "Time"],
+        ):
+            if parse_datetime(change["Time"]) > until:
+                break
+            last_sequence = int(change["RowKey"])
+
+        return last_sequence
+
+    @log_table_dep()
+    async def delete_changes(self, album_id: UUID, before: datetime) -> None:
+        operations = []
+
+        async for entity in self.table_client.query_entities(
+            f"PartitionKey eq '{album_id}' and RowKey gt '{SEQUENCE_ROW_KEY}'",
+            select=["PartitionKey", "RowKey", "Time"],
+        ):
+            # changes are sorted by time, except those stored concurrently
+            if parse_datetime(entity["Time"]) >= before:
+                break
+            operations.append(("delete", entity))
+
+        await gather_limited(
+            self.max_concurrency,
+            (
+                self.table_client.submit_transaction(batch)
+                for batch in get_partitioned_batches(operations)
+            ),
+        )
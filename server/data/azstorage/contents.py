@@ -0,0 +1,207 @@
+from typing import AsyncIterator, Dict, Iterable, List, Optional
+from uuid import UUID
+
+from azure.core import MatchConditions
+from azure.core.exceptions import (
+    ResourceExistsError,
+    ResourceModifiedError,
+    ResourceNotFoundError,
+)
+from azure.data.tables import UpdateMode
+from azure.data.tables.aio import TableServiceClient
+
+from core.concurrency import gather_limited
+from domain.vfs import ContentsDataProvider, FileImageData, StoredContent
+
+from .logs import log_table_dep
+from .vfs import MAX_FILTER_ROWS, entity_to_image_data, get_partition_rows_filter
+
+
+def image_data_to_entity(image: Optional[FileImageData]) -> dict:
+    return {
+        "MediumImageName": image.medium_image_name if image else None,
+        "SmallImageName": image.small_image_name if image else None,
+        "ImageWidth": image.image_width if image else None,
+        "ImageHeight": image.image_height if image else None,
+    }
+
+
+def content_to_entity(content: StoredContent) -> dict:
+    return {
+        "PartitionKey": str(content.album_id),
+        "RowKey": content.content_hash,
+        "FileId": content.file_id,
+        "FileExtension": content.file_extension,
+        "References": content.references,
+        **image_data_to_entity(content.image),
+    }
+
+
+def entity_to_content(data: dict) -> StoredContent:
+    return StoredContent(
+        album_id=UUID(data["PartitionKey"]),
+        content_hash=data["RowKey"],
+        file_id=data["FileId"],
+        file_extension=data.get("FileExtension"),
+        image=entity_to_image_data(data),
+        references=int(data["References"]),
+    )
+
+
+class TableAPIContentsDataProvider(ContentsDataProvider):
+    """
+    Stores contents by album, in partitions having the id of the album as key.
+    References are updated with optimistic concurrency, since the Table API doesn't
+    support atomic increments: operations are retried when entities are modified
+    by concurrent requests.
+    """
+
+    table_name = "contents"
+    max_concurrency = 10
+
+    def __init__(self, table_service_client: TableServiceClient) -> None:
+        super().__init__()
+        self.table_client = table_service_client.get_table_client(self.table_name)
+
+    async def _get_entity(self, album_id: UUID, content_hash: str) -> Optional[dict]:
+        try:
+            return await self.table_client.get_entity(
+                partition_key=str(album_id), row_key=content_hash
+            )
+        except ResourceNotFoundError:
+            return None
+
+    async def _update_entity(self, entity: dict, values: dict) -> bool:
+        try:
+            await self.table_client.update_entity(
+                entity={
+                    "PartitionKey": entity["PartitionKey"],
+                    "RowKey": entity["RowKey"],
+                    **values,
+                },
+                mode=UpdateMode.MERGE,
+                etag=entity.metadata["etag"],  # type: ignore
+                match_condition=MatchConditions.IfNotModified,
+            )
+        except ResourceModifiedError:
+            return False
+        return True
+
+    async def _query_contents(
+        self, album_id: UUID, hashes: List[str]
+    ) -> List[StoredContent]:
+        items: List[StoredContent] = []
+
+        async for entity in self.table_client.query_entities(
+            get_partition_rows_filter(str(album_id), hashes)
+        ):
+            items.append(entity_to_content(entity))
+        return items
+
+    @log_table_dep()
+    async def get_contents(
+        self, album_id: UUID, contents_hashes: Iterable[str]
+    ) -> Dict[str, StoredContent]:
+        hashes = list(dict.fromkeys(contents_hashes))
+
+        return {
+            content.content_hash: content
+            for contents in await gather_limited(
+                self.max_concurrency,
+                (
+                    self._query_contents(
+                        album_id, hashes[index : index + MAX_FILTER_ROWS]
+                    )
+                    for index in range(0, len(hashes), MAX_FILTER_ROWS)
+                ),
+            )
+            for content in contents
+        }
+
+    async def _add_reference(self, content: StoredContent) -> None:
+        while True:
+            entity = await self._get_entity(content.album_id, content.content_hash)
+
+            if entity is None:
+                try:
+                    await self.table_client.create_entity(
+                        entity=content_to_entity(content)
+                    )
+                    return
+                except ResourceExistsError:
+                    continue
+
+            values = {"References": int(entity["References"]) + content.references}
+
+            if content.image is not None and not entity.get("MediumImageName"):
+                values.update(image_data_to_entity(content.image))
+
+            if await self._update_entity(entity, values):
+                return
+
+    @log_table_dep()
+    async def add_references(self, contents: List[StoredContent]) -> None:
+        await gather_limited(
+            self.max_concurrency,
+            (self._add_reference(content) for content in contents),
+        )
+
+    async def _release_reference(
+        self, album_id: UUID, content_hash: str, count: int
+    ) -> Optional[StoredContent]:
+        while True:
+            entity = await self._get_entity(album_id, content_hash)
+
+            if entity is None:
+                return None
+
+            references = int(entity["References"]) - count
+
+            if references > 0:
+                if await self._update_entity(entity, {"References": references}):
+                    return None
+                continue
+
+            try:
+                await self.table_client.delete_entity(
+                    partition_key=entity["PartitionKey"],
+                    row_key=entity["RowKey"],
+                    etag=entity.metadata["etag"],  # type: ignore
+                    match_condition=MatchConditions.IfNotModified,
+                )
+            except ResourceModifiedError:
+                continue
+
+            return entity_to_content(entity)
+
+    @log_table_dep()
+    async def release_references(
+        self, album_id: UUID, references: Dict[str, int]
+    ) -> List[StoredContent]:
+        released = await gather_limited(
+            self.max_concurrency,
+            (
+                self._release_reference(album_id, content_hash, count)
+                for content_hash, count in references.items()
+            ),
+        )
+        return [content for content in released if content is not None]
+
+    @log_table_dep()
+    async def update_content_image(
+        self, album_id: UUID, content_hash: str, image: FileImageData
+    ) -> None:
+        while True:
+            entity = await self._get_entity(album_id, content_hash)
+
+            if entity is None or entity.get("MediumImageName"):
+                return
+
+            if await self._update_entity(entity, image_data_to_entity(image)):
+                return
+
+    async def iter_album_contents(self, album_id: UUID) -> AsyncIterator[StoredContent]:
+        async for entity in self.table_client.query_entities(
+            f"PartitionKey eq '{album_id}'"
+        ):
+            yield entity_to_content(entity)
@@ -0,0 +1,119 @@
+"""
+This module provides a cache of Shared Access Signatures.
+
+Signatures are issued with expiry times aligned to time buckets, so the same
+signature is returned for all requests happening in the same bucket: this spares
+the computation of HMACs, and makes URLs containing signatures stable, so that
+browsers and intermediate caches can reuse the resources they refer to.
+"""
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, Hashable, Optional, Tuple
+
+logger = logging.getLogger("blacksheep.server")
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def get_bucket_expiry(
+    now: datetime, validity: timedelta, bucket: timedelta
+) -> datetime:
+    """
+    Returns the end of the time bucket containing now + validity, so that the
+    expiry is the same for all times in the same bucket, and signatures are valid
+    at least for the given validity.
+    """
+    deadline = now + validity
+    remainder = (deadline - _EPOCH) % bucket
+
+    if not remainder:
+        return deadline
+    return deadline - remainder + bucket
+
+
+@dataclass
+class SASCacheMetrics:
+    hits: int = 0
+    misses: int = 0
+
+    @property
+    def lookups(self) -> int:
+        return self.hits + self.misses
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / self.lookups if self.lookups else 0.0
+
+
+class SASCache:
+    """
+    Bounded LRU cache of Shared Access Signatures, by the resource and permissions
+    they grant access to.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 10000,
+        bucket: timedelta = timedelta(minutes=30),
+        report_every: int = 1000,
+    ) -> None:
+        self.max_size = max_size
+        self.bucket = bucket
+        self.report_every = report_every
+        self.metrics = SASCacheMetrics()
+        self._items: "OrderedDict[Hashable, Tuple[datetime, str]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def get_token(
+        self,
+        key: Hashable,
+        validity: timedelta,
+        factory: Callable[[datetime], str],
+        now: Optional[datetime] = None,
+    ) -> str:
+        """
+        Returns a signature for the given key, valid for at least the given time,
+        calling the factory with the expiry time to create a new one if needed.
+        """
+        expiry = get_bucket_expiry(now or datetime.utcnow(), validity, self.bucket)
+        item = self._items.get(key)
+
+        if item is not None and item[0] == expiry:
+            self._items.move_to_end(key)
+            self.metrics.hits += 1
+            self._report()
+            return item[1]
+
+        token = factory(expiry)
+        self._items[key] = (expiry, token)
+        self._items.move_to_end(key)
+
+        if len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+
+        self.metrics.misses += 1
+        self._report()
+        return token
+
+    def _report(self) -> None:
+        if self.metrics.lookups % self.report_every:
+            return
+
+        logger.info(
+            "SAS cache hit rate: %.2f (%s lookups, %s entries)",
+            self.metrics.hit_rate,
+            self.metrics.lookups,
+            len(self._items),
+            extra={
+                "custom_dimensions": {
+                    "sas_cache_hits": self.metrics.hits,
+                    "sas_cache_misses": self.metrics.misses,
+                    "sas_cache_hit_rate": self.metrics.hit_rate,
+                    "sas_cache_size": len(self._items),
+                }
+            },
+        )
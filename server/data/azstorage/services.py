@@ -1,29 +1,66 @@
+from typing import Optional
+
+import aiohttp
+from azure.core.pipeline.transport import AioHttpTransport
 from azure.data.tables.aio import TableServiceClient
-from azure.storage.blob import BlobServiceClient
+from azure.storage.blob.aio import BlobServiceClient
 from rodi import Container
 
 from core.events import ServicesRegistrationContext
-from domain.albums import AlbumsDataProvider
 from domain.blobs import BlobsService
+from domain.caching import register_data_providers
+from domain.changes import ChangesDataProvider
 from domain.settings import Settings
-from domain.vfs import FileSystemDataProvider
+from domain.vfs import ContentsDataProvider
 
 from .albums import TableAPIAlbumsDataProvider
 from .blobs import AzureStorageBlobsService
+from .changes import TableAPIChangesDataProvider
+from .contents import TableAPIContentsDataProvider
 from .vfs import TableAPIFileSystemDataProvider
 
 
-def register_storage_blob(container: Container, settings: Settings) -> None:
+def register_storage_blob(
+    container: Container, settings: Settings, context: ServicesRegistrationContext
+) -> None:
     """
     Configures the services using the Blob API of the Storage Account.
 
     Currently the application supports a single Storage Account, but it could
     be refactored to support attaching multiple (storing their key in a
     Azure Key Vault).
+
+    All operations on blobs share a single pool of connections, which is opened
+    when the application starts, and closed when it stops.
     """
-    container.add_instance(
-        BlobServiceClient.from_connection_string(settings.storage_connection_string)
-    )
+    session: Optional[aiohttp.ClientSession] = None
+    blob_service_client: Optional[BlobServiceClient] = None
+
+    async def initialize_blob_client():
+        nonlocal session, blob_service_client
+        session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=settings.blob_connections_limit,
+                ttl_dns_cache=300,
+                keepalive_timeout=30,
+            )
+        )
+        blob_service_client = BlobServiceClient.from_connection_string(
+            settings.storage_connection_string,
+            transport=AioHttpTransport(session=session, session_owner=False),
+        )
+
+        container.add_instance(blob_service_client)
+
+    async def dispose_blob_client():
+        if blob_service_client is not None:
+            await blob_service_client.close()
+
+        if session is not None:
+            await session.close()
+
+    context.initialize += initialize_blob_client
+    context.dispose += dispose_blob_client
 
     container.add_singleton(BlobsService, AzureStorageBlobsService)
 
@@ -62,6 +99,15 @@ def use_storage_table(
         await table_service_client.create_table_if_not_exists(
             TableAPIFileSystemDataProvider.table_name
         )
+        await table_service_client.create_table_if_not_exists(
+            TableAPIFileSystemDataProvider.index_table_name
+        )
+        await table_service_client.create_table_if_not_exists(
+            TableAPIContentsDataProvider.table_name
+        )
+        await table_service_client.create_table_if_not_exists(
+            TableAPIChangesDataProvider.table_name
+        )
 
         await table_service_client.__aenter__()
 
@@ -72,5 +118,11 @@ def use_storage_table(
     context.initialize += initialize_tables
     context.dispose += dispose_client
 
-    container.add_scoped(AlbumsDataProvider, TableAPIAlbumsDataProvider)
-    container.add_scoped(FileSystemDataProvider, TableAPIFileSystemDataProvider)
+    register_data_providers(
+        container,
+        settings,
+        TableAPIAlbumsDataProvider,
+        TableAPIFileSystemDataProvider,
+    )
+    container.add_scoped(ContentsDataProvider, TableAPIContentsDataProvider)
+    container.add_scoped(ChangesDataProvider, TableAPIChangesDataProvider)
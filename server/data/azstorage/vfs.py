@@ -1,16 +1,24 @@
-from typing import List, Optional
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 from uuid import UUID
 
-from azure.data.tables.aio import TableServiceClient
+from azure.core.exceptions import ResourceNotFoundError
+from azure.data.tables import TableTransactionError, UpdateMode
+from azure.data.tables.aio import TableClient, TableServiceClient
 from dateutil.parser import parse
-from essentials.exceptions import ObjectNotFound
+from essentials.exceptions import InvalidArgument, ObjectNotFound
 
+from core.concurrency import gather_limited
+from core.tokens import decode_continuation_token, encode_continuation_token
 from domain.vfs import (
+    DEFAULT_MAX_PATH_DEPTH,
     FileImageData,
     FileSystemDataProvider,
     FileSystemNode,
     FileSystemNodePathFragment,
     FileSystemNodeType,
+    NodesPage,
+    clone_nodes_tree,
 )
 
 from .logs import log_table_dep
@@ -29,31 +37,152 @@ def entity_to_image_data(entity: dict) -> Optional[FileImageData]:
     )
 
 
+NODE_TYPES = {node_type.value: node_type for node_type in FileSystemNodeType}
+
+# properties of node entities, selected when reading nodes to exclude properties
+# that are not needed, like the Timestamp handled by the service
+NODE_PROPERTIES = [
+    "PartitionKey",
+    "RowKey",
+    "AlbumId",
+    "NodeType",
+    "Name",
+    "Slug",
+    "Type",
+    "FileId",
+    "FileExtension",
+    "FileSize",
+    "Icon",
+    "ETag",
+    "LastModifiedTime",
+    "CreationTime",
+    "Hidden",
+    "MediumImageName",
+    "SmallImageName",
+    "ImageWidth",
+    "ImageHeight",
+    "Processing",
+    "ContentHash",
+]
+
+
+def parse_datetime(value: str) -> datetime:
+    # times are stored in ISO format, which is parsed much faster by fromisoformat
+    # than by dateutil, used only for values written in other formats
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return parse(value)
+
+
+def parse_bool(value: Any) -> bool:
+    # the Hidden property was stored as "True" or "False" strings
+    return value is True or value == "True"
+
+
 def entity_to_node(data: dict) -> FileSystemNode:
+    # properties that are not set can be missing, or None when they are selected
+    file_size = data.get("FileSize")
     return FileSystemNode(
         id=UUID(data["RowKey"]),
         album_id=UUID(data["AlbumId"]),
         parent_id=UUID(data["PartitionKey"]),
-        node_type=FileSystemNodeType(data["NodeType"]),
+        node_type=NODE_TYPES[data["NodeType"]],
         name=data["Name"],
         slug=data["Slug"],
         type=data["Type"],
-        file_id=data["FileId"] if "FileId" in data else None,
-        file_extension=data["FileExtension"] if "FileExtension" in data else None,
-        file_size=int(data["FileSize"]) if "FileSize" in data else None,
-        icon=data["Icon"] if "Icon" in data else None,
+        file_id=data.get("FileId"),
+        file_extension=data.get("FileExtension"),
+        file_size=int(file_size) if file_size is not None else None,
+        icon=data.get("Icon"),
         etag=data["ETag"],
-        last_modified_time=parse(data["LastModifiedTime"]),
-        creation_time=parse(data["CreationTime"]),
-        hidden=bool(data["Hidden"]),
+        last_modified_time=parse_datetime(data["LastModifiedTime"]),
+        creation_time=parse_datetime(data["CreationTime"]),
+        hidden=parse_bool(data["Hidden"]),
         items=[],
         image=entity_to_image_data(data),
+        processing=bool(data.get("Processing")),
+        content_hash=data.get("ContentHash"),
     )
 
 
+# maximum number of operations in a single Table API transaction
+MAX_BATCH_SIZE = 100
+
+
+def get_partitioned_batches(
+    operations: List[Tuple[str, dict]]
+) -> List[List[Tuple[str, dict]]]:
+    """
+    Groups the given operations in batches that can be submitted as transactions:
+    all operations in a batch must share the same PartitionKey, and a batch cannot
+    contain more than 100 operations.
+    """
+    by_partition: Dict[str, List[Tuple[str, dict]]] = {}
+
+    for operation in operations:
+        by_partition.setdefault(operation[1]["PartitionKey"], []).append(operation)
+
+    return [
+        partition_operations[index : index + MAX_BATCH_SIZE]
+        for partition_operations in by_partition.values()
+        for index in range(0, len(partition_operations), MAX_BATCH_SIZE)
+    ]
+
+
+# maximum number of rows selected by a single query filter: the Table API
+# accepts at most 15 comparisons in a filter, one is used for the PartitionKey
+MAX_FILTER_ROWS = 14
+
+
+def get_partition_rows_filter(partition_key: str, row_keys: List[str]) -> str:
+    rows_filter = " or ".join(f"RowKey eq '{row_key}'" for row_key in row_keys)
+    return f"PartitionKey eq '{partition_key}' and ({rows_filter})"
+
+
+def get_image_properties(image: Optional[FileImageData]) -> Dict[str, Any]:
+    return {
+        "MediumImageName": image.medium_image_name if image else None,
+        "SmallImageName": image.small_image_name if image else None,
+        "ImageWidth": image.image_width if image else None,
+        "ImageHeight": image.image_height if image else None,
+    }
+
+
+def is_root_node(node: FileSystemNode) -> bool:
+    # root nodes are read with the album id as parent, which is not a node
+    return node.parent_id is None or node.parent_id == node.album_id
+
+
+def get_node_partition_key(node: FileSystemNode) -> str:
+    return str(node.parent_id) if node.parent_id else str(node.album_id)
+
+
+def get_index_partition_key(node_id: str) -> str:
+    # index entities are spread across 256 partitions, by the first two characters
+    # of the node id, so that they can be written in batches
+    return node_id[:2]
+
+
+def get_index_entity(node_id: str, node_partition_key: str) -> dict:
+    """
+    Returns an entity of the secondary index of nodes, which maps the id of a node
+    to its PartitionKey, so that nodes can be read with point queries.
+    """
+    return {
+        "PartitionKey": get_index_partition_key(node_id),
+        "RowKey": node_id,
+        "NodePartitionKey": node_partition_key,
+    }
+
+
+def node_to_index_entity(node: FileSystemNode) -> dict:
+    return get_index_entity(str(node.id), get_node_partition_key(node))
+
+
 def node_to_entity(node: FileSystemNode) -> dict:
     return {
-        "PartitionKey": str(node.parent_id) if node.parent_id else str(node.album_id),
+        "PartitionKey": get_node_partition_key(node),
         "RowKey": str(node.id),
         "AlbumId": str(node.album_id),
         "Name": node.name,
@@ -61,7 +190,7 @@ def node_to_entity(node: FileSystemNode) -> dict:
         "Type": node.type,
         "Icon": node.icon,
         "NodeType": node.node_type.value,
-        "Hidden": str(node.hidden),
+        "Hidden": node.hidden,
         "CreationTime": node.creation_time.isoformat(),
         "LastModifiedTime": node.last_modified_time.isoformat(),
         "ETag": node.etag,
@@ -76,51 +205,249 @@ def node_to_entity(node: FileSystemNode) -> dict:
         ),
         "ImageWidth": node.image.image_width if node.image is not None else None,
         "ImageHeight": node.image.image_height if node.image is not None else None,
+        "Processing": node.processing,
+        "ContentHash": node.content_hash,
     }
 
 
 class TableAPIFileSystemDataProvider(FileSystemDataProvider):
     table_name = "nodes"
+    index_table_name = "nodesindex"
+    max_concurrency = 10
 
     def __init__(self, table_service_client: TableServiceClient) -> None:
         super().__init__()
         self.table_client = table_service_client.get_table_client(self.table_name)
+        self.index_client = table_service_client.get_table_client(self.index_table_name)
 
     @log_table_dep()
     async def get_album_nodes(self, album_id: UUID) -> List[FileSystemNode]:
         items: List[FileSystemNode] = []
         async for entity in self.table_client.query_entities(
-            f"PartitionKey eq '{album_id}'"
+            f"PartitionKey eq '{album_id}'", select=NODE_PROPERTIES
         ):
             items.append(entity_to_node(entity))
         return items
 
+    async def iter_album_nodes(self, album_id: UUID) -> AsyncIterator[FileSystemNode]:
+        # nodes are partitioned by parent: all nodes of an album can only be read
+        # scanning the table, page by page
+        async for entity in self.table_client.query_entities(
+            f"AlbumId eq '{album_id}'", select=NODE_PROPERTIES
+        ):
+            yield entity_to_node(entity)
+
+    async def _get_node_entity(self, node_id: UUID) -> Optional[dict]:
+        key = str(node_id)
+
+        try:
+            index_entity = await self.index_client.get_entity(
+                partition_key=get_index_partition_key(key), row_key=key
+            )
+        except ResourceNotFoundError:
+            # nodes that are not indexed are not found, rather than scanning the
+            # whole table for ids given by clients: see `backfill_nodes_index`
+            return None
+
+        try:
+            return await self.table_client.get_entity(
+                partition_key=index_entity["NodePartitionKey"], row_key=key
+            )
+        except ResourceNotFoundError:
+            return None
+
     @log_table_dep()
     async def get_node(
         self, node_id: UUID, include_children: bool
     ) -> Optional[FileSystemNode]:
-        node: Optional[FileSystemNode] = None
-
-        async for entity in self.table_client.query_entities(f"RowKey eq '{node_id}'"):
-            node = entity_to_node(entity)
+        entity = await self._get_node_entity(node_id)
 
-        if node is None:
+        if entity is None:
             return None
 
+        node = entity_to_node(entity)
+
         if include_children:
             node.items = await self.get_node_children(node_id)
 
         return node
 
+    async def _get_partition_entities(
+        self,
+        table_client: TableClient,
+        partition_key: str,
+        row_keys: List[str],
+        read_partition: bool = False,
+        select: Optional[List[str]] = None,
+    ) -> List[dict]:
+        if read_partition and len(row_keys) > MAX_FILTER_ROWS:
+            # reading the whole partition requires fewer requests than filtering it
+            # by rows, for example when many files of the same folder are requested
+            queries = [f"PartitionKey eq '{partition_key}'"]
+        else:
+            queries = [
+                get_partition_rows_filter(
+                    partition_key, row_keys[index : index + MAX_FILTER_ROWS]
+                )
+                for index in range(0, len(row_keys), MAX_FILTER_ROWS)
+            ]
+
+        selected = set(row_keys)
+        entities: List[dict] = []
+
+        for query in queries:
+            async for entity in table_client.query_entities(query, select=select):
+                if entity["RowKey"] in selected:
+                    entities.append(entity)
+
+        return entities
+
+    @log_table_dep()
+    async def get_nodes(self, nodes_ids: List[UUID]) -> List[FileSystemNode]:
+        # the partitions of nodes are resolved from the index, then nodes are read
+        # with one query per partition, grouping them by parent; nodes that are not
+        # indexed are ignored rather than scanning the table for each of them,
+        # since ids are given by clients: `backfill_nodes_index` indexes old nodes
+        keys = list(dict.fromkeys(str(node_id) for node_id in nodes_ids))
+        index_partitions: Dict[str, List[str]] = {}
+
+        for key in keys:
+            index_partitions.setdefault(get_index_partition_key(key), []).append(key)
+
+        index_entities = [
+            entity
+            for entities in await gather_limited(
+                self.max_concurrency,
+                (
+                    self._get_partition_entities(self.index_client, partition, rows)
+                    for partition, rows in index_partitions.items()
+                ),
+            )
+            for entity in entities
+        ]
+
+        nodes_partitions: Dict[str, List[str]] = {}
+
+        for index_entity in index_entities:
+            nodes_partitions.setdefault(index_entity["NodePartitionKey"], []).append(
+                index_entity["RowKey"]
+            )
+
+        results = await gather_limited(
+            self.max_concurrency,
+            (
+                self._get_partition_entities(
+                    self.table_client,
+                    partition,
+                    rows,
+                    read_partition=True,
+                    select=NODE_PROPERTIES,
+                )
+                for partition, rows in nodes_partitions.items()
+            ),
+        )
+
+        return [entity_to_node(entity) for entities in results for entity in entities]
+
     @log_table_dep()
     async def get_node_children(self, node_id: UUID) -> List[FileSystemNode]:
         items: List[FileSystemNode] = []
         async for entity in self.table_client.query_entities(
-            f"PartitionKey eq '{node_id}'"
+            f"PartitionKey eq '{node_id}'", select=NODE_PROPERTIES
         ):
             items.append(entity_to_node(entity))
         return items
 
+    async def _get_partition_page(
+        self, partition_key: str, page_size: int, continuation_token: Optional[str]
+    ) -> NodesPage:
+        # the native continuation token of the Table API, with the keys of the
+        # next entity, is returned to clients encoded as an opaque string;
+        # entities are sorted by RowKey, which is the id of nodes
+        token: Optional[dict] = None
+
+        if continuation_token:
+            token = decode_continuation_token(continuation_token)
+
+            if token.get("PartitionKey") != partition_key or not isinstance(
+                token.get("RowKey"), str
+            ):
+                raise InvalidArgument("Invalid continuation token.")
+
+        pages = self.table_client.query_entities(
+            f"PartitionKey eq '{partition_key}'",
+            select=NODE_PROPERTIES,
+            results_per_page=page_size,
+        ).by_page(continuation_token=token)
+
+        items: List[FileSystemNode] = []
+
+        async for page in pages:
+            items = [entity_to_node(entity) async for entity in page]
+            break
+
+        next_token = pages.continuation_token  # type: ignore
+        return NodesPage(
+            items, encode_continuation_token(next_token) if next_token else None
+        )
+
+    @log_table_dep()
+    async def get_node_children_page(
+        self, node_id: UUID, page_size: int, continuation_token: Optional[str]
+    ) -> NodesPage:
+        return await self._get_partition_page(
+            str(node_id), page_size, continuation_token
+        )
+
+    @log_table_dep()
+    async def get_album_nodes_page(
+        self, album_id: UUID, page_size: int, continuation_token: Optional[str]
+    ) -> NodesPage:
+        return await self._get_partition_page(
+            str(album_id), page_size, continuation_token
+        )
+
+    async def _get_partition_etags(self, partition_key: str) -> Dict[UUID, str]:
+        # only the properties needed are selected, to reduce the size of responses
+        return {
+            UUID(entity["RowKey"]): entity["ETag"]
+            async for entity in self.table_client.query_entities(
+                f"PartitionKey eq '{partition_key}'", select=["RowKey", "ETag"]
+            )
+        }
+
+    @log_table_dep()
+    async def get_node_children_etags(self, node_id: UUID) -> Dict[UUID, str]:
+        return await self._get_partition_etags(str(node_id))
+
+    @log_table_dep()
+    async def get_album_nodes_etags(self, album_id: UUID) -> Dict[UUID, str]:
+        return await self._get_partition_etags(str(album_id))
+
+    @log_table_dep()
+    async def get_node_descendants(self, node_id: UUID) -> List[FileSystemNode]:
+        # children are partitioned by parent id: the subtree is read one level at a
+        # time, querying the partitions of each level concurrently
+        items: List[FileSystemNode] = []
+        parents_ids = [node_id]
+
+        while parents_ids:
+            levels = await gather_limited(
+                self.max_concurrency,
+                (self.get_node_children(parent_id) for parent_id in parents_ids),
+            )
+            parents_ids = []
+
+            for children in levels:
+                items.extend(children)
+                parents_ids.extend(
+                    child.id
+                    for child in children
+                    if child.node_type == FileSystemNodeType.FOLDER
+                )
+
+        return items
+
     @log_table_dep()
     async def get_node_path(self, node_id: UUID) -> List[FileSystemNodePathFragment]:
         items: List[FileSystemNodePathFragment] = []
@@ -138,7 +465,7 @@ class TableAPIFileSystemDataProvider(FileSystemDataProvider):
         )
 
         for _ in range(3):
-            if node is None or node.parent_id is None:
+            if node is None or is_root_node(node):
                 break
 
             node = await self.get_node(node.parent_id, False)
@@ -157,10 +484,179 @@ class TableAPIFileSystemDataProvider(FileSystemDataProvider):
         items.reverse()
         return items
 
+    @log_table_dep()
+    async def get_node_full_path(
+        self, node_id: UUID, max_depth: int = DEFAULT_MAX_PATH_DEPTH
+    ) -> List[FileSystemNodePathFragment]:
+        # the Table API does not support recursive queries: ancestors are read
+        # one by one, at least the loop is bounded by max_depth
+        items: List[FileSystemNodePathFragment] = []
+        node = await self.get_node(node_id, False)
+
+        if node is None:
+            raise ObjectNotFound()
+
+        while node is not None:
+            if len(items) > max_depth:
+                raise InvalidArgument("MaxPathDepthExceeded")
+
+            items.append(
+                FileSystemNodePathFragment(
+                    id=node.id,
+                    parent_id=node.parent_id,
+                    name=node.name,
+                )
+            )
+
+            if is_root_node(node):
+                break
+
+            node = await self.get_node(node.parent_id, False)
+
+        items.reverse()
+        return items
+
+    async def _submit_operations(
+        self,
+        operations: List[Tuple[str, dict]],
+        table_client: Optional[TableClient] = None,
+    ) -> None:
+        client = table_client or self.table_client
+        await gather_limited(
+            self.max_concurrency,
+            (
+                client.submit_transaction(batch)
+                for batch in get_partitioned_batches(operations)
+            ),
+        )
+
+    async def _index_nodes(self, nodes: List[FileSystemNode]) -> None:
+        await self._submit_operations(
+            [("upsert", node_to_index_entity(node)) for node in nodes],
+            self.index_client,
+        )
+
+    async def _delete_index(self, nodes: List[FileSystemNode]) -> None:
+        async def delete_batch(batch: List[Tuple[str, dict]]) -> None:
+            try:
+                await self.index_client.submit_transaction(batch)
+            except TableTransactionError:
+                # some nodes might not be indexed, and a transaction fails entirely
+                # if any entity doesn't exist; delete_entity ignores missing entities
+                for _, entity in batch:
+                    await self.index_client.delete_entity(
+                        partition_key=entity["PartitionKey"], row_key=entity["RowKey"]
+                    )
+
+        await gather_limited(
+            self.max_concurrency,
+            (
+                delete_batch(batch)
+                for batch in get_partitioned_batches(
+                    [("delete", node_to_index_entity(node)) for node in nodes]
+                )
+            ),
+        )
+
     @log_table_dep()
     async def create_nodes(self, nodes: List[FileSystemNode]) -> None:
+        # Table API transactions cannot span partitions, let alone tables: the index
+        # is written first, so that an existing node is always indexed
+        await self._index_nodes(nodes)
+
         operations = [("create", node_to_entity(node)) for node in nodes]
-        await self.table_client.submit_transaction(operations)
+        await self._submit_operations(operations)
+
+    @log_table_dep()
+    async def update_node_image(
+        self,
+        node_id: UUID,
+        image: Optional[FileImageData],
+        modification_time: datetime,
+    ) -> None:
+        entity = await self._get_node_entity(node_id)
+
+        if entity is None:
+            # the node was deleted while its picture was processed
+            return
+
+        await self.table_client.update_entity(
+            entity={
+                "PartitionKey": entity["PartitionKey"],
+                "RowKey": entity["RowKey"],
+                **get_image_properties(image),
+                "Processing": False,
+                "LastModifiedTime": modification_time.isoformat(),
+                "ETag": modification_time.isoformat(),
+            },
+            mode=UpdateMode.MERGE,
+        )
+
+    @log_table_dep()
+    async def update_nodes_images(
+        self,
+        images: Dict[UUID, Optional[FileImageData]],
+        modification_time: datetime,
+    ) -> None:
+        # nodes are read with one query per partition, to update them in batches
+        nodes = await self.get_nodes(list(images))
+
+        async def update_batch(batch: List[Tuple[str, dict]]) -> None:
+            try:
+                await self.table_client.submit_transaction(batch)
+            except TableTransactionError:
+                # a transaction fails entirely if any node was deleted meanwhile,
+                # while update_node_image ignores deleted nodes
+                for _, entity in batch:
+                    await self.update_node_image(
+                        UUID(entity["RowKey"]),
+                        images[UUID(entity["RowKey"])],
+                        modification_time,
+                    )
+
+        await gather_limited(
+            self.max_concurrency,
+            (
+                update_batch(batch)
+                for batch in get_partitioned_batches(
+                    [
+                        (
+                            "update",
+                            {
+                                "PartitionKey": get_node_partition_key(node),
+                                "RowKey": str(node.id),
+                                **get_image_properties(images[node.id]),
+                                "Processing": False,
+                                "LastModifiedTime": modification_time.isoformat(),
+                                "ETag": modification_time.isoformat(),
+                            },
+                        )
+                        for node in nodes
+                    ]
+                )
+            ),
+        )
+
+    @log_table_dep()
+    async def clone_nodes(
+        self,
+        nodes: List[FileSystemNode],
+        target_parent_id: Optional[UUID],
+        creation_time: datetime,
+    ) -> List[FileSystemNode]:
+        subtrees = await gather_limited(
+            self.max_concurrency,
+            (
+                self.get_node_descendants(node.id)
+                for node in nodes
+                if node.node_type == FileSystemNodeType.FOLDER
+            ),
+        )
+        descendants = [node for subtree in subtrees for node in subtree]
+
+        clones = clone_nodes_tree(nodes + descendants, target_parent_id, creation_time)
+        await self.create_nodes(clones)
+        return clones[: len(nodes)]
 
     @log_table_dep()
     async def update_nodes(self, nodes: List[FileSystemNode]) -> None:
@@ -172,34 +668,99 @@ class TableAPIFileSystemDataProvider(FileSystemDataProvider):
         # more often than updates.
         # The opposite scenario would require not querying children by PK,
         # thus would cause a worse performance for reads.
-        existing_nodes = [await self.get_node(node.id, False) for node in nodes]
-        existing_nodes = [node for node in existing_nodes if node]
-        to_delete: List[FileSystemNode] = []
+        # Existing entities are read concurrently with point queries, and all
+        # operations are grouped by partition in batches submitted in parallel.
+        existing_entities = await gather_limited(
+            self.max_concurrency,
+            (self._get_node_entity(node.id) for node in nodes),
+        )
+        previous_partitions = {
+            entity["RowKey"]: entity["PartitionKey"]
+            for entity in existing_entities
+            if entity is not None
+        }
+
+        upserts: List[Tuple[str, dict]] = []
+        deletes: List[Tuple[str, dict]] = []
 
         for node in nodes:
-            corresponding_node = next(
-                (item for item in existing_nodes if item.id == node.id), None
-            )
-            if corresponding_node and corresponding_node.parent_id != node.parent_id:
-                to_delete.append(corresponding_node)
+            entity = node_to_entity(node)
+            upserts.append(("upsert", entity))
+
+            previous_partition = previous_partitions.get(entity["RowKey"])
+
+            if previous_partition and previous_partition != entity["PartitionKey"]:
+                deletes.append(
+                    (
+                        "delete",
+                        {
+                            "PartitionKey": previous_partition,
+                            "RowKey": entity["RowKey"],
+                        },
+                    )
+                )
 
-        operations = [("upsert", node_to_entity(node)) for node in nodes]
-        await self.table_client.submit_transaction(operations)
+        await self._index_nodes(nodes)
+        await self._submit_operations(upserts)
 
-        if to_delete:
-            operations = [("delete", node_to_entity(node)) for node in to_delete]
-            await self.table_client.submit_transaction(operations)
+        if deletes:
+            await self._submit_operations(deletes)
 
     @log_table_dep()
     async def delete_nodes(self, nodes_ids: List[UUID]) -> None:
-        nodes: List[FileSystemNode] = []
-        for node_id in nodes_ids:
-            node = await self.get_node(node_id, False)
+        # the Table API has no cascading deletes: descendants of deleted folders
+        # are read and deleted explicitly, to not leave orphan entities
+        found_nodes = await gather_limited(
+            self.max_concurrency,
+            (self.get_node(node_id, False) for node_id in dict.fromkeys(nodes_ids)),
+        )
+        nodes = [node for node in found_nodes if node is not None]
+
+        subtrees = await gather_limited(
+            self.max_concurrency,
+            (
+                self.get_node_descendants(node.id)
+                for node in nodes
+                if node.node_type == FileSystemNodeType.FOLDER
+            ),
+        )
 
-            if node is not None:
-                nodes.append(node)
+        for subtree in subtrees:
+            nodes.extend(subtree)
 
-        operations = [
-            ("delete", node_to_entity(node)) for node in nodes if node is not None
-        ]
-        await self.table_client.submit_transaction(operations)
+        # the given nodes can include descendants of other given nodes, and a
+        # transaction cannot contain more operations on the same entity
+        nodes = list({node.id: node for node in nodes}.values())
+
+        await self._submit_operations(
+            [("delete", node_to_entity(node)) for node in nodes]
+        )
+        await self._delete_index(nodes)
+
+
+async def backfill_nodes_index(table_service_client: TableServiceClient) -> int:
+    """
+    Writes the secondary index entities for all existing nodes, reading the nodes
+    table page by page. Returns the number of indexed nodes.
+    """
+    provider = TableAPIFileSystemDataProvider(table_service_client)
+    count = 0
+    operations: List[Tuple[str, dict]] = []
+
+    async for entity in provider.table_client.list_entities(
+        select=["PartitionKey", "RowKey"]
+    ):
+        operations.append(
+            ("upsert", get_index_entity(entity["RowKey"], entity["PartitionKey"]))
+        )
+
+        if len(operations) >= 10000:
+            await provider._submit_operations(operations, provider.index_client)
+            count += len(operations)
+            operations = []
+
+    if operations:
+        await provider._submit_operations(operations, provider.index_client)
+        count += len(operations)
+
+    return count
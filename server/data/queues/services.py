@@ -0,0 +1,23 @@
+from rodi import Container
+
+from core.events import ServicesRegistrationContext
+from domain.pictures import PicturesQueue
+from domain.settings import Settings
+
+from .sqlite import SQLitePicturesQueue
+
+
+def register_pictures_queue(
+    container: Container, settings: Settings, context: ServicesRegistrationContext
+) -> None:
+    """
+    Configures the durable queue used to process pictures in background. The
+    SQLite database is opened only if background processing is enabled.
+    """
+    queue = SQLitePicturesQueue(settings.pictures_queue_path)
+
+    container.add_instance(queue, declared_class=PicturesQueue)
+
+    if settings.background_pictures_processing:
+        context.initialize += queue.initialize
+        context.dispose += queue.dispose
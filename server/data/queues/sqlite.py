@@ -0,0 +1,196 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+from uuid import UUID
+
+import aiosqlite
+
+from domain.pictures import PicturesQueue, PictureTask, PictureTaskInput
+
+# tasks claimed by a worker that doesn't complete them within this time, for
+# example because the process was stopped, become available again
+LEASE_DURATION = timedelta(minutes=10)
+
+
+def to_timestamp(value: datetime) -> float:
+    return value.replace(tzinfo=timezone.utc).timestamp()
+
+
+class SQLitePicturesQueue(PicturesQueue):
+    """
+    Queue of pictures to process, stored in a local SQLite database so that tasks
+    survive restarts of the application.
+    """
+
+    def __init__(self, db_path: str) -> None:
+        self.db_path = db_path
+        self._connection: Optional[aiosqlite.Connection] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._new_tasks: Optional[asyncio.Event] = None
+
+    @property
+    def connection(self) -> aiosqlite.Connection:
+        if self._connection is None:
+            raise TypeError("The queue is not initialized.")
+        return self._connection
+
+    @property
+    def lock(self) -> asyncio.Lock:
+        if self._lock is None:
+            raise TypeError("The queue is not initialized.")
+        return self._lock
+
+    @property
+    def new_tasks(self) -> asyncio.Event:
+        if self._new_tasks is None:
+            raise TypeError("The queue is not initialized.")
+        return self._new_tasks
+
+    async def initialize(self) -> None:
+        # synchronization primitives are created here, to bind them to the event
+        # loop that runs the application
+        self._lock = asyncio.Lock()
+        self._new_tasks = asyncio.Event()
+        self._connection = await aiosqlite.connect(self.db_path, isolation_level=None)
+        await self._connection.execute("PRAGMA journal_mode=WAL;")
+        await self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS picture_tasks (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                node_id TEXT NOT NULL,
+                container_name TEXT NOT NULL,
+                file_name TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                due_at REAL NOT NULL,
+                last_error TEXT
+            );
+            """
+        )
+        await self._connection.execute(
+            """
+            CREATE INDEX IF NOT EXISTS ix_picture_tasks_status_due_at
+            ON picture_tasks (status, due_at);
+            """
+        )
+        await self._connection.execute(
+            """
+            CREATE INDEX IF NOT EXISTS ix_picture_tasks_node_id
+            ON picture_tasks (node_id);
+            """
+        )
+
+    async def dispose(self) -> None:
+        if self._connection is not None:
+            await self._connection.close()
+            self._connection = None
+
+    async def enqueue(self, tasks: List[PictureTaskInput]) -> None:
+        now = to_timestamp(datetime.utcnow())
+
+        async with self.lock:
+            # pictures can be submitted more than once, for example when clients
+            # retry requests: nodes whose tasks are waiting are not enqueued again
+            await self.connection.executemany(
+                """
+                INSERT INTO picture_tasks (node_id, container_name, file_name, due_at)
+                SELECT ?, ?, ?, ?
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM picture_tasks
+                    WHERE node_id = ? AND status IN ('pending', 'running')
+                );
+                """,
+                [
+                    (
+                        str(task.node_id),
+                        task.container_name,
+                        task.file_name,
+                        now,
+                        str(task.node_id),
+                    )
+                    for task in tasks
+                ],
+            )
+
+        self.new_tasks.set()
+
+    async def wait_for_tasks(self, timeout: float) -> None:
+        try:
+            await asyncio.wait_for(self.new_tasks.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self.new_tasks.clear()
+
+    async def claim(self) -> Optional[PictureTask]:
+        now = datetime.utcnow()
+
+        async with self.lock:
+            # BEGIN IMMEDIATE acquires the write lock of the database, so the same
+            # task is never claimed twice, even by different processes
+            await self.connection.execute("BEGIN IMMEDIATE;")
+            try:
+                cursor = await self.connection.execute(
+                    """
+                    SELECT id, node_id, container_name, file_name, attempts
+                    FROM picture_tasks
+                    WHERE status IN ('pending', 'running') AND due_at <= ?
+                    ORDER BY due_at
+                    LIMIT 1;
+                    """,
+                    (to_timestamp(now),),
+                )
+                row = await cursor.fetchone()
+
+                if row is None:
+                    await self.connection.execute("COMMIT;")
+                    return None
+
+                await self.connection.execute(
+                    """
+                    UPDATE picture_tasks
+                    SET status = 'running', attempts = attempts + 1, due_at = ?
+                    WHERE id = ?;
+                    """,
+                    (to_timestamp(now + LEASE_DURATION), row[0]),
+                )
+                await self.connection.execute("COMMIT;")
+            except BaseException:
+                # includes the cancellation of workers, while the application stops
+                await self.connection.execute("ROLLBACK;")
+                raise
+
+        return PictureTask(
+            id=row[0],
+            node_id=UUID(row[1]),
+            container_name=row[2],
+            file_name=row[3],
+            attempts=row[4] + 1,
+        )
+
+    async def complete(self, task: PictureTask) -> None:
+        async with self.lock:
+            await self.connection.execute(
+                "DELETE FROM picture_tasks WHERE id = ?;", (task.id,)
+            )
+
+    async def retry(self, task: PictureTask, error: str, retry_at: datetime) -> None:
+        async with self.lock:
+            await self.connection.execute(
+                """
+                UPDATE picture_tasks
+                SET status = 'pending', due_at = ?, last_error = ?
+                WHERE id = ?;
+                """,
+                (to_timestamp(retry_at), error, task.id),
+            )
+
+    async def fail(self, task: PictureTask, error: str) -> None:
+        async with self.lock:
+            await self.connection.execute(
+                """
+                UPDATE picture_tasks
+                SET status = 'failed', last_error = ?
+                WHERE id = ?;
+                """,
+                (error, task.id),
+            )
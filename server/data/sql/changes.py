@@ -0,0 +1,112 @@
+from datetime import datetime
+from typing import List
+from uuid import UUID
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import func
+from sqlalchemy.sql.expression import delete, insert, select
+
+from domain.changes import ChangesDataProvider, NodeChange, NodeChangeType
+
+from .dbmodel import NodeChangeEntity
+from .mapping import get_uuid, map_optional_uuid
+
+CHANGE_COLUMNS = (
+    NodeChangeEntity.id,
+    NodeChangeEntity.node_id,
+    NodeChangeEntity.parent_id,
+    NodeChangeEntity.change_type,
+    NodeChangeEntity.created_at,
+)
+
+
+def change_row_to_change(row) -> NodeChange:
+    sequence, node_id, parent_id, change_type, created_at = row
+    return NodeChange(
+        node_id=get_uuid(node_id),
+        parent_id=map_optional_uuid(parent_id),
+        change_type=NodeChangeType(change_type),
+        time=created_at,
+        sequence=sequence,
+    )
+
+
+class SQLChangesDataProvider(ChangesDataProvider):
+    def __init__(self, session: AsyncSession) -> None:
+        super().__init__()
+        self.session = session
+
+    async def append_changes(self, album_id: UUID, changes: List[NodeChange]) -> int:
+        in_album = NodeChangeEntity.album_id == str(album_id)
+
+        async with self.session:
+            # sequence numbers are assigned by the database, and are not read back
+            # for each change, to insert all changes with a single statement
+            await self.session.execute(
+                insert(NodeChangeEntity),
+                [
+                    {
+                        "album_id": str(album_id),
+                        "node_id": str(change.node_id),
+                        "parent_id": str(change.parent_id)
+                        if change.parent_id
+                        else None,
+                        "change_type": change.change_type.value,
+                        "created_at": change.time,
+                    }
+                    for change in changes
+                ],
+            )
+            result = await self.session.execute(
+                select(func.max(NodeChangeEntity.id)).where(in_album)
+            )
+            last_sequence = result.scalar()
+            await self.session.commit()
+
+        return last_sequence or 0
+
+    async def get_changes(
+        self, album_id: UUID, since: int, limit: int
+    ) -> List[NodeChange]:
+        async with self.session:
+            results = await self.session.execute(
+                select(*CHANGE_COLUMNS)
+                .where(
+                    (NodeChangeEntity.album_id == str(album_id))
+                    & (NodeChangeEntity.id > since)
+                )
+                .order_by(NodeChangeEntity.id)
+                .limit(limit)
+            )
+            return [change_row_to_change(row) for row in results]
+
+    async def get_last_sequence(self, album_id: UUID, until: datetime) -> int:
+        in_album = NodeChangeEntity.album_id == str(album_id)
+
+        async with self.session:
+            result = await self.session.execute(
+                select(func.min(NodeChangeEntity.id)).where(
+                    in_album & (NodeChangeEntity.created_at > until)
+                )
+            )
+            first_unsettled = result.scalar()
+
+            if first_unsettled is not None:
+                return first_unsettled - 1
+
+            result = await self.session.execute(
+                select(func.max(NodeChangeEntity.id)).where(in_album)
+            )
+            return result.scalar() or 0
+
+    async def delete_changes(self, album_id: UUID, before: datetime) -> None:
+        async with self.session:
+            await self.session.execute(
+                delete(NodeChangeEntity)
+                .where(
+                    (NodeChangeEntity.album_id == str(album_id))
+                    & (NodeChangeEntity.created_at < before)
+                )
+                .execution_options(synchronize_session=False)  # type: ignore
+            )
+            await self.session.commit()
@@ -0,0 +1,250 @@
+from datetime import datetime
+from typing import AsyncIterator, Dict, Iterable, List
+from uuid import UUID
+
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import func
+from sqlalchemy.sql.expression import delete, insert, select, update
+
+from domain.vfs import ContentsDataProvider, FileImageData, StoredContent
+
+from .dbmodel import ContentEntity
+from .mapping import get_uuid
+from .vfs import STREAM_PAGE_SIZE, entity_to_image_data
+
+# columns of the image data, which are set only if they are not set already
+IMAGE_COLUMNS = (
+    "medium_image_name",
+    "small_image_name",
+    "image_width",
+    "image_height",
+)
+
+
+def content_entity_to_content(entity: ContentEntity) -> StoredContent:
+    return StoredContent(
+        album_id=get_uuid(entity.album_id),
+        content_hash=entity.content_hash,
+        file_id=entity.file_id,
+        file_extension=entity.file_extension,
+        image=entity_to_image_data(entity),
+        references=entity.references_count,
+    )
+
+
+def content_to_content_record(content: StoredContent, now: datetime) -> dict:
+    image = content.image
+    return {
+        "album_id": str(content.album_id),
+        "content_hash": content.content_hash,
+        "file_id": content.file_id,
+        "file_extension": content.file_extension,
+        "medium_image_name": image.medium_image_name if image else None,
+        "small_image_name": image.small_image_name if image else None,
+        "image_width": image.image_width if image else None,
+        "image_height": image.image_height if image else None,
+        "references_count": content.references,
+        "created_at": now,
+        "updated_at": now,
+        "etag": now.isoformat(),
+    }
+
+
+class SQLContentsDataProvider(ContentsDataProvider):
+    def __init__(self, session: AsyncSession) -> None:
+        super().__init__()
+        self.session = session
+
+    def _get_insert(self):
+        # references are incremented with upserts, which are specific of dialects
+        dialect_name = self.session.bind.dialect.name  # type: ignore
+
+        if dialect_name == "postgresql":
+            return postgresql.insert(ContentEntity)
+        if dialect_name == "sqlite":
+            return sqlite.insert(ContentEntity)
+        return None
+
+    async def _add_content_references(
+        self, content: StoredContent, now: datetime
+    ) -> None:
+        # without upserts, references are incremented with an update, and contents
+        # that are not stored are inserted: concurrent inserts of the same content
+        # fail, and are retried as updates
+        record = content_to_content_record(content, now)
+
+        while True:
+            result = await self.session.execute(
+                update(ContentEntity)
+                .where(
+                    (ContentEntity.album_id == record["album_id"])
+                    & (ContentEntity.content_hash == content.content_hash)
+                )
+                .values(
+                    references_count=ContentEntity.references_count
+                    + content.references,
+                    updated_at=now,
+                    etag=record["etag"],
+                    **{
+                        name: func.coalesce(getattr(ContentEntity, name), record[name])
+                        for name in IMAGE_COLUMNS
+                    },
+                )
+                .execution_options(synchronize_session=False)  # type: ignore
+            )
+
+            if result.rowcount:  # type: ignore
+                return
+
+            try:
+                async with self.session.begin_nested():
+                    await self.session.execute(insert(ContentEntity).values(record))
+                return
+            except IntegrityError:
+                continue
+
+    async def get_contents(
+        self, album_id: UUID, contents_hashes: Iterable[str]
+    ) -> Dict[str, StoredContent]:
+        hashes = list(contents_hashes)
+
+        if not hashes:
+            return {}
+
+        async with self.session:
+            results = await self.session.execute(
+                select(ContentEntity).where(
+                    (ContentEntity.album_id == str(album_id))
+                    & ContentEntity.content_hash.in_(hashes)
+                )
+            )
+            return {
+                record.content_hash: content_entity_to_content(record)
+                for record in results.scalars()
+            }
+
+    async def add_references(self, contents: List[StoredContent]) -> None:
+        if not contents:
+            return
+
+        now = datetime.utcnow()
+        statement = self._get_insert()
+
+        if statement is None:
+            async with self.session:
+                for content in contents:
+                    await self._add_content_references(content, now)
+                await self.session.commit()
+            return
+
+        statement = statement.on_conflict_do_update(
+            index_elements=[ContentEntity.album_id, ContentEntity.content_hash],
+            set_={
+                "references_count": ContentEntity.references_count
+                + statement.excluded.references_count,
+                "updated_at": statement.excluded.updated_at,
+                "etag": statement.excluded.etag,
+                **{
+                    name: func.coalesce(
+                        getattr(ContentEntity, name), statement.excluded[name]
+                    )
+                    for name in IMAGE_COLUMNS
+                },
+            },
+        )
+
+        async with self.session:
+            await self.session.execute(
+                statement,
+                [content_to_content_record(content, now) for content in contents],
+            )
+            await self.session.commit()
+
+    async def release_references(
+        self, album_id: UUID, references: Dict[str, int]
+    ) -> List[StoredContent]:
+        if not references:
+            return []
+
+        now = datetime.utcnow()
+        hashes_by_count: Dict[int, List[str]] = {}
+
+        for content_hash, count in references.items():
+            hashes_by_count.setdefault(count, []).append(content_hash)
+
+        in_album = ContentEntity.album_id == str(album_id)
+
+        async with self.session:
+            # references are decremented atomically, with a statement for each
+            # distinct number of released references
+            for count, hashes in hashes_by_count.items():
+                await self.session.execute(
+                    update(ContentEntity)
+                    .where(in_album & ContentEntity.content_hash.in_(hashes))
+                    .values(
+                        references_count=ContentEntity.references_count - count,
+                        updated_at=now,
+                        etag=now.isoformat(),
+                    )
+                    .execution_options(synchronize_session=False)  # type: ignore
+                )
+
+            released_condition = (
+                in_album
+                & ContentEntity.content_hash.in_(list(references))
+                & (ContentEntity.references_count <= 0)
+            )
+            results = await self.session.execute(
+                select(ContentEntity).where(released_condition)
+            )
+            released = [
+                content_entity_to_content(record) for record in results.scalars()
+            ]
+
+            if released:
+                await self.session.execute(
+                    delete(ContentEntity)
+                    .where(released_condition)
+                    .execution_options(synchronize_session=False)  # type: ignore
+                )
+
+            await self.session.commit()
+
+        return released
+
+    async def update_content_image(
+        self, album_id: UUID, content_hash: str, image: FileImageData
+    ) -> None:
+        now = datetime.utcnow()
+
+        async with self.session:
+            await self.session.execute(
+                update(ContentEntity)
+                .where(
+                    (ContentEntity.album_id == str(album_id))
+                    & (ContentEntity.content_hash == content_hash)
+                    & (ContentEntity.medium_image_name == None)  # noqa
+                )
+                .values(
+                    medium_image_name=image.medium_image_name,
+                    small_image_name=image.small_image_name,
+                    image_width=image.image_width,
+                    image_height=image.image_height,
+                    updated_at=now,
+                    etag=now.isoformat(),
+                )
+                .execution_options(synchronize_session=False)  # type: ignore
+            )
+            await self.session.commit()
+
+    async def iter_album_contents(self, album_id: UUID) -> AsyncIterator[StoredContent]:
+        async with self.session:
+            results = await self.session.stream(
+                select(*ContentEntity.__table__.columns)
+                .where(ContentEntity.album_id == str(album_id))
+                .execution_options(yield_per=STREAM_PAGE_SIZE)
+            )
+            async for record in results:
+                yield content_entity_to_content(record)
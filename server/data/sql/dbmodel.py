@@ -1,6 +1,6 @@
 import uuid
 
-from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, String
+from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Index, Integer, String
 from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import registry, relationship  # type: ignore
 from sqlalchemy.sql import expression
@@ -76,14 +76,18 @@ class AlbumEntity(ETagMixin, Base):
 # https://docs.sqlalchemy.org/en/14/orm/self_referential.html
 class NodeEntity(ETagMixin, Base):
     __tablename__ = "nodes"
+    # indexes support keyset pagination of the children of nodes, and of the root
+    # nodes of albums, sorted by name
+    __table_args__ = (
+        Index("ix_nodes_parent_id_name_id", "parent_id", "name", "id"),
+        Index(
+            "ix_nodes_album_id_parent_id_name_id", "album_id", "parent_id", "name", "id"
+        ),
+    )
 
     id = Column("id", UUID(), primary_key=True, default=uuid.uuid4)
-    album_id = Column(
-        ForeignKey("albums.id", ondelete="CASCADE"), nullable=False, index=True
-    )
-    parent_id = Column(
-        ForeignKey("nodes.id", ondelete="CASCADE"), nullable=True, index=True
-    )
+    album_id = Column(ForeignKey("albums.id", ondelete="CASCADE"), nullable=False)
+    parent_id = Column(ForeignKey("nodes.id", ondelete="CASCADE"), nullable=True)
     children = relationship("NodeEntity")
     name = Column(String(255), nullable=False)
     slug = Column(String(255), nullable=False)
@@ -98,3 +102,63 @@ class NodeEntity(ETagMixin, Base):
     small_image_name = Column(String(255), nullable=True)
     image_width = Column(Integer, nullable=True)
     image_height = Column(Integer, nullable=True)
+    processing = Column(
+        Boolean, nullable=False, default=False, server_default=expression.false()
+    )
+    content_hash = Column(String(64), nullable=True)
+
+
+# Closure table of the virtual file system: it stores a row for each pair of
+# ancestor and descendant nodes (including each node with itself, at depth 0),
+# so that all ancestors or all descendants of a node can be obtained with a single
+# indexed query. It is kept in sync by the SQLFileSystemDataProvider.
+class NodeClosureEntity(Base):
+    __tablename__ = "nodes_closure"
+
+    ancestor_id = Column(
+        ForeignKey("nodes.id", ondelete="CASCADE"), primary_key=True, nullable=False
+    )
+    descendant_id = Column(
+        ForeignKey("nodes.id", ondelete="CASCADE"),
+        primary_key=True,
+        nullable=False,
+        index=True,
+    )
+    depth = Column(Integer, nullable=False)
+
+
+# Log of the changes of the nodes of albums, whose ids are their sequence numbers:
+# ids are never reused, since the log is compacted deleting the oldest changes.
+# Nodes are not referenced with foreign keys, since changes of deleted nodes are
+# kept until they are compacted.
+class NodeChangeEntity(Base):
+    __tablename__ = "nodes_changes"
+    __table_args__ = (
+        Index("ix_nodes_changes_album_id_id", "album_id", "id"),
+        {"sqlite_autoincrement": True},
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    album_id = Column(ForeignKey("albums.id", ondelete="CASCADE"), nullable=False)
+    node_id = Column(UUID(), nullable=False)
+    parent_id = Column(UUID(), nullable=True)
+    change_type = Column(String(20), nullable=False)
+    created_at = Column(DateTime, nullable=False)
+
+
+# Contents shared by the files with the same hash in an album, when content
+# deduplication is enabled: a blob is deleted when no node references it.
+class ContentEntity(ETagMixin, Base):
+    __tablename__ = "contents"
+
+    album_id = Column(
+        ForeignKey("albums.id", ondelete="CASCADE"), primary_key=True, nullable=False
+    )
+    content_hash = Column(String(64), primary_key=True, nullable=False)
+    file_id = Column(String(255), nullable=False)
+    file_extension = Column(String(50), nullable=True)
+    medium_image_name = Column(String(255), nullable=True)
+    small_image_name = Column(String(255), nullable=True)
+    image_width = Column(Integer, nullable=True)
+    image_height = Column(Integer, nullable=True)
+    references_count = Column(Integer, nullable=False)
@@ -1,13 +1,20 @@
 from rodi import Container
 
-from domain.albums import AlbumsDataProvider
-from domain.vfs import FileSystemDataProvider
+from domain.caching import register_data_providers
+from domain.changes import ChangesDataProvider
+from domain.settings import Settings
+from domain.vfs import ContentsDataProvider
 
 from .albums import SQLAlbumsDataProvider
+from .changes import SQLChangesDataProvider
+from .contents import SQLContentsDataProvider
 from .vfs import SQLFileSystemDataProvider
 
 
-def register_sql_services(container: Container) -> None:
+def register_sql_services(container: Container, settings: Settings) -> None:
     # services **MUST** be scoped here!
-    container.add_scoped(AlbumsDataProvider, SQLAlbumsDataProvider)
-    container.add_scoped(FileSystemDataProvider, SQLFileSystemDataProvider)
+    register_data_providers(
+        container, settings, SQLAlbumsDataProvider, SQLFileSystemDataProvider
+    )
+    container.add_scoped(ContentsDataProvider, SQLContentsDataProvider)
+    container.add_scoped(ChangesDataProvider, SQLChangesDataProvider)
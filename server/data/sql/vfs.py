@@ -1,24 +1,42 @@
-from typing import List, Optional
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple, Union
 from uuid import UUID
 
-from essentials.exceptions import ObjectNotFound
+from essentials.exceptions import InvalidArgument, ObjectNotFound
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.sql import text
-from sqlalchemy.sql.expression import delete, select
+from sqlalchemy.sql.expression import (
+    and_,
+    bindparam,
+    delete,
+    insert,
+    or_,
+    select,
+    update,
+)
 
+from core.tokens import decode_continuation_token, encode_continuation_token
 from domain.vfs import (
+    DEFAULT_MAX_PATH_DEPTH,
     FileImageData,
     FileSystemDataProvider,
     FileSystemNode,
     FileSystemNodePathFragment,
     FileSystemNodeType,
+    NodesPage,
+    clone_nodes_tree,
 )
 
-from .dbmodel import NodeEntity
+from .dbmodel import ContentEntity, NodeClosureEntity, NodeEntity
 from .mapping import get_uuid, map_optional_uuid
 
+# number of rows fetched at once when streaming query results
+STREAM_PAGE_SIZE = 1000
+
 
-def entity_to_image_data(entity: NodeEntity) -> Optional[FileImageData]:
+def entity_to_image_data(
+    entity: Union[NodeEntity, ContentEntity]
+) -> Optional[FileImageData]:
     medium_image_name = entity.medium_image_name
 
     if not medium_image_name:
@@ -31,53 +49,161 @@ def entity_to_image_data(entity: NodeEntity) -> Optional[FileImageData]:
     )
 
 
-def node_entity_to_node(entity: NodeEntity) -> FileSystemNode:
+# columns read to obtain nodes: rows of plain columns are mapped by position, which
+# is cheaper than loading ORM entities and keeping them in the identity map
+NODE_COLUMNS = (
+    NodeEntity.id,
+    NodeEntity.album_id,
+    NodeEntity.parent_id,
+    NodeEntity.name,
+    NodeEntity.slug,
+    NodeEntity.hidden,
+    NodeEntity.created_at,
+    NodeEntity.updated_at,
+    NodeEntity.file_id,
+    NodeEntity.file_extension,
+    NodeEntity.file_size,
+    NodeEntity.folder,
+    NodeEntity.type,
+    NodeEntity.icon,
+    NodeEntity.etag,
+    NodeEntity.medium_image_name,
+    NodeEntity.small_image_name,
+    NodeEntity.image_width,
+    NodeEntity.image_height,
+    NodeEntity.processing,
+    NodeEntity.content_hash,
+)
+
+
+def node_row_to_node(row: Sequence[Any]) -> FileSystemNode:
+    """Returns a node from a row of the NODE_COLUMNS."""
+    (
+        node_id,
+        album_id,
+        parent_id,
+        name,
+        slug,
+        hidden,
+        created_at,
+        updated_at,
+        file_id,
+        file_extension,
+        file_size,
+        folder,
+        node_type,
+        icon,
+        etag,
+        medium_image_name,
+        small_image_name,
+        image_width,
+        image_height,
+        processing,
+        content_hash,
+    ) = row
+    # ids are converted to UUID objects by the UUID column type
     return FileSystemNode(
-        id=get_uuid(entity.id),
-        album_id=get_uuid(entity.album_id),
-        parent_id=map_optional_uuid(entity.parent_id),
-        name=entity.name,
-        slug=entity.slug,
-        hidden=entity.hidden,
-        creation_time=entity.created_at,
-        last_modified_time=entity.updated_at,
-        file_id=entity.file_id,
-        file_extension=entity.file_extension,
-        file_size=entity.file_size,
-        node_type=FileSystemNodeType.FOLDER
-        if entity.folder
-        else FileSystemNodeType.FILE,
-        type=entity.type,
-        icon=entity.icon,
-        etag=entity.etag,
+        id=node_id,
+        album_id=album_id,
+        parent_id=parent_id,
+        name=name,
+        slug=slug,
+        hidden=hidden,
+        creation_time=created_at,
+        last_modified_time=updated_at,
+        file_id=file_id,
+        file_extension=file_extension,
+        file_size=file_size,
+        node_type=FileSystemNodeType.FOLDER if folder else FileSystemNodeType.FILE,
+        type=node_type,
+        icon=icon,
+        etag=etag,
         items=[],
-        image=entity_to_image_data(entity),
+        image=FileImageData(
+            medium_image_name=medium_image_name,
+            small_image_name=small_image_name,
+            image_width=image_width,
+            image_height=image_height,
+        )
+        if medium_image_name
+        else None,
+        processing=processing,
+        content_hash=content_hash,
     )
 
 
-def node_to_node_entity(node: FileSystemNode) -> NodeEntity:
-    return NodeEntity(
-        id=str(node.id),
-        album_id=str(node.album_id),
-        parent_id=str(node.parent_id) if node.parent_id else None,
-        name=node.name,
-        slug=node.slug,
-        type=node.type,
-        icon=node.icon,
-        hidden=node.hidden,
-        folder=node.node_type == FileSystemNodeType.FOLDER,
-        file_id=node.file_id,
-        file_extension=node.file_extension,
-        file_size=node.file_size,
-        medium_image_name=(
+def node_to_node_record(node: FileSystemNode) -> dict:
+    return {
+        "id": str(node.id),
+        "album_id": str(node.album_id),
+        "parent_id": str(node.parent_id) if node.parent_id else None,
+        "name": node.name,
+        "slug": node.slug,
+        "type": node.type,
+        "icon": node.icon,
+        "hidden": node.hidden,
+        "folder": node.node_type == FileSystemNodeType.FOLDER,
+        "file_id": node.file_id,
+        "file_extension": node.file_extension,
+        "file_size": node.file_size,
+        "medium_image_name": (
             node.image.medium_image_name if node.image is not None else None
         ),
-        small_image_name=(
+        "small_image_name": (
             node.image.small_image_name if node.image is not None else None
         ),
-        image_width=node.image.image_width if node.image is not None else None,
-        image_height=node.image.image_height if node.image is not None else None,
-    )
+        "image_width": node.image.image_width if node.image is not None else None,
+        "image_height": node.image.image_height if node.image is not None else None,
+        "created_at": node.creation_time,
+        "updated_at": node.last_modified_time,
+        "etag": node.etag,
+        "processing": node.processing,
+        "content_hash": node.content_hash,
+    }
+
+
+def node_to_node_entity(node: FileSystemNode) -> NodeEntity:
+    return NodeEntity(**node_to_node_record(node))
+
+
+ClosureRows = List[Tuple[UUID, int]]
+
+
+def get_closure_rows(
+    nodes: List[FileSystemNode], known_ancestors: Dict[UUID, ClosureRows]
+) -> List[dict]:
+    """
+    Returns the rows of the closure table for the given new nodes. Ancestors of
+    parents that are not included in the given nodes must be provided in
+    `known_ancestors`, as lists of (ancestor_id, depth) tuples.
+    """
+    nodes_by_id = {node.id: node for node in nodes}
+    ancestors: Dict[UUID, ClosureRows] = dict(known_ancestors)
+
+    def resolve(node: FileSystemNode) -> ClosureRows:
+        if node.id in ancestors:
+            return ancestors[node.id]
+
+        rows: ClosureRows = [(node.id, 0)]
+        parent_id = node.parent_id
+
+        if parent_id is not None:
+            parent = nodes_by_id.get(parent_id)
+            parent_rows = resolve(parent) if parent else ancestors.get(parent_id, [])
+            rows.extend((ancestor_id, depth + 1) for ancestor_id, depth in parent_rows)
+
+        ancestors[node.id] = rows
+        return rows
+
+    return [
+        {
+            "ancestor_id": str(ancestor_id),
+            "descendant_id": str(node.id),
+            "depth": depth,
+        }
+        for node in nodes
+        for ancestor_id, depth in resolve(node)
+    ]
 
 
 class SQLFileSystemDataProvider(FileSystemDataProvider):
@@ -88,33 +214,60 @@ class SQLFileSystemDataProvider(FileSystemDataProvider):
     async def get_album_nodes(self, album_id: UUID) -> List[FileSystemNode]:
         async with self.session:
             results = await self.session.execute(
-                select(NodeEntity)
+                select(*NODE_COLUMNS)
                 .where(
                     (NodeEntity.album_id == str(album_id))
                     & (NodeEntity.parent_id == None)  # noqa
                 )
                 .order_by(NodeEntity.name)  # type: ignore
             )
-            return [node_entity_to_node(record) for record in results.scalars()]
+            return [node_row_to_node(record) for record in results]
+
+    async def iter_album_nodes(self, album_id: UUID) -> AsyncIterator[FileSystemNode]:
+        # rows are selected as plain columns, so they are not kept in the identity
+        # map of the session while they are streamed
+        async with self.session:
+            results = await self.session.stream(
+                select(*NODE_COLUMNS)
+                .where(NodeEntity.album_id == str(album_id))
+                .execution_options(yield_per=STREAM_PAGE_SIZE)
+            )
+            async for record in results:
+                yield node_row_to_node(record)
+
+    async def get_nodes(self, nodes_ids: List[UUID]) -> List[FileSystemNode]:
+        if not nodes_ids:
+            return []
+
+        async with self.session:
+            results = await self.session.execute(
+                select(*NODE_COLUMNS).where(
+                    NodeEntity.id.in_([str(node_id) for node_id in nodes_ids])
+                )
+            )
+            return [node_row_to_node(record) for record in results]
 
     async def _get_node_children(self, node_id: UUID) -> List[FileSystemNode]:
         results = await self.session.execute(
-            select(NodeEntity)
+            select(*NODE_COLUMNS)
             .where(NodeEntity.parent_id == str(node_id))
             .order_by(NodeEntity.name)  # type: ignore
         )
-        return [node_entity_to_node(record) for record in results.scalars()]
+        return [node_row_to_node(record) for record in results]
 
     async def get_node(
         self, node_id: UUID, include_children: bool
     ) -> Optional[FileSystemNode]:
         async with self.session:
-            record = await self.session.get(NodeEntity, str(node_id))
+            results = await self.session.execute(
+                select(*NODE_COLUMNS).where(NodeEntity.id == str(node_id))
+            )
+            record = results.first()
 
             if not record:
                 return None
 
-            node = node_entity_to_node(record)
+            node = node_row_to_node(record)
 
             if include_children:
                 node.items = await self._get_node_children(node_id)
@@ -125,6 +278,103 @@ class SQLFileSystemDataProvider(FileSystemDataProvider):
         async with self.session:
             return await self._get_node_children(node_id)
 
+    async def _get_nodes_page(
+        self, condition, page_size: int, continuation_token: Optional[str]
+    ) -> NodesPage:
+        # keyset pagination by (name, id), using the indexes on
+        # (parent_id, name, id) and (album_id, parent_id, name, id): the cost of
+        # reading a page does not depend on its position
+        query = select(*NODE_COLUMNS).where(condition)
+
+        if continuation_token:
+            position = decode_continuation_token(continuation_token)
+            name, node_id = position.get("name"), position.get("id")
+
+            if not isinstance(name, str) or not isinstance(node_id, str):
+                raise InvalidArgument("Invalid continuation token.")
+
+            try:
+                UUID(node_id)
+            except ValueError:
+                raise InvalidArgument("Invalid continuation token.")
+
+            query = query.where(
+                (NodeEntity.name >= name)
+                & or_(
+                    NodeEntity.name > name,
+                    and_(NodeEntity.name == name, NodeEntity.id > node_id),
+                )
+            )
+
+        async with self.session:
+            results = await self.session.execute(
+                query.order_by(NodeEntity.name, NodeEntity.id).limit(  # type: ignore
+                    page_size + 1
+                )
+            )
+            items = [node_row_to_node(record) for record in results]
+
+        if len(items) <= page_size:
+            return NodesPage(items, None)
+
+        items = items[:page_size]
+        last_item = items[-1]
+        return NodesPage(
+            items,
+            encode_continuation_token(
+                {"name": last_item.name, "id": str(last_item.id)}
+            ),
+        )
+
+    async def get_node_children_page(
+        self, node_id: UUID, page_size: int, continuation_token: Optional[str]
+    ) -> NodesPage:
+        return await self._get_nodes_page(
+            NodeEntity.parent_id == str(node_id), page_size, continuation_token
+        )
+
+    async def get_album_nodes_page(
+        self, album_id: UUID, page_size: int, continuation_token: Optional[str]
+    ) -> NodesPage:
+        return await self._get_nodes_page(
+            (NodeEntity.album_id == str(album_id))
+            & (NodeEntity.parent_id == None),  # noqa
+            page_size,
+            continuation_token,
+        )
+
+    async def _get_nodes_etags(self, condition) -> Dict[UUID, str]:
+        async with self.session:
+            results = await self.session.execute(
+                select(NodeEntity.id, NodeEntity.etag).where(condition)
+            )
+            return {get_uuid(record.id): record.etag for record in results}
+
+    async def get_node_children_etags(self, node_id: UUID) -> Dict[UUID, str]:
+        return await self._get_nodes_etags(NodeEntity.parent_id == str(node_id))
+
+    async def get_album_nodes_etags(self, album_id: UUID) -> Dict[UUID, str]:
+        return await self._get_nodes_etags(
+            (NodeEntity.album_id == str(album_id))
+            & (NodeEntity.parent_id == None)  # noqa
+        )
+
+    async def get_node_descendants(self, node_id: UUID) -> List[FileSystemNode]:
+        async with self.session:
+            results = await self.session.execute(
+                select(*NODE_COLUMNS)
+                .join(
+                    NodeClosureEntity,
+                    NodeClosureEntity.descendant_id == NodeEntity.id,
+                )
+                .where(
+                    (NodeClosureEntity.ancestor_id == str(node_id))
+                    & (NodeClosureEntity.depth > 0)
+                )
+                .order_by(NodeClosureEntity.depth, NodeEntity.name)  # type: ignore
+            )
+            return [node_row_to_node(record) for record in results]
+
     async def get_node_path(self, node_id: UUID) -> List[FileSystemNodePathFragment]:
         items: List[FileSystemNodePathFragment] = []
 
@@ -196,27 +446,274 @@ class SQLFileSystemDataProvider(FileSystemDataProvider):
 
         return items
 
+    async def get_node_full_path(
+        self, node_id: UUID, max_depth: int = DEFAULT_MAX_PATH_DEPTH
+    ) -> List[FileSystemNodePathFragment]:
+        # the closure table contains all ancestors of each node, so the whole path
+        # is obtained with a single indexed query, regardless of its depth
+        async with self.session:
+            cursor = await self.session.execute(
+                select(NodeEntity.id, NodeEntity.parent_id, NodeEntity.name)
+                .join(
+                    NodeClosureEntity,
+                    NodeClosureEntity.ancestor_id == NodeEntity.id,
+                )
+                .where(
+                    (NodeClosureEntity.descendant_id == str(node_id))
+                    & (NodeClosureEntity.depth <= max_depth)
+                )
+                .order_by(NodeClosureEntity.depth.desc())  # type: ignore
+            )
+            records = cursor.fetchall()
+
+        if not records:
+            raise ObjectNotFound()
+
+        if records[0]["parent_id"] is not None:
+            raise InvalidArgument("MaxPathDepthExceeded")
+
+        return [
+            FileSystemNodePathFragment(
+                id=get_uuid(record["id"]),
+                parent_id=map_optional_uuid(record["parent_id"]),
+                name=record["name"],
+            )
+            for record in records
+        ]
+
+    async def _get_ancestors(self, nodes_ids: List[UUID]) -> Dict[UUID, ClosureRows]:
+        ancestors: Dict[UUID, ClosureRows] = {}
+
+        if not nodes_ids:
+            return ancestors
+
+        results = await self.session.execute(
+            select(
+                NodeClosureEntity.descendant_id,
+                NodeClosureEntity.ancestor_id,
+                NodeClosureEntity.depth,
+            ).where(
+                NodeClosureEntity.descendant_id.in_(
+                    [str(node_id) for node_id in nodes_ids]
+                )
+            )
+        )
+
+        for descendant_id, ancestor_id, depth in results:
+            ancestors.setdefault(get_uuid(descendant_id), []).append(
+                (get_uuid(ancestor_id), depth)
+            )
+
+        return ancestors
+
+    async def _insert_closure(self, nodes: List[FileSystemNode]) -> None:
+        new_ids = {node.id for node in nodes}
+        known_ancestors = await self._get_ancestors(
+            list(
+                {
+                    node.parent_id
+                    for node in nodes
+                    if node.parent_id is not None and node.parent_id not in new_ids
+                }
+            )
+        )
+
+        rows = get_closure_rows(nodes, known_ancestors)
+
+        if rows:
+            await self.session.execute(insert(NodeClosureEntity), rows)
+
+    async def _move_closure(self, node_id: UUID, parent_id: Optional[UUID]) -> None:
+        # detach the subtree of the moved node from its previous ancestors,
+        # then attach it to all ancestors of the new parent
+        params = {"id": str(node_id), "parent_id": str(parent_id)}
+        await self.session.execute(
+            text(
+                """
+                DELETE FROM nodes_closure
+                WHERE descendant_id IN (
+                    SELECT descendant_id FROM nodes_closure WHERE ancestor_id = :id
+                )
+                AND ancestor_id IN (
+                    SELECT ancestor_id FROM nodes_closure
+                    WHERE descendant_id = :id AND ancestor_id <> :id
+                );
+                """
+            ),  # type: ignore
+            params,
+        )
+
+        if parent_id is None:
+            return
+
+        await self.session.execute(
+            text(
+                """
+                INSERT INTO nodes_closure (ancestor_id, descendant_id, depth)
+                SELECT SUPER.ancestor_id, SUB.descendant_id, SUPER.depth + SUB.depth + 1
+                FROM nodes_closure SUPER
+                CROSS JOIN nodes_closure SUB
+                WHERE SUPER.descendant_id = :parent_id AND SUB.ancestor_id = :id;
+                """
+            ),  # type: ignore
+            params,
+        )
+
     async def create_nodes(self, nodes: List[FileSystemNode]) -> None:
+        # Core executemany inserts, which don't need the ORM unit of work;
+        # note that parents must precede their children in the given list
+        if not nodes:
+            return
+
         async with self.session:
-            self.session.add_all(  # type: ignore
-                [node_to_node_entity(node) for node in nodes]
+            await self.session.execute(
+                insert(NodeEntity), [node_to_node_record(node) for node in nodes]
             )
+            await self._insert_closure(nodes)
             await self.session.commit()
 
+    async def update_node_image(
+        self,
+        node_id: UUID,
+        image: Optional[FileImageData],
+        modification_time: datetime,
+    ) -> None:
+        async with self.session:
+            await self.session.execute(
+                update(NodeEntity)
+                .where(NodeEntity.id == str(node_id))
+                .values(
+                    medium_image_name=image.medium_image_name if image else None,
+                    small_image_name=image.small_image_name if image else None,
+                    image_width=image.image_width if image else None,
+                    image_height=image.image_height if image else None,
+                    processing=False,
+                    updated_at=modification_time,
+                    etag=modification_time.isoformat(),
+                )
+                .execution_options(synchronize_session=False)  # type: ignore
+            )
+            await self.session.commit()
+
+    async def update_nodes_images(
+        self,
+        images: Dict[UUID, Optional[FileImageData]],
+        modification_time: datetime,
+    ) -> None:
+        if not images:
+            return
+
+        # a single statement is executed with the parameters of all nodes
+        async with self.session:
+            await self.session.execute(
+                update(NodeEntity)
+                .where(NodeEntity.id == bindparam("node_id"))
+                .values(
+                    medium_image_name=bindparam("medium_image_name"),
+                    small_image_name=bindparam("small_image_name"),
+                    image_width=bindparam("image_width"),
+                    image_height=bindparam("image_height"),
+                    processing=False,
+                    updated_at=modification_time,
+                    etag=modification_time.isoformat(),
+                )
+                .execution_options(synchronize_session=False),  # type: ignore
+                [
+                    {
+                        "node_id": str(node_id),
+                        "medium_image_name": image.medium_image_name if image else None,
+                        "small_image_name": image.small_image_name if image else None,
+                        "image_width": image.image_width if image else None,
+                        "image_height": image.image_height if image else None,
+                    }
+                    for node_id, image in images.items()
+                ],
+            )
+            await self.session.commit()
+
+    async def clone_nodes(
+        self,
+        nodes: List[FileSystemNode],
+        target_parent_id: Optional[UUID],
+        creation_time: datetime,
+    ) -> List[FileSystemNode]:
+        folders_ids = [
+            str(node.id)
+            for node in nodes
+            if node.node_type == FileSystemNodeType.FOLDER
+        ]
+        descendants: List[FileSystemNode] = []
+
+        if folders_ids:
+            # the descendants of all cloned folders are read with a single query,
+            # ordering by depth guarantees that parents precede their children
+            async with self.session:
+                results = await self.session.execute(
+                    select(*NODE_COLUMNS)
+                    .join(
+                        NodeClosureEntity,
+                        NodeClosureEntity.descendant_id == NodeEntity.id,
+                    )
+                    .where(
+                        NodeClosureEntity.ancestor_id.in_(folders_ids)
+                        & (NodeClosureEntity.depth > 0)
+                    )
+                    .order_by(NodeClosureEntity.depth)  # type: ignore
+                )
+                descendants = [node_row_to_node(record) for record in results]
+
+        clones = clone_nodes_tree(nodes + descendants, target_parent_id, creation_time)
+        await self.create_nodes(clones)
+        return clones[: len(nodes)]
+
     async def update_nodes(self, nodes: List[FileSystemNode]) -> None:
         async with self.session:
+            results = await self.session.execute(
+                select(NodeEntity.id, NodeEntity.parent_id).where(
+                    NodeEntity.id.in_([str(node.id) for node in nodes])
+                )
+            )
+            current_parents = {
+                get_uuid(node_id): map_optional_uuid(parent_id)
+                for node_id, parent_id in results
+            }
+
             for node in nodes:
                 await self.session.merge(node_to_node_entity(node))
 
+            await self.session.flush()
+
+            for node in nodes:
+                if node.id in current_parents and (
+                    current_parents[node.id] != node.parent_id
+                ):
+                    await self._move_closure(node.id, node.parent_id)
+
             await self.session.commit()
 
     async def delete_nodes(self, nodes: List[UUID]) -> None:
-        async with self.session:
-            for node_id in nodes:
-                await self.session.execute(
-                    delete(NodeEntity).where(
-                        NodeEntity.id == str(node_id)
-                    )  # type: ignore
-                )
+        if not nodes:
+            return
+
+        # the whole subtrees of the given nodes are deleted with set based
+        # statements, regardless of their size and depth
+        subtree = (
+            select(NodeClosureEntity.descendant_id)
+            .where(NodeClosureEntity.ancestor_id.in_([str(item) for item in nodes]))
+            .scalar_subquery()
+        )
 
+        async with self.session:
+            await self.session.execute(
+                delete(NodeEntity)
+                .where(NodeEntity.id.in_(subtree))
+                .execution_options(synchronize_session=False)  # type: ignore
+            )
+            # rows of the closure table are deleted explicitly, because SQLite
+            # does not enforce foreign keys unless configured to do so
+            await self.session.execute(
+                delete(NodeClosureEntity)
+                .where(NodeClosureEntity.descendant_id.in_(subtree))
+                .execution_options(synchronize_session=False)  # type: ignore
+            )
             await self.session.commit()
@@ -1,21 +1,33 @@
 from abc import ABC
 from dataclasses import dataclass
 from datetime import datetime
-from typing import List, Optional
+from typing import Iterable, List, Optional
 from uuid import UUID, uuid4
 
-from essentials.exceptions import ObjectNotFound
+from essentials.exceptions import InvalidArgument, ObjectNotFound
 from slugify import slugify
 
 from core.errors import PreconfitionFailed
+from core.etags import get_versions_etag
 from domain.blobs import BlobsService
 
+from .changes import ChangesLog, NodeChangeType
 from .context import OperationContext
 from .settings import Settings
-from .vfs import FileSystemDataProvider, FileSystemNode
+from .trees import AlbumTree, AlbumTreesCache, get_album_tree
+from .vfs import (
+    DEFAULT_NODES_PAGE_SIZE,
+    FileSystemDataProvider,
+    FileSystemNode,
+    NodesPage,
+    validate_page_size,
+)
 
 DEFAULT_STORAGE = UUID("00000000-0000-0000-0000-000000000000")
 
+# maximum number of download URLs that can be requested at once
+MAX_DOWNLOAD_URLS = 1000
+
 
 @dataclass
 class Album:
@@ -37,6 +49,12 @@ class DownloadURL:
     url: str
 
 
+@dataclass
+class NodeDownloadURL:
+    node_id: UUID
+    url: str
+
+
 @dataclass
 class ContainerReadAuthContext:
     base_url: str
@@ -62,6 +80,13 @@ class UpdateAlbumInput:
     etag: str
 
 
+def get_albums_etag(albums: Iterable[Album]) -> str:
+    """
+    Returns the entity tag of a list of albums, or of a single album.
+    """
+    return get_versions_etag({album.id: album.etag for album in albums})
+
+
 class AlbumsDataProvider(ABC):
     async def get_album(self, album_id: UUID) -> Optional[Album]:
         raise NotImplementedError()
@@ -76,6 +101,28 @@ class AlbumsDataProvider(ABC):
         raise NotImplementedError()
 
 
+@dataclass
+class AlbumChange:
+    sequence: int
+    node_id: UUID
+    parent_id: Optional[UUID]
+    change_type: NodeChangeType
+    # current state of the node, None if the node was deleted
+    node: Optional[FileSystemNode]
+
+
+@dataclass
+class AlbumChangesPage:
+    items: List[AlbumChange]
+    # opaque token to pass as `since` to obtain the following changes
+    token: str
+    # True if more changes can be obtained immediately with the token
+    has_more: bool
+    # True if changes were deleted after the given token: the album must be read
+    # again, and the returned token used for the following changes
+    reset: bool
+
+
 class AlbumsHandler:
     def __init__(
         self,
@@ -84,6 +131,8 @@ class AlbumsHandler:
         fs_data_provider: FileSystemDataProvider,
         settings: Settings,
         context: OperationContext,
+        trees_cache: AlbumTreesCache,
+        changes_log: ChangesLog,
     ) -> None:
         super().__init__()
 
@@ -92,6 +141,8 @@ class AlbumsHandler:
         self.blobs_service = blobs_service
         self.settings = settings
         self.context = context
+        self.trees_cache = trees_cache
+        self.changes_log = changes_log
 
     def get_container_url(self, album_id: str) -> str:
         return (
@@ -99,14 +150,8 @@ class AlbumsHandler:
             f".blob.core.windows.net/{album_id}/"
         )
 
-    async def get_file_url(self, node_id: UUID) -> str:
-        node = await self.fs_data_provider.get_node(node_id, include_children=False)
-
-        if not node:
-            raise ObjectNotFound()
-
-        if node.file_id is None or node.file_extension is None:
-            raise ObjectNotFound()
+    def _get_node_file_url(self, node: FileSystemNode) -> str:
+        assert node.file_id is not None and node.file_extension is not None
 
         album_id = str(node.album_id)
         token = self.blobs_service.get_read_blob_sas(
@@ -121,6 +166,35 @@ class AlbumsHandler:
             + token
         )
 
+    async def get_file_url(self, node_id: UUID) -> str:
+        node = await self.fs_data_provider.get_node(node_id, include_children=False)
+
+        if not node:
+            raise ObjectNotFound()
+
+        if node.file_id is None or node.file_extension is None:
+            raise ObjectNotFound()
+
+        return self._get_node_file_url(node)
+
+    async def get_files_urls(self, nodes_ids: List[UUID]) -> List[NodeDownloadURL]:
+        """
+        Returns the download URLs of many files, reading their nodes at once.
+        Nodes that don't exist or are not files are omitted.
+        """
+        if len(nodes_ids) > MAX_DOWNLOAD_URLS:
+            raise InvalidArgument(
+                f"Cannot request more than {MAX_DOWNLOAD_URLS} URLs at once."
+            )
+
+        nodes = await self.fs_data_provider.get_nodes(nodes_ids)
+
+        return [
+            NodeDownloadURL(node_id=node.id, url=self._get_node_file_url(node))
+            for node in nodes
+            if node.file_id is not None and node.file_extension is not None
+        ]
+
     async def get_albums(self) -> List[Album]:
         return await self.albums_data_provider.get_albums()
 
@@ -143,6 +217,89 @@ class AlbumsHandler:
     async def get_album_nodes(self, album_id: UUID) -> List[FileSystemNode]:
         return await self.fs_data_provider.get_album_nodes(album_id)
 
+    async def get_album_nodes_page(
+        self,
+        album_id: UUID,
+        page_size: int = DEFAULT_NODES_PAGE_SIZE,
+        continuation_token: Optional[str] = None,
+    ) -> NodesPage:
+        validate_page_size(page_size)
+        return await self.fs_data_provider.get_album_nodes_page(
+            album_id, page_size, continuation_token
+        )
+
+    async def get_current_album_nodes_etag(self, album_id: UUID) -> str:
+        return get_versions_etag(
+            await self.fs_data_provider.get_album_nodes_etags(album_id)
+        )
+
+    async def get_current_album_tree_etag(self, album_id: UUID) -> str:
+        # the version of the whole album is read with a single query, instead of
+        # reading the versions of all its nodes
+        return get_versions_etag(
+            {album_id: str(await self.changes_log.get_version(album_id))}
+        )
+
+    async def get_album_tree(self, album_id: UUID) -> AlbumTree:
+        """
+        Returns all nodes of an album, reading them only if the current version of
+        the album is not cached.
+        """
+        etag = await self.get_current_album_tree_etag(album_id)
+
+        async def read_tree() -> AlbumTree:
+            return get_album_tree(
+                album_id,
+                etag,
+                [
+                    node
+                    async for node in self.fs_data_provider.iter_album_nodes(album_id)
+                ],
+            )
+
+        return await self.trees_cache.get_or_read(
+            (album_id, etag), read_tree, lambda tree: len(tree.ids)
+        )
+
+    async def get_album_changes(
+        self, album_id: UUID, since: Optional[str] = None
+    ) -> AlbumChangesPage:
+        """
+        Returns the changes of the nodes of an album following the given token,
+        with the current state of changed nodes. Without a token, returns only a
+        token to read the changes that follow.
+        """
+        page = await self.changes_log.get_changes(album_id, since)
+
+        # only the last change of each node is returned, with its current state
+        last_changes = {change.node_id: change for change in page.items}
+        nodes = (
+            {
+                node.id: node
+                for node in await self.fs_data_provider.get_nodes(list(last_changes))
+            }
+            if last_changes
+            else {}
+        )
+        items: List[AlbumChange] = []
+
+        for change in sorted(last_changes.values(), key=lambda item: item.sequence):
+            node = nodes.get(change.node_id)
+            items.append(
+                AlbumChange(
+                    sequence=change.sequence,
+                    node_id=change.node_id,
+                    parent_id=change.parent_id,
+                    # nodes can be deleted later, also with their ancestors
+                    change_type=change.change_type
+                    if node is not None
+                    else NodeChangeType.DELETED,
+                    node=node,
+                )
+            )
+
+        return AlbumChangesPage(items, page.token, page.has_more, page.reset)
+
     async def update_album(self, data: UpdateAlbumInput) -> Album:
         album = await self.get_album(data.id)
 
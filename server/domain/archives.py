@@ -0,0 +1,196 @@
+import asyncio
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable, Dict, List, Set, Tuple
+from uuid import UUID
+
+from essentials.exceptions import ObjectNotFound
+
+from core.errors import TooManyRequestsError
+from core.zipstream import ZipEntry, stream_zip
+
+from .blobs import BlobsService
+from .settings import Settings
+from .vfs import FileSystemDataProvider, FileSystemNode, FileSystemNodeType
+
+
+@dataclass
+class Archive:
+    name: str
+    read: Callable[[], AsyncIterator[bytes]]
+
+
+# streams reserved for responses whose bodies are not read within this time, for
+# example because clients disconnected, are released
+ARCHIVE_STREAM_RESERVATION_TIMEOUT = 30
+
+
+class ArchiveStreamsLimiter:
+    """
+    Counts the archives being streamed by the application, to cap the number of
+    simultaneous downloads of archives.
+    """
+
+    reservation_timeout: float = ARCHIVE_STREAM_RESERVATION_TIMEOUT
+
+    def __init__(self, settings: Settings) -> None:
+        self.max_streams = settings.max_archive_streams
+        self.active = 0
+
+    def try_acquire(self) -> bool:
+        # the check and the increment are not interrupted by other coroutines
+        if self.active >= self.max_streams:
+            return False
+        self.active += 1
+        return True
+
+    def acquire(self) -> None:
+        self.active += 1
+
+    def release(self) -> None:
+        self.active -= 1
+
+
+class ArchiveStreamReservation:
+    """
+    A stream of the limiter reserved when an archive is requested, released when
+    the archive is read entirely, or after a timeout if it is never read.
+    """
+
+    def __init__(self, limiter: ArchiveStreamsLimiter) -> None:
+        self.limiter = limiter
+        self.released = False
+        self._timer = asyncio.get_event_loop().call_later(
+            limiter.reservation_timeout, self.release
+        )
+
+    def start(self) -> None:
+        self._timer.cancel()
+
+        if self.released:
+            # the body is read after the timeout: the stream is counted again
+            self.released = False
+            self.limiter.acquire()
+
+    def release(self) -> None:
+        self._timer.cancel()
+
+        if not self.released:
+            self.released = True
+            self.limiter.release()
+
+
+def get_safe_name(name: str) -> str:
+    name = name.replace("/", "_").replace("\\", "_")
+    return "_" if name in {"", ".", ".."} else name
+
+
+def get_unique_path(path: str, used_paths: Set[str]) -> str:
+    candidate = path
+    stem, dot, extension = path.rpartition(".")
+
+    if not stem or "/" in extension:
+        stem, dot, extension = path, "", ""
+
+    index = 1
+    while candidate in used_paths:
+        index += 1
+        candidate = f"{stem} ({index}){dot}{extension}"
+
+    used_paths.add(candidate)
+    return candidate
+
+
+def get_archive_paths(
+    root: FileSystemNode, descendants: List[FileSystemNode]
+) -> List[Tuple[str, FileSystemNode]]:
+    """
+    Returns the paths in the archive of the files in the subtree of the given root,
+    as tuples of path and node. Descendants must be sorted with parents before
+    their children.
+    """
+    if root.node_type != FileSystemNodeType.FOLDER:
+        if root.file_id is None or root.file_extension is None:
+            return []
+        return [(get_safe_name(root.name), root)]
+
+    folders_paths: Dict[UUID, str] = {root.id: get_safe_name(root.name)}
+    used_paths: Set[str] = set()
+    files: List[Tuple[str, FileSystemNode]] = []
+
+    for node in descendants:
+        if node.parent_id not in folders_paths:
+            continue
+
+        path = get_unique_path(
+            f"{folders_paths[node.parent_id]}/{get_safe_name(node.name)}", used_paths
+        )
+
+        if node.node_type == FileSystemNodeType.FOLDER:
+            folders_paths[node.id] = path
+        elif node.file_id is not None and node.file_extension is not None:
+            files.append((path, node))
+
+    return files
+
+
+class ArchivesHandler:
+    def __init__(
+        self,
+        fs_data_provider: FileSystemDataProvider,
+        blobs_service: BlobsService,
+        limiter: ArchiveStreamsLimiter,
+    ) -> None:
+        self.fs_data_provider = fs_data_provider
+        self.blobs_service = blobs_service
+        self.limiter = limiter
+
+    def _get_zip_entry(self, path: str, node: FileSystemNode) -> ZipEntry:
+        assert node.file_id is not None and node.file_extension is not None
+        container_name = str(node.album_id)
+        file_name = node.file_id + node.file_extension
+
+        return ZipEntry(
+            name=path,
+            size=node.file_size or 0,
+            modified=node.last_modified_time,
+            read=lambda: self.blobs_service.read_blob(container_name, file_name),
+        )
+
+    async def get_archive(self, node_id: UUID) -> Archive:
+        """
+        Returns a ZIP archive of the subtree of the node with the given id, whose
+        files are read from blob storage while the archive is streamed.
+        """
+        node = await self.fs_data_provider.get_node(node_id, include_children=False)
+
+        if node is None:
+            raise ObjectNotFound()
+
+        descendants = (
+            await self.fs_data_provider.get_node_descendants(node_id)
+            if node.node_type == FileSystemNodeType.FOLDER
+            else []
+        )
+        entries = [
+            self._get_zip_entry(path, item)
+            for path, item in get_archive_paths(node, descendants)
+        ]
+
+        # the stream is reserved when the archive is requested, so requests
+        # arriving together cannot exceed the limit
+        if not self.limiter.try_acquire():
+            raise TooManyRequestsError(
+                "Too many archives are being downloaded, try again later."
+            )
+
+        reservation = ArchiveStreamReservation(self.limiter)
+
+        async def read() -> AsyncIterator[bytes]:
+            reservation.start()
+            try:
+                async for chunk in stream_zip(entries):
+                    yield chunk
+            finally:
+                reservation.release()
+
+        return Archive(name=f"{get_safe_name(node.name)}.zip", read=read)
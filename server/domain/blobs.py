@@ -1,5 +1,6 @@
 from dataclasses import dataclass
-from typing import List
+from datetime import datetime
+from typing import AsyncIterator, List
 from uuid import uuid4
 
 from core.pathutils import get_best_mime_type
@@ -30,6 +31,13 @@ class Container:
     etag: str
 
 
+@dataclass
+class BlobInfo:
+    name: str
+    size: int
+    last_modified: datetime
+
+
 class BlobsService:
     async def get_containers(self) -> List[Container]:
         raise NotImplementedError
@@ -37,6 +45,20 @@ class BlobsService:
     async def create_container(self, name: str) -> None:
         raise NotImplementedError
 
+    def read_blob(self, container_name: str, file_name: str) -> AsyncIterator[bytes]:
+        """
+        Returns an iterator of chunks of the contents of a blob, which are
+        downloaded while they are consumed.
+        """
+        raise NotImplementedError
+
+    def list_blobs(self, container_name: str) -> AsyncIterator[BlobInfo]:
+        """
+        Returns an iterator of the blobs of a container, in lexicographical order
+        of names, which are listed page by page while they are consumed.
+        """
+        raise NotImplementedError
+
     def get_read_blob_sas(
         self,
         container_name: str,
@@ -51,6 +73,12 @@ class BlobsService:
     def get_admin_blob_sas(self, container_name: str, assigned_file_name: str) -> str:
         raise NotImplementedError
 
+    async def delete_blobs(self, container_name: str, files_names: List[str]) -> None:
+        """
+        Deletes the blobs with the given names, ignoring those that don't exist.
+        """
+        raise NotImplementedError
+
 
 class BlobsHandler:
     def __init__(self, blobs_service: BlobsService, settings: Settings) -> None:
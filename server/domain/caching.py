@@ -0,0 +1,249 @@
+"""
+This module implements decorators of the data providers of albums and nodes, that
+keep the lists read most often in a cache shared by all requests handled by a
+process, invalidating the lists affected by each change.
+
+Changes applied by other processes are not observed until cached values expire:
+the cache should be enabled with short times to live when the application runs
+in many processes.
+"""
+from copy import copy
+from datetime import datetime
+from typing import AsyncIterator, Dict, Hashable, Iterable, List, Optional, Set, Type
+from uuid import UUID
+
+from rodi import Container
+
+from core.caching import ReadCache
+
+from .albums import Album, AlbumsDataProvider
+from .settings import Settings
+from .vfs import (
+    DEFAULT_MAX_PATH_DEPTH,
+    FileImageData,
+    FileSystemDataProvider,
+    FileSystemNode,
+    FileSystemNodePathFragment,
+    NodesPage,
+)
+
+
+def get_albums_key() -> Hashable:
+    return ("albums",)
+
+
+def get_album_key(album_id: UUID) -> Hashable:
+    return ("album", album_id)
+
+
+def get_album_nodes_key(album_id: UUID) -> Hashable:
+    return ("album_nodes", album_id)
+
+
+def get_node_children_key(node_id: UUID) -> Hashable:
+    return ("children", node_id)
+
+
+def get_listing_key(node: FileSystemNode) -> Hashable:
+    """
+    Returns the key of the list that includes the given node.
+    """
+    # root nodes can have the id of the album as parent id
+    if node.parent_id is None or node.parent_id == node.album_id:
+        return get_album_nodes_key(node.album_id)
+    return get_node_children_key(node.parent_id)
+
+
+def copy_items(items: List) -> List:
+    # cached items are copied, since handlers modify the items they read
+    return [copy(item) for item in items]
+
+
+class CachedAlbumsDataProvider(AlbumsDataProvider):
+    def __init__(self, inner: AlbumsDataProvider, cache: ReadCache) -> None:
+        self.inner = inner
+        self.cache = cache
+
+    async def get_album(self, album_id: UUID) -> Optional[Album]:
+        album = await self.cache.get_or_read(
+            get_album_key(album_id),
+            lambda: self.inner.get_album(album_id),
+            lambda _: 1,
+        )
+        return copy(album)
+
+    async def get_albums(self) -> List[Album]:
+        return copy_items(
+            await self.cache.get_or_read(get_albums_key(), self.inner.get_albums, len)
+        )
+
+    async def create_album(self, data: Album) -> None:
+        await self.inner.create_album(data)
+        self.cache.invalidate(get_albums_key())
+
+    async def update_album(self, data: Album) -> None:
+        await self.inner.update_album(data)
+        self.cache.invalidate(get_albums_key(), get_album_key(data.id))
+
+
+class CachedFileSystemDataProvider(FileSystemDataProvider):
+    """
+    Caches the lists of root nodes of albums and the lists of children of nodes.
+    Before nodes are updated or deleted, their current version is read to
+    invalidate the lists they are moved or deleted from.
+    """
+
+    def __init__(self, inner: FileSystemDataProvider, cache: ReadCache) -> None:
+        self.inner = inner
+        self.cache = cache
+
+    def _invalidate_listings(
+        self, nodes: Iterable[FileSystemNode], *keys: Hashable
+    ) -> None:
+        listings: Set[Hashable] = {get_listing_key(node) for node in nodes}
+        self.cache.invalidate(*listings, *keys)
+
+    async def get_album_nodes(self, album_id: UUID) -> List[FileSystemNode]:
+        return copy_items(
+            await self.cache.get_or_read(
+                get_album_nodes_key(album_id),
+                lambda: self.inner.get_album_nodes(album_id),
+                len,
+            )
+        )
+
+    async def get_node_children(self, node_id: UUID) -> List[FileSystemNode]:
+        return copy_items(
+            await self.cache.get_or_read(
+                get_node_children_key(node_id),
+                lambda: self.inner.get_node_children(node_id),
+                len,
+            )
+        )
+
+    async def get_node_children_page(
+        self, node_id: UUID, page_size: int, continuation_token: Optional[str]
+    ) -> NodesPage:
+        return await self.inner.get_node_children_page(
+            node_id, page_size, continuation_token
+        )
+
+    async def get_album_nodes_page(
+        self, album_id: UUID, page_size: int, continuation_token: Optional[str]
+    ) -> NodesPage:
+        return await self.inner.get_album_nodes_page(
+            album_id, page_size, continuation_token
+        )
+
+    async def get_node_children_etags(self, node_id: UUID) -> Dict[UUID, str]:
+        # cached lists are cheaper than queries of etags, and are used when the
+        # list is read next
+        return {node.id: node.etag for node in await self.get_node_children(node_id)}
+
+    async def get_album_nodes_etags(self, album_id: UUID) -> Dict[UUID, str]:
+        return {node.id: node.etag for node in await self.get_album_nodes(album_id)}
+
+    async def get_node(
+        self, node_id: UUID, include_children: bool
+    ) -> Optional[FileSystemNode]:
+        return await self.inner.get_node(node_id, include_children)
+
+    def iter_album_nodes(self, album_id: UUID) -> AsyncIterator[FileSystemNode]:
+        return self.inner.iter_album_nodes(album_id)
+
+    async def get_nodes(self, nodes_ids: List[UUID]) -> List[FileSystemNode]:
+        return await self.inner.get_nodes(nodes_ids)
+
+    async def get_node_descendants(self, node_id: UUID) -> List[FileSystemNode]:
+        return await self.inner.get_node_descendants(node_id)
+
+    async def get_node_path(self, node_id: UUID) -> List[FileSystemNodePathFragment]:
+        return await self.inner.get_node_path(node_id)
+
+    async def get_node_full_path(
+        self, node_id: UUID, max_depth: int = DEFAULT_MAX_PATH_DEPTH
+    ) -> List[FileSystemNodePathFragment]:
+        return await self.inner.get_node_full_path(node_id, max_depth)
+
+    async def create_nodes(self, nodes: List[FileSystemNode]) -> None:
+        await self.inner.create_nodes(nodes)
+        self._invalidate_listings(nodes)
+
+    async def update_nodes(self, nodes: List[FileSystemNode]) -> None:
+        current_nodes = await self.inner.get_nodes([node.id for node in nodes])
+        await self.inner.update_nodes(nodes)
+        self._invalidate_listings([*current_nodes, *nodes])
+
+    async def delete_nodes(self, nodes: List[UUID]) -> None:
+        current_nodes = await self.inner.get_nodes(nodes)
+        await self.inner.delete_nodes(nodes)
+        # lists of descendants of deleted folders are not reachable anymore, and
+        # expire with time
+        self._invalidate_listings(
+            current_nodes, *(get_node_children_key(node_id) for node_id in nodes)
+        )
+
+    async def update_node_image(
+        self,
+        node_id: UUID,
+        image: Optional[FileImageData],
+        modification_time: datetime,
+    ) -> None:
+        node = await self.inner.get_node(node_id, include_children=False)
+        await self.inner.update_node_image(node_id, image, modification_time)
+
+        if node is not None:
+            self._invalidate_listings([node])
+
+    async def update_nodes_images(
+        self,
+        images: Dict[UUID, Optional[FileImageData]],
+        modification_time: datetime,
+    ) -> None:
+        current_nodes = await self.inner.get_nodes(list(images))
+        await self.inner.update_nodes_images(images, modification_time)
+        self._invalidate_listings(current_nodes)
+
+    async def clone_nodes(
+        self,
+        nodes: List[FileSystemNode],
+        target_parent_id: Optional[UUID],
+        creation_time: datetime,
+    ) -> List[FileSystemNode]:
+        clones = await self.inner.clone_nodes(nodes, target_parent_id, creation_time)
+        self._invalidate_listings(clones)
+        return clones
+
+
+def register_data_providers(
+    container: Container,
+    settings: Settings,
+    albums_data_provider: Type[AlbumsDataProvider],
+    fs_data_provider: Type[FileSystemDataProvider],
+) -> None:
+    """
+    Registers the given scoped data providers of albums and nodes, decorated with
+    a read cache shared by all requests, if it is enabled in settings.
+    """
+    if not settings.read_cache_size:
+        container.add_scoped(AlbumsDataProvider, albums_data_provider)
+        container.add_scoped(FileSystemDataProvider, fs_data_provider)
+        return
+
+    cache = ReadCache(settings.read_cache_size, settings.read_cache_ttl)
+    container.add_instance(cache)
+    container.add_scoped(albums_data_provider)
+    container.add_scoped(fs_data_provider)
+
+    def get_albums_data_provider(context) -> AlbumsDataProvider:
+        return CachedAlbumsDataProvider(
+            context.provider.get(albums_data_provider, context), cache
+        )
+
+    def get_fs_data_provider(context) -> FileSystemDataProvider:
+        return CachedFileSystemDataProvider(
+            context.provider.get(fs_data_provider, context), cache
+        )
+
+    container.add_scoped_by_factory(get_albums_data_provider)
+    container.add_scoped_by_factory(get_fs_data_provider)
@@ -0,0 +1,204 @@
+"""
+This module implements the log of the changes of the nodes of albums, which lets
+clients refresh albums reading only what changed since their last request, instead
+of listing folders again.
+
+When folders are deleted or pasted, a change is logged for each node of their
+subtrees, so clients don't need to list them. Moving a folder moves its subtree
+without changing it: only the moved folder has a change.
+"""
+from abc import ABC
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from enum import Enum
+from typing import List, Optional, Tuple
+from uuid import UUID
+
+from essentials.exceptions import InvalidArgument
+
+from core.tokens import decode_continuation_token, encode_continuation_token
+
+from .settings import Settings
+
+# changes older than the retention time are deleted from the log of an album every
+# this number of changes appended to it
+CHANGES_COMPACTION_INTERVAL = 500
+
+# changes are returned only when they are older than this time, since concurrent
+# requests can store changes in a different order than their sequence numbers
+CHANGES_SETTLE_TIME = timedelta(seconds=2)
+
+# maximum number of changes returned at once
+CHANGES_PAGE_SIZE = 1000
+
+
+class NodeChangeType(Enum):
+    CREATED = "created"
+    UPDATED = "updated"
+    MOVED = "moved"
+    DELETED = "deleted"
+
+
+@dataclass
+class NodeChange:
+    node_id: UUID
+    # parent of the node after the change, None for root nodes
+    parent_id: Optional[UUID]
+    change_type: NodeChangeType
+    time: datetime
+    # assigned when changes are stored, increasing in the log of each album
+    sequence: int = 0
+
+
+@dataclass
+class ChangesPage:
+    items: List[NodeChange]
+    # opaque token to obtain the changes that follow these items
+    token: str
+    # True if more changes can be obtained immediately with the token
+    has_more: bool
+    # True if the changes following the given token were deleted from the log: the
+    # album must be read again
+    reset: bool
+
+
+class ChangesDataProvider(ABC):
+    """
+    Stores the log of the changes of the nodes of albums.
+    """
+
+    async def append_changes(self, album_id: UUID, changes: List[NodeChange]) -> int:
+        """
+        Stores the given changes at the end of the log of an album, returning the
+        sequence number of the last one.
+        """
+        raise NotImplementedError()
+
+    async def get_changes(
+        self, album_id: UUID, since: int, limit: int
+    ) -> List[NodeChange]:
+        """
+        Returns at most the given number of changes of an album, whose sequence
+        numbers are greater than the given one, sorted by sequence number.
+        """
+        raise NotImplementedError()
+
+    async def get_last_sequence(self, album_id: UUID, until: datetime) -> int:
+        """
+        Returns the sequence number of the last change of an album that precedes
+        the first change that happened after the given time, or 0 if there is none:
+        the same changes returned by `get_changes` stopping at unsettled changes.
+        """
+        raise NotImplementedError()
+
+    async def delete_changes(self, album_id: UUID, before: datetime) -> None:
+        """
+        Deletes the changes of an album that happened before the given time.
+        """
+        raise NotImplementedError()
+
+
+class ChangesLog:
+    """
+    Appends the changes of nodes to the logs of albums, deleting old changes
+    automatically, and reads the changes that follow tokens returned to clients.
+
+    Clients obtain a first token without changes, then read the album, and then
+    apply the changes following each token, which are returned with a new token.
+    Changes can be returned more than once, and must be applied idempotently.
+    """
+
+    settle_time = CHANGES_SETTLE_TIME
+
+    def __init__(self, data_provider: ChangesDataProvider, settings: Settings) -> None:
+        self.data_provider = data_provider
+        self.settings = settings
+
+    @property
+    def retention(self) -> timedelta:
+        return timedelta(hours=self.settings.changes_retention_hours)
+
+    async def append(self, album_id: UUID, changes: List[NodeChange]) -> None:
+        if not changes:
+            return
+
+        last_sequence = await self.data_provider.append_changes(album_id, changes)
+
+        if last_sequence % CHANGES_COMPACTION_INTERVAL < len(changes):
+            await self.data_provider.delete_changes(
+                album_id, datetime.utcnow() - self.retention
+            )
+
+    def _get_token(self, album_id: UUID, sequence: int, time: datetime) -> str:
+        # the time of the token tells whether following changes might be deleted
+        return encode_continuation_token(
+            {"a": str(album_id), "s": sequence, "t": time.isoformat()}
+        )
+
+    def _read_token(self, album_id: UUID, token: str) -> Tuple[int, datetime]:
+        position = decode_continuation_token(token)
+
+        try:
+            if position["a"] != str(album_id):
+                raise ValueError()
+            return int(position["s"]), datetime.fromisoformat(position["t"])
+        except (KeyError, TypeError, ValueError):
+            raise InvalidArgument("Invalid changes token.")
+
+    async def _get_head(
+        self, album_id: UUID, time: datetime, reset: bool
+    ) -> ChangesPage:
+        # the token follows only settled changes, like tokens of pages of changes,
+        # since changes with lower sequence numbers can still be stored
+        sequence = await self.data_provider.get_last_sequence(album_id, time)
+        return ChangesPage([], self._get_token(album_id, sequence, time), False, reset)
+
+    async def get_version(self, album_id: UUID) -> int:
+        """
+        Returns the sequence number of the last change of an album, which changes
+        whenever its nodes change, since changes are appended after nodes are
+        stored.
+        """
+        return await self.data_provider.get_last_sequence(album_id, datetime.max)
+
+    async def get_changes(
+        self, album_id: UUID, since: Optional[str], limit: int = CHANGES_PAGE_SIZE
+    ) -> ChangesPage:
+        """
+        Returns the changes of an album following the given token, or a token to
+        read the following changes, if no token is given.
+        """
+        now = datetime.utcnow()
+        settled_time = now - self.settle_time
+
+        if since is None:
+            return await self._get_head(album_id, settled_time, False)
+
+        sequence, time = self._read_token(album_id, since)
+
+        if time < now - self.retention:
+            return await self._get_head(album_id, settled_time, True)
+
+        changes = await self.data_provider.get_changes(album_id, sequence, limit + 1)
+        has_more = len(changes) > limit
+        items: List[NodeChange] = []
+
+        # changes are returned in order up to the first one that is not settled,
+        # which is returned by following requests
+        for change in changes[:limit]:
+            if change.time > settled_time:
+                has_more = False
+                break
+            items.append(change)
+
+        if items:
+            sequence = items[-1].sequence
+
+        return ChangesPage(
+            items,
+            self._get_token(
+                album_id, sequence, items[-1].time if has_more else settled_time
+            ),
+            has_more,
+            False,
+        )
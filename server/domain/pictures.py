@@ -1,11 +1,142 @@
 import asyncio
+import threading
+from abc import ABC
+from collections import OrderedDict
 from concurrent.futures import Executor
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from uuid import UUID
 
+import requests
+from azure.core.pipeline.transport import RequestsTransport
+from azure.storage.blob import BlobServiceClient
 from gallerist import Gallerist, ImageMetadata, ImageSize
 from galleristazurestorage import AzureBlobFileStore
+from requests.adapters import HTTPAdapter
 
 from domain.settings import Settings
 
+PICTURE_SIZES = {
+    "image/jpeg": [
+        ImageSize("m", 1200),
+        ImageSize("s", 300),
+    ],
+    "image/png": [
+        ImageSize("m", 1200),
+        ImageSize("s", 300),
+    ],
+}
+
+
+@dataclass(frozen=True)
+class PictureJob:
+    """
+    Describes a picture to be processed. Gallerist and file stores cannot cross
+    process boundaries, so jobs carry only what is needed to create them in the
+    worker that processes the picture.
+    """
+
+    connection_string: str
+    container_name: str
+    file_name: str
+
+
+class GalleristCache:
+    """
+    Bounded LRU cache of Gallerist instances by container. File stores of the same
+    storage account share a single blob service client, and so a single pool of
+    HTTP connections, so processing a picture does not require creating clients
+    and opening new connections.
+    """
+
+    def __init__(self, max_size: int = 32, pool_size: int = 10) -> None:
+        self.max_size = max_size
+        self.pool_size = pool_size
+        self._lock = threading.Lock()
+        self._clients: Dict[str, BlobServiceClient] = {}
+        self._items: "OrderedDict[Tuple[str, str], Gallerist]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def _create_client(self, connection_string: str) -> BlobServiceClient:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=self.pool_size)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+
+        return BlobServiceClient.from_connection_string(
+            connection_string, transport=RequestsTransport(session=session)
+        )
+
+    def _get_client(self, connection_string: str) -> BlobServiceClient:
+        client = self._clients.get(connection_string)
+
+        if client is None:
+            client = self._create_client(connection_string)
+            self._clients[connection_string] = client
+
+        return client
+
+    def get(self, connection_string: str, container_name: str) -> Gallerist:
+        key = (connection_string, container_name)
+
+        with self._lock:
+            gallerist = self._items.get(key)
+
+            if gallerist is not None:
+                self._items.move_to_end(key)
+                return gallerist
+
+            gallerist = Gallerist(
+                AzureBlobFileStore(self._get_client(connection_string), container_name),
+                sizes=PICTURE_SIZES,
+            )
+            self._items[key] = gallerist
+
+            if len(self._items) > self.max_size:
+                # evicted instances own no resources: the client is shared
+                self._items.popitem(last=False)
+
+            return gallerist
+
+    def dispose(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+            for client in self._clients.values():
+                client.close()
+
+            self._clients.clear()
+
+
+# each process running picture jobs has its own cache; in the web application's
+# process it is used when pictures are processed in a thread pool
+gallerist_cache = GalleristCache()
+
+
+def configure_gallerist_cache(max_size: int, pool_size: int) -> None:
+    """
+    Configures the cache of the current process. This function is also used to
+    initialize the workers of a process pool.
+    """
+    gallerist_cache.max_size = max_size
+    gallerist_cache.pool_size = pool_size
+
+
+def get_gallerist(connection_string: str, container_name: str) -> Gallerist:
+    return gallerist_cache.get(connection_string, container_name)
+
+
+def process_picture_job(job: PictureJob) -> ImageMetadata:
+    """
+    Processes a picture, creating its medium and small versions. This function runs
+    in the pictures executor, which can be a pool of threads or processes.
+    """
+    gallerist = get_gallerist(job.connection_string, job.container_name)
+    return gallerist.process_image(job.file_name)
+
 
 class PicturesHandler:
     def __init__(self, executor: Executor, settings: Settings) -> None:
@@ -13,28 +144,67 @@ class PicturesHandler:
         self.pool = executor
         self.settings = settings
 
-    def get_gallerist(self, container_name: str) -> Gallerist:
-        return Gallerist(
-            AzureBlobFileStore.from_connection_string(
-                self.settings.storage_connection_string, container_name
-            ),
-            sizes={
-                "image/jpeg": [
-                    ImageSize("m", 1200),
-                    ImageSize("s", 300),
-                ],
-                "image/png": [
-                    ImageSize("m", 1200),
-                    ImageSize("s", 300),
-                ],
-            },
-        )
-
     async def process_picture(
         self, container_name: str, file_name: str
     ) -> ImageMetadata:
-        gallerist = self.get_gallerist(container_name)
-
-        return await self.loop.run_in_executor(
-            self.pool, gallerist.process_image, file_name
+        job = PictureJob(
+            self.settings.storage_connection_string, container_name, file_name
         )
+
+        return await self.loop.run_in_executor(self.pool, process_picture_job, job)
+
+
+@dataclass
+class PictureTaskInput:
+    node_id: UUID
+    container_name: str
+    file_name: str
+
+
+@dataclass
+class PictureTask:
+    id: int
+    node_id: UUID
+    container_name: str
+    file_name: str
+    attempts: int
+
+
+class PicturesQueue(ABC):
+    """
+    Durable queue of pictures to be processed in background.
+    """
+
+    async def initialize(self) -> None:
+        raise NotImplementedError()
+
+    async def dispose(self) -> None:
+        raise NotImplementedError()
+
+    async def enqueue(self, tasks: List[PictureTaskInput]) -> None:
+        """
+        Enqueues the given tasks, ignoring those of nodes that already have a task
+        waiting to be completed.
+        """
+        raise NotImplementedError()
+
+    async def wait_for_tasks(self, timeout: float) -> None:
+        """
+        Waits until new tasks are enqueued, or until the given timeout expires.
+        """
+        raise NotImplementedError()
+
+    async def claim(self) -> Optional[PictureTask]:
+        """
+        Returns the next task that is due, marking it as running, if any.
+        """
+        raise NotImplementedError()
+
+    async def complete(self, task: PictureTask) -> None:
+        raise NotImplementedError()
+
+    async def retry(self, task: PictureTask, error: str, retry_at: datetime) -> None:
+        raise NotImplementedError()
+
+    async def fail(self, task: PictureTask, error: str) -> None:
+        raise NotImplementedError()
@@ -0,0 +1,146 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from rodi import GetServiceContext, Services
+
+from .changes import ChangesLog, NodeChangeType
+from .pictures import PicturesHandler, PicturesQueue, PictureTask
+from .settings import Settings
+from .vfs import (
+    ContentsDataProvider,
+    FileSystemDataProvider,
+    FileSystemNode,
+    get_image_data,
+    get_nodes_changes,
+)
+
+logger = logging.getLogger("blacksheep.server")
+
+# interval at which idle workers look for tasks that are due, like retries
+POLL_INTERVAL = 5.0
+
+
+def get_retry_delay(attempts: int) -> timedelta:
+    return timedelta(seconds=min(10 * 2**attempts, 3600))
+
+
+class PicturesPipeline:
+    """
+    Processes pictures in background, reading tasks from a durable queue, and
+    updating the image data of nodes when pictures are processed. Failed tasks are
+    retried with exponential backoff, up to the configured number of attempts.
+    """
+
+    def __init__(self, queue: PicturesQueue, settings: Settings) -> None:
+        self.queue = queue
+        self.settings = settings
+        self._services: Optional[Services] = None
+        self._workers: List[asyncio.Task] = []
+
+    async def start(self, services: Services) -> None:
+        self._services = services
+        self._workers = [
+            asyncio.create_task(self._work())
+            for _ in range(self.settings.image_processing_concurrency)
+        ]
+
+    async def stop(self) -> None:
+        for worker in self._workers:
+            worker.cancel()
+
+        # interrupted tasks are claimed again when their lease expires
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def _work(self) -> None:
+        while True:
+            try:
+                task = await self.queue.claim()
+            except Exception:
+                logger.exception("Failed to read the pictures queue")
+                task = None
+
+            if task is None:
+                await self.queue.wait_for_tasks(POLL_INTERVAL)
+                continue
+
+            try:
+                await self.process_task(task)
+            except Exception:
+                # the task is claimed again when its lease expires
+                logger.exception("Failed to complete picture task %s", task.id)
+
+    async def process_task(self, task: PictureTask) -> None:
+        assert self._services is not None, "The pipeline is not started"
+
+        # scoped services, like SQL sessions, live until the task is handled
+        with GetServiceContext() as context:
+            fs_data_provider = self._services.get(FileSystemDataProvider, context)
+            pictures_handler = self._services.get(PicturesHandler, context)
+            changes_log = self._services.get(ChangesLog, context)
+            contents_data_provider = (
+                self._services.get(ContentsDataProvider, context)
+                if self.settings.content_deduplication
+                else None
+            )
+
+            try:
+                metadata = await pictures_handler.process_picture(
+                    task.container_name, task.file_name
+                )
+                image_data = get_image_data(metadata)
+            except Exception as ex:
+                logger.exception(
+                    "Failed to process picture %s, attempt %s",
+                    task.file_name,
+                    task.attempts,
+                )
+
+                if task.attempts >= self.settings.pictures_max_attempts:
+                    # the node is stored like any other file, without image data
+                    await fs_data_provider.update_node_image(
+                        task.node_id, None, datetime.utcnow()
+                    )
+                    await self._log_change(
+                        changes_log,
+                        await fs_data_provider.get_node(task.node_id, False),
+                    )
+                    await self.queue.fail(task, str(ex))
+                else:
+                    await self.queue.retry(
+                        task,
+                        str(ex),
+                        datetime.utcnow() + get_retry_delay(task.attempts),
+                    )
+                return
+
+            await fs_data_provider.update_node_image(
+                task.node_id, image_data, datetime.utcnow()
+            )
+
+            node = await fs_data_provider.get_node(task.node_id, include_children=False)
+            await self._log_change(changes_log, node)
+
+            if contents_data_provider is not None:
+                # the versions of the picture are shared with files having the same
+                # contents, that are created later
+                if node is not None and node.content_hash is not None:
+                    await contents_data_provider.update_content_image(
+                        node.album_id, node.content_hash, image_data
+                    )
+
+            await self.queue.complete(task)
+
+    async def _log_change(
+        self, changes_log: ChangesLog, node: Optional[FileSystemNode]
+    ) -> None:
+        # nodes deleted while their pictures were processed are ignored
+        if node is None:
+            return
+
+        for album_id, changes in get_nodes_changes(
+            [node], NodeChangeType.UPDATED, datetime.utcnow()
+        ).items():
+            await changes_log.append(album_id, changes)
@@ -0,0 +1,277 @@
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from enum import Enum
+from typing import Callable, Iterator, List, Optional, Tuple
+from urllib.parse import unquote, urlsplit
+from uuid import UUID
+
+from essentials.exceptions import ObjectNotFound
+
+from core.spill import SortedSpill
+
+from .albums import Album, AlbumsDataProvider
+from .blobs import BlobsService
+from .vfs import ContentsDataProvider, FileSystemDataProvider, get_blobs_names
+
+# blobs and nodes created more recently than this are not reported, because they
+# might belong to uploads in progress
+DEFAULT_MIN_AGE = timedelta(days=1)
+
+# maximum number of orphan nodes deleted at once
+DELETE_NODES_BATCH_SIZE = 100
+
+# maximum number of orphan blobs deleted at once
+DELETE_BLOBS_BATCH_SIZE = 256
+
+
+class DiscrepancyKind(Enum):
+    # blob that is not referenced by any node or content
+    ORPHAN_BLOB = "orphan_blob"
+    # node referencing a blob that doesn't exist
+    MISSING_BLOB = "missing_blob"
+    # node whose parent doesn't exist
+    ORPHAN_NODE = "orphan_node"
+
+
+@dataclass
+class Discrepancy:
+    kind: DiscrepancyKind
+    album_id: UUID
+    node_id: Optional[UUID] = None
+    blob_name: Optional[str] = None
+
+
+@dataclass
+class ReconciliationReport:
+    album_id: UUID
+    nodes: int = 0
+    blobs: int = 0
+    orphan_blobs: int = 0
+    orphan_blobs_size: int = 0
+    missing_blobs: int = 0
+    orphan_nodes: int = 0
+    deleted_blobs: int = 0
+    deleted_nodes: int = 0
+
+
+def get_container_blob_name(url: str, container_name: str) -> Optional[str]:
+    """
+    Returns the name of the blob the given URL refers to, if it belongs to the
+    container with the given name.
+    """
+    path = unquote(urlsplit(url).path)
+    prefix = f"/{container_name}/"
+    return path[len(prefix) :] if path.startswith(prefix) else None
+
+
+class ReconciliationHandler:
+    """
+    Compares the blobs of albums with the nodes of their virtual file systems,
+    reporting and optionally deleting orphan blobs and orphan nodes, and reporting
+    nodes whose blobs are missing.
+
+    Blobs are listed in lexicographical order, and are joined with the names of
+    the blobs referenced by nodes, which are spilled to a temporary database and
+    read back in the same order: the memory used is bounded regardless of the
+    number of blobs and nodes.
+    """
+
+    def __init__(
+        self,
+        albums_data_provider: AlbumsDataProvider,
+        fs_data_provider: FileSystemDataProvider,
+        contents_data_provider: ContentsDataProvider,
+        blobs_service: BlobsService,
+    ) -> None:
+        self.albums_data_provider = albums_data_provider
+        self.fs_data_provider = fs_data_provider
+        self.contents_data_provider = contents_data_provider
+        self.blobs_service = blobs_service
+
+    async def _spill_album(
+        self,
+        album: Album,
+        references: SortedSpill,
+        nodes: SortedSpill,
+        threshold: datetime,
+        report: ReconciliationReport,
+    ) -> None:
+        async for node in self.fs_data_provider.iter_album_nodes(album.id):
+            report.nodes += 1
+            # root nodes can have the id of the album as parent id; parents of
+            # recent nodes are not checked, since they might be created while
+            # their parents are deleted
+            nodes.add(
+                str(node.id),
+                str(node.parent_id)
+                if node.parent_id is not None
+                and node.parent_id != album.id
+                and node.creation_time < threshold
+                else None,
+            )
+
+            if node.file_id is None:
+                continue
+
+            # missing blobs are reported only for nodes that are not recent
+            node_id = str(node.id) if node.creation_time < threshold else None
+
+            for name in get_blobs_names(node.file_id, node.file_extension, node.image):
+                references.add(name, node_id)
+
+        # blobs of contents are kept as long as contents are stored, even if no
+        # node references them
+        async for content in self.contents_data_provider.iter_album_contents(album.id):
+            for name in get_blobs_names(
+                content.file_id, content.file_extension, content.image
+            ):
+                references.add(name)
+
+        if album.image_url:
+            image_name = get_container_blob_name(album.image_url, str(album.id))
+
+            if image_name:
+                references.add(image_name)
+
+    async def _reconcile_nodes(
+        self,
+        album_id: UUID,
+        nodes: SortedSpill,
+        clean: bool,
+        report: ReconciliationReport,
+        notify: Callable[[Discrepancy], None],
+    ) -> None:
+        orphans: List[UUID] = []
+
+        for node_id, parent_id in nodes.items():
+            if parent_id is None or parent_id in nodes:
+                continue
+
+            report.orphan_nodes += 1
+            notify(
+                Discrepancy(
+                    DiscrepancyKind.ORPHAN_NODE, album_id, node_id=UUID(node_id)
+                )
+            )
+
+            if clean:
+                orphans.append(UUID(node_id))
+
+        # nodes are deleted after they are all read, since deleting a node deletes
+        # its subtree; blobs of deleted nodes are deleted by the next run
+        for index in range(0, len(orphans), DELETE_NODES_BATCH_SIZE):
+            batch = orphans[index : index + DELETE_NODES_BATCH_SIZE]
+            await self.fs_data_provider.delete_nodes(batch)
+            report.deleted_nodes += len(batch)
+
+    def _report_missing(
+        self,
+        album_id: UUID,
+        reference: Tuple[str, Optional[str]],
+        report: ReconciliationReport,
+        notify: Callable[[Discrepancy], None],
+    ) -> None:
+        name, node_id = reference
+
+        if node_id is None:
+            return
+
+        report.missing_blobs += 1
+        notify(
+            Discrepancy(
+                DiscrepancyKind.MISSING_BLOB,
+                album_id,
+                node_id=UUID(node_id),
+                blob_name=name,
+            )
+        )
+
+    async def _delete_blobs(
+        self, container_name: str, names: List[str], report: ReconciliationReport
+    ) -> None:
+        await self.blobs_service.delete_blobs(container_name, names)
+        report.deleted_blobs += len(names)
+        names.clear()
+
+    async def _reconcile_blobs(
+        self,
+        album_id: UUID,
+        references: SortedSpill,
+        clean: bool,
+        threshold: datetime,
+        report: ReconciliationReport,
+        notify: Callable[[Discrepancy], None],
+    ) -> None:
+        container_name = str(album_id)
+        referenced: Iterator[Tuple[str, Optional[str]]] = references.items()
+        reference = next(referenced, None)
+        previous_name: Optional[str] = None
+        orphans: List[str] = []
+
+        async for blob in self.blobs_service.list_blobs(container_name):
+            # the join is correct only if both sequences are sorted the same way
+            if previous_name is not None and blob.name <= previous_name:
+                raise ValueError("Blobs are not listed in lexicographical order.")
+
+            previous_name = blob.name
+            report.blobs += 1
+
+            while reference is not None and reference[0] < blob.name:
+                self._report_missing(album_id, reference, report, notify)
+                reference = next(referenced, None)
+
+            if reference is not None and reference[0] == blob.name:
+                reference = next(referenced, None)
+                continue
+
+            if blob.last_modified >= threshold:
+                continue
+
+            report.orphan_blobs += 1
+            report.orphan_blobs_size += blob.size
+            notify(
+                Discrepancy(DiscrepancyKind.ORPHAN_BLOB, album_id, blob_name=blob.name)
+            )
+
+            if clean:
+                orphans.append(blob.name)
+
+                if len(orphans) >= DELETE_BLOBS_BATCH_SIZE:
+                    await self._delete_blobs(container_name, orphans, report)
+
+        while reference is not None:
+            self._report_missing(album_id, reference, report, notify)
+            reference = next(referenced, None)
+
+        if orphans:
+            await self._delete_blobs(container_name, orphans, report)
+
+    async def reconcile_album(
+        self,
+        album_id: UUID,
+        clean: bool = False,
+        min_age: timedelta = DEFAULT_MIN_AGE,
+        notify: Optional[Callable[[Discrepancy], None]] = None,
+    ) -> ReconciliationReport:
+        """
+        Reconciles the blobs of an album with its nodes, calling `notify` for each
+        discrepancy found. If `clean` is true, orphan nodes and orphan blobs older
+        than `min_age` are deleted.
+        """
+        album = await self.albums_data_provider.get_album(album_id)
+
+        if album is None:
+            raise ObjectNotFound()
+
+        report = ReconciliationReport(album_id)
+        threshold = datetime.utcnow() - min_age
+        notify = notify or (lambda discrepancy: None)
+
+        with SortedSpill() as references, SortedSpill() as nodes:
+            await self._spill_album(album, references, nodes, threshold, report)
+            await self._reconcile_nodes(album.id, nodes, clean, report, notify)
+            await self._reconcile_blobs(
+                album.id, references, clean, threshold, report, notify
+            )
+
+        return report
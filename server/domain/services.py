@@ -1,39 +1,77 @@
-from concurrent.futures import Executor, ThreadPoolExecutor
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 
 from rodi import Container
 
 from core.events import ServicesRegistrationContext
 
 from .albums import AlbumsHandler
+from .archives import ArchivesHandler, ArchiveStreamsLimiter
 from .blobs import BlobsHandler
-from .pictures import PicturesHandler
+from .changes import ChangesLog
+from .pictures import PicturesHandler, configure_gallerist_cache, gallerist_cache
+from .picturespipeline import PicturesPipeline
+from .settings import Settings
+from .trees import ALBUM_TREES_TTL, AlbumTreesCache
+from .uploads import UploadsHandler
 from .vfs import FileSystemHandler
 
 
+def create_pictures_executor(settings: Settings) -> Executor:
+    workers = settings.pictures_workers or os.cpu_count() or 1
+
+    # each worker uses at most one connection at a time
+    cache_options = (settings.gallerist_cache_size, 1)
+
+    if settings.pictures_executor == "process":
+        # processes are spawned rather than forked, because forking a process
+        # that runs an event loop and other threads is not safe
+        return ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=configure_gallerist_cache,
+            initargs=cache_options,
+        )
+
+    # threads share the cache of the web application's process
+    configure_gallerist_cache(settings.gallerist_cache_size, workers)
+    return ThreadPoolExecutor(max_workers=workers)
+
+
 def register_handlers(
-    container: Container, context: ServicesRegistrationContext
+    container: Container, context: ServicesRegistrationContext, settings: Settings
 ) -> None:
 
+    container.add_scoped(ChangesLog)
     container.add_scoped(FileSystemHandler)
     container.add_scoped(AlbumsHandler)
     container.add_scoped(BlobsHandler)
-    container.add_scoped(PicturesHandler)
+    container.add_scoped(UploadsHandler)
+    container.add_scoped(ArchivesHandler)
+    container.add_singleton(ArchiveStreamsLimiter)
+    container.add_singleton(PicturesHandler)
+    container.add_singleton(PicturesPipeline)
+    container.add_instance(
+        AlbumTreesCache(settings.album_trees_cache_size, ALBUM_TREES_TTL)
+    )
 
     # region gallerist
 
-    # note: a process pool executor is registered to do CPU bound operations of
-    # picture resizing with Pillow in dedicated processes.
-    # the process pool executor is disposed gracefully when the application stops,
+    # note: by default, a process pool executor is registered to do CPU bound
+    # operations of picture resizing with Pillow in dedicated processes, so they
+    # don't compete for the GIL with the event loop.
+    # the executor is disposed gracefully when the application stops,
     # and it is injected into the Pictures handler for its Executor dependency.
-    pool = ThreadPoolExecutor(max_workers=4)
+    pool = create_pictures_executor(settings)
 
     container.add_instance(pool, declared_class=Executor)
 
     async def release_pool():
-        nonlocal pool
-
-        if pool is not None:
-            pool.shutdown(wait=True)
+        # wait for pending jobs without blocking the event loop
+        await asyncio.get_event_loop().run_in_executor(None, pool.shutdown)
+        gallerist_cache.dispose()
 
     context.dispose += release_pool
     # endregion
@@ -1,11 +1,15 @@
-from typing import Optional
+from typing import List, Literal, Optional
 
 from configuration.common import Configuration
 from configuration.errors import ConfigurationError
-from pydantic import BaseModel
+from pydantic import BaseModel, validator
 
 from core.stringutils import split_pairs_eqsc
 
+# maximum number of levels of the virtual file system walked by default when
+# reading the full path of a node
+DEFAULT_MAX_PATH_DEPTH = 100
+
 
 def read_account_name_and_key(configuration: Configuration):
     if "storage_account_connection_string" in configuration:
@@ -34,6 +38,32 @@ def read_account_name_and_key(configuration: Configuration):
     return configuration.storage_account_name, configuration.storage_account_key
 
 
+# settings that can be omitted, falling back to the defaults defined in Settings
+OPTIONAL_SETTINGS = (
+    "vfs_max_depth",
+    "image_processing_concurrency",
+    "pictures_executor",
+    "pictures_workers",
+    "gallerist_cache_size",
+    "sas_bucket_minutes",
+    "sas_cache_size",
+    "blob_connections_limit",
+    "max_archive_streams",
+    "background_pictures_processing",
+    "pictures_queue_path",
+    "pictures_max_attempts",
+    "content_deduplication",
+    "read_cache_size",
+    "read_cache_ttl",
+    "fast_json",
+    "album_trees_cache_size",
+    "changes_retention_hours",
+    "compression",
+    "compression_min_size",
+    "compression_types",
+)
+
+
 class AuthSettings(BaseModel):
     audience: str
     issuer: str
@@ -51,6 +81,91 @@ class Settings(BaseModel):
 
     auth: Optional[AuthSettings] = None
 
+    # maximum number of levels of the virtual file system that are walked when
+    # reading the full path of a node; protects against corrupted, cyclic trees
+    vfs_max_depth: int = DEFAULT_MAX_PATH_DEPTH
+
+    # maximum number of pictures resized concurrently when creating nodes
+    image_processing_concurrency: int = 4
+
+    # executor used to resize pictures: "process" runs Pillow in dedicated
+    # processes, "thread" in threads of the web application's process
+    pictures_executor: Literal["process", "thread"] = "process"
+
+    # number of workers of the pictures executor, by default the number of CPUs
+    pictures_workers: Optional[int] = None
+
+    # number of containers for which pictures processing services are kept ready,
+    # in each worker of the pictures executor
+    gallerist_cache_size: int = 32
+
+    # read signatures expire at the end of time buckets of this duration, so the
+    # same signature and URL are returned for all requests in the same bucket
+    sas_bucket_minutes: int = 30
+
+    # number of read signatures kept in memory
+    sas_cache_size: int = 10000
+
+    # maximum number of connections in the pool shared by operations on blobs
+    blob_connections_limit: int = 100
+
+    # maximum number of ZIP archives of folders streamed at the same time
+    max_archive_streams: int = 4
+
+    # when enabled, nodes are created immediately and their pictures are processed
+    # by a background pipeline, using a durable queue stored in a SQLite database
+    background_pictures_processing: bool = False
+
+    pictures_queue_path: str = "pictures-queue.db"
+
+    # number of attempts to process a picture, before giving up
+    pictures_max_attempts: int = 5
+
+    # when enabled, files with the same content hash in an album share the same
+    # blob and picture versions, which are deleted when no node references them;
+    # reference counts are kept only while this is enabled, so it should not be
+    # disabled once enabled
+    content_deduplication: bool = False
+
+    # maximum number of albums and nodes kept in a cache of the lists of albums and
+    # of the children of folders, shared by all requests; 0 disables the cache
+    read_cache_size: int = 0
+
+    # seconds after which cached lists expire; changes applied by other processes
+    # are observed only when lists expire
+    read_cache_ttl: float = 30
+
+    # maximum number of nodes of the trees of albums kept in memory, by version of
+    # albums; 0 disables the cache of trees
+    album_trees_cache_size: int = 100000
+
+    # hours after which changes of nodes are deleted from the logs of albums:
+    # clients that didn't read changes for longer must read albums again
+    changes_retention_hours: int = 168
+
+    # when enabled, JSON request bodies and responses are parsed and serialized
+    # with orjson, instead of the json module of the standard library
+    fast_json: bool = False
+
+    # when enabled, responses are compressed with brotli (if installed) or gzip,
+    # and static files are served from precompressed .br and .gz files if present;
+    # it can be disabled when a reverse proxy compresses responses
+    compression: bool = True
+
+    # minimum size in bytes of the bodies of responses that are compressed
+    compression_min_size: int = 1024
+
+    # content types of responses that are compressed, matched by prefix; by default
+    # JSON, JavaScript, XML, SVG and text. Environment variables set them as a
+    # comma separated list, like "application/json,text/"
+    compression_types: Optional[List[str]] = None
+
+    @validator("compression_types", pre=True)
+    def split_compression_types(cls, value):
+        if isinstance(value, str):
+            return [item.strip() for item in value.split(",") if item.strip()]
+        return value
+
     @property
     def storage_connection_string(self) -> str:
         return (
@@ -78,4 +193,9 @@ class Settings(BaseModel):
             )
             if "auth" in configuration
             else None,
+            **{
+                key: configuration[key]
+                for key in OPTIONAL_SETTINGS
+                if key in configuration
+            },
         )
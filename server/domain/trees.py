@@ -0,0 +1,94 @@
+"""
+This module implements the snapshots of the whole tree of nodes of albums, which
+let clients navigate albums without requesting the children of each folder.
+"""
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, Iterable, List, Optional, Tuple
+from uuid import UUID
+
+from core.caching import ReadCache
+
+from .vfs import FileSystemNode, FileSystemNodeType
+
+# seconds after which cached trees are released, if they are not requested:
+# trees don't need to expire, since they are cached by version
+ALBUM_TREES_TTL = 3600
+
+
+@dataclass
+class AlbumTree:
+    """
+    All nodes of an album, in a columnar format: the properties of the node at
+    index i are at index i of each list. Parents precede their children, and
+    `parents` contains the index of the parent of each node, or -1 for root nodes.
+    Siblings are sorted by name.
+    """
+
+    album_id: UUID
+    etag: str
+    ids: List[UUID] = field(default_factory=list)
+    parents: List[int] = field(default_factory=list)
+    names: List[str] = field(default_factory=list)
+    node_types: List[FileSystemNodeType] = field(default_factory=list)
+    types: List[str] = field(default_factory=list)
+    sizes: List[Optional[int]] = field(default_factory=list)
+    image_widths: List[Optional[int]] = field(default_factory=list)
+    image_heights: List[Optional[int]] = field(default_factory=list)
+    small_images: List[Optional[str]] = field(default_factory=list)
+    medium_images: List[Optional[str]] = field(default_factory=list)
+
+    def append(self, node: FileSystemNode, parent_index: int) -> int:
+        index = len(self.ids)
+        image = node.image
+
+        self.ids.append(node.id)
+        self.parents.append(parent_index)
+        self.names.append(node.name)
+        self.node_types.append(node.node_type)
+        self.types.append(node.type)
+        self.sizes.append(node.file_size)
+        self.image_widths.append(image.image_width if image else None)
+        self.image_heights.append(image.image_height if image else None)
+        self.small_images.append(image.small_image_name if image else None)
+        self.medium_images.append(image.medium_image_name if image else None)
+        return index
+
+
+def get_album_tree(
+    album_id: UUID, etag: str, nodes: Iterable[FileSystemNode]
+) -> AlbumTree:
+    """
+    Returns the tree of the given nodes of an album, in any order. Nodes that are
+    not reachable from the root nodes of the album are excluded.
+    """
+    children: Dict[Optional[UUID], List[FileSystemNode]] = {}
+
+    for node in nodes:
+        # the Table API provider reads the album id as parent of root nodes; nodes
+        # whose parents don't exist are never visited
+        parent_id = node.parent_id if node.parent_id != album_id else None
+        children.setdefault(parent_id, []).append(node)
+
+    tree = AlbumTree(album_id, etag)
+    # folders are visited breadth first, so parents precede their children
+    folders: Deque[Tuple[Optional[UUID], int]] = deque([(None, -1)])
+
+    while folders:
+        parent_id, parent_index = folders.popleft()
+
+        for node in sorted(children.get(parent_id, []), key=lambda item: item.name):
+            index = tree.append(node, parent_index)
+
+            if node.node_type == FileSystemNodeType.FOLDER:
+                folders.append((node.id, index))
+
+    return tree
+
+
+class AlbumTreesCache(ReadCache):
+    """
+    Cache of the trees of albums, shared by all requests, whose keys include the
+    version of albums: trees are never invalidated, since any change of the nodes
+    of an album changes its version. The cost of each tree is its number of nodes.
+    """
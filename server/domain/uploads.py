@@ -0,0 +1,182 @@
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+from uuid import UUID, uuid4
+
+from essentials.exceptions import InvalidArgument
+from pydantic import BaseModel, validator
+
+from core.pathutils import get_best_mime_type
+
+from .blobs import BlobsService
+from .settings import Settings
+from .vfs import (
+    ContentsDataProvider,
+    CreateNodeInput,
+    FileSystemHandler,
+    FileSystemNode,
+    FileSystemNodeType,
+    validate_content_hash,
+)
+
+# maximum number of files in a single upload manifest
+MAX_UPLOAD_MANIFEST_FILES = 1000
+
+
+class UploadManifestFile(BaseModel):
+    file_name: str
+    file_size: int
+    file_type: str
+    # SHA-256 of the file's contents, as lowercase hex: when content deduplication
+    # is enabled, files whose contents are already stored are not uploaded again
+    content_hash: Optional[str] = None
+
+    _validate_content_hash = validator("content_hash", allow_reuse=True)(
+        validate_content_hash
+    )
+
+
+class InitializeUploadsInput(BaseModel):
+    container_id: str
+    files: List[UploadManifestFile]
+    # when enabled, nodes are stored for all files, under the given parent;
+    # the container id must be the id of the album
+    create_nodes: bool = False
+    parent_id: Optional[UUID] = None
+
+
+@dataclass
+class UploadTarget:
+    file_id: str
+    file_name: str
+    token: str
+    node: Optional[FileSystemNode] = None
+    # true if the contents of the file are already stored, or are uploaded for
+    # another file of the manifest: in this case no token is issued
+    uploaded: bool = False
+
+
+@dataclass
+class InitializeUploadsOutput:
+    base_url: str
+    files: List[UploadTarget]
+
+
+class UploadsHandler:
+    def __init__(
+        self,
+        blobs_service: BlobsService,
+        fs_handler: FileSystemHandler,
+        contents_data_provider: ContentsDataProvider,
+        settings: Settings,
+    ) -> None:
+        self.blobs_service = blobs_service
+        self.fs_handler = fs_handler
+        self.contents_data_provider = contents_data_provider
+        self.settings = settings
+
+    def get_container_url(self, container_name: str) -> str:
+        return self.settings.file_upload_url + container_name + "/"
+
+    async def _get_stored_files(
+        self, album_id: UUID, files: List[UploadManifestFile]
+    ) -> Dict[str, Tuple[str, str]]:
+        """
+        Returns the ids and names of the blobs already stored in the album for the
+        given files, by content hash.
+        """
+        contents = await self.contents_data_provider.get_contents(
+            album_id, {item.content_hash for item in files if item.content_hash}
+        )
+        return {
+            content_hash: (
+                content.file_id,
+                content.file_id + (content.file_extension or ""),
+            )
+            for content_hash, content in contents.items()
+        }
+
+    async def initialize_uploads(
+        self, data: InitializeUploadsInput
+    ) -> InitializeUploadsOutput:
+        """
+        Initializes the upload of many files at once, optionally storing their
+        nodes in a single batch. When nodes are stored and content deduplication is
+        enabled, files whose contents are already stored in the album are not
+        uploaded again, and files repeated in the manifest are uploaded once.
+        """
+        if len(data.files) > MAX_UPLOAD_MANIFEST_FILES:
+            raise InvalidArgument(
+                f"Cannot upload more than {MAX_UPLOAD_MANIFEST_FILES} files at once."
+            )
+
+        container_name = data.container_id
+        album_id: Optional[UUID] = None
+
+        if data.create_nodes and data.files:
+            try:
+                album_id = UUID(container_name)
+            except ValueError:
+                raise InvalidArgument("The container id must be the id of an album.")
+
+        deduplicate = album_id is not None and self.settings.content_deduplication
+        stored_files: Dict[str, Tuple[str, str]] = (
+            await self._get_stored_files(album_id, data.files)
+            if album_id is not None and deduplicate
+            else {}
+        )
+        targets: List[UploadTarget] = []
+
+        for item in data.files:
+            stored_file = (
+                stored_files.get(item.content_hash)
+                if deduplicate and item.content_hash
+                else None
+            )
+
+            if stored_file is not None:
+                file_id, file_name = stored_file
+                targets.append(
+                    UploadTarget(
+                        file_id=file_id, file_name=file_name, token="", uploaded=True
+                    )
+                )
+                continue
+
+            extension, _ = get_best_mime_type(item.file_name)
+            file_id = str(uuid4())
+            assigned_file_name = file_id + extension
+
+            targets.append(
+                UploadTarget(
+                    file_id=file_id,
+                    file_name=assigned_file_name,
+                    token=self.blobs_service.get_admin_blob_sas(
+                        container_name, assigned_file_name
+                    ),
+                )
+            )
+
+            if deduplicate and item.content_hash:
+                stored_files[item.content_hash] = (file_id, assigned_file_name)
+
+        if album_id is not None:
+            nodes = await self.fs_handler.reserve_nodes(
+                [
+                    CreateNodeInput(
+                        name=item.file_name,
+                        album_id=album_id,
+                        parent_id=data.parent_id,
+                        file_id=target.file_id,
+                        file_size=item.file_size,
+                        file_mime=item.file_type,
+                        node_type=FileSystemNodeType.FILE,
+                        content_hash=item.content_hash,
+                    )
+                    for item, target in zip(data.files, targets)
+                ]
+            )
+
+            for target, node in zip(targets, nodes):
+                target.node = node
+
+        return InitializeUploadsOutput(self.get_container_url(container_name), targets)
@@ -1,18 +1,35 @@
+import logging
+import re
 from abc import ABC
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 from datetime import datetime
 from enum import Enum
-from typing import Dict, List, Optional
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Set, Tuple
 from uuid import UUID, uuid4
 
 from essentials.exceptions import InvalidArgument, ObjectNotFound
-from pydantic import BaseModel
+from gallerist import ImageMetadata
+from pydantic import BaseModel, validator
 from slugify import slugify
 
+from core.concurrency import gather_limited
 from core.errors import AcceptedExceptionWithData, PreconfitionFailed
+from core.etags import get_versions_etag
 from core.pathutils import DEFAULT_MIME, get_file_extension_from_name
+from core.slots import with_slots
+from domain.blobs import BlobsService
+from domain.changes import ChangesLog, NodeChange, NodeChangeType
 from domain.logs import log_dep
-from domain.pictures import PicturesHandler
+from domain.pictures import PicturesHandler, PicturesQueue, PictureTaskInput
+from domain.settings import DEFAULT_MAX_PATH_DEPTH, Settings
+
+# number of nodes returned by default, and at most, in a page of a folder
+DEFAULT_NODES_PAGE_SIZE = 200
+MAX_NODES_PAGE_SIZE = 1000
+
+CONTENT_HASH_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+logger = logging.getLogger("blacksheep.server")
 
 
 class FileSystemNodeType(Enum):
@@ -20,6 +37,7 @@ class FileSystemNodeType(Enum):
     FOLDER = "folder"
 
 
+@with_slots
 @dataclass
 class FileImageData:
     """Additional information for image file"""
@@ -30,6 +48,7 @@ class FileImageData:
     image_height: int
 
 
+@with_slots
 @dataclass
 class FileSystemNode:
     id: UUID
@@ -49,6 +68,8 @@ class FileSystemNode:
     hidden: bool
     items: Optional[List["FileSystemNode"]]
     image: Optional[FileImageData] = None
+    processing: bool = False
+    content_hash: Optional[str] = None
 
 
 @dataclass
@@ -58,6 +79,21 @@ class FileSystemNodePathFragment:
     name: str
 
 
+@dataclass
+class NodesPage:
+    items: List[FileSystemNode]
+    # opaque token to obtain the next page, None if this is the last page
+    continuation_token: Optional[str]
+
+
+def validate_content_hash(cls, value: Optional[str]) -> Optional[str]:
+    if value is not None:
+        value = value.lower()
+        if not CONTENT_HASH_PATTERN.match(value):
+            raise ValueError("The content hash must be a SHA-256 hex digest.")
+    return value
+
+
 class CreateNodeInput(BaseModel):
     name: str
     album_id: UUID
@@ -66,6 +102,28 @@ class CreateNodeInput(BaseModel):
     file_size: Optional[int] = None
     file_mime: Optional[str] = None
     node_type: Optional[FileSystemNodeType] = FileSystemNodeType.FOLDER
+    # SHA-256 of the file's contents, as lowercase hex; when content deduplication
+    # is enabled, files with the same hash in an album share the same blob
+    content_hash: Optional[str] = None
+
+    _validate_content_hash = validator("content_hash", allow_reuse=True)(
+        validate_content_hash
+    )
+
+
+@dataclass
+class StoredContent:
+    """
+    Blob shared by the files with the same content in an album, with the image
+    data of its picture versions, and the number of nodes referencing it.
+    """
+
+    album_id: UUID
+    content_hash: str
+    file_id: str
+    file_extension: Optional[str]
+    image: Optional[FileImageData]
+    references: int
 
 
 class UpdateNodeInput(BaseModel):
@@ -91,12 +149,75 @@ class FileSystemDataProvider(ABC):
     ) -> Optional[FileSystemNode]:
         raise NotImplementedError()
 
+    def iter_album_nodes(self, album_id: UUID) -> AsyncIterator[FileSystemNode]:
+        """
+        Returns an iterator of all nodes of an album, at any depth and in no
+        particular order, which are read page by page while they are consumed.
+        """
+        raise NotImplementedError()
+
+    async def get_nodes(self, nodes_ids: List[UUID]) -> List[FileSystemNode]:
+        """
+        Returns the nodes with the given ids, in no particular order, reading them
+        with set-based queries. Ids of nodes that don't exist are ignored.
+        """
+        raise NotImplementedError()
+
     async def get_node_children(self, node_id: UUID) -> List[FileSystemNode]:
         raise NotImplementedError()
 
+    async def get_node_children_page(
+        self, node_id: UUID, page_size: int, continuation_token: Optional[str]
+    ) -> NodesPage:
+        """
+        Returns a page of the children of a node, starting from the position
+        described by the continuation token of the previous page, if any.
+        """
+        raise NotImplementedError()
+
+    async def get_album_nodes_page(
+        self, album_id: UUID, page_size: int, continuation_token: Optional[str]
+    ) -> NodesPage:
+        """
+        Returns a page of the root nodes of an album, starting from the position
+        described by the continuation token of the previous page, if any.
+        """
+        raise NotImplementedError()
+
+    async def get_node_children_etags(self, node_id: UUID) -> Dict[UUID, str]:
+        """
+        Returns the etags of the children of a node by their id, without reading
+        their other properties.
+        """
+        raise NotImplementedError()
+
+    async def get_album_nodes_etags(self, album_id: UUID) -> Dict[UUID, str]:
+        """
+        Returns the etags of the root nodes of an album by their id, without reading
+        their other properties.
+        """
+        raise NotImplementedError()
+
+    async def get_node_descendants(self, node_id: UUID) -> List[FileSystemNode]:
+        """
+        Returns all nodes in the subtree of the node with the given id, excluding the
+        node itself. Parents are always returned before their children.
+        """
+        raise NotImplementedError()
+
     async def get_node_path(self, node_id: UUID) -> List[FileSystemNodePathFragment]:
         raise NotImplementedError()
 
+    async def get_node_full_path(
+        self, node_id: UUID, max_depth: int = DEFAULT_MAX_PATH_DEPTH
+    ) -> List[FileSystemNodePathFragment]:
+        """
+        Returns the whole chain of ancestors of the node with the given id, from the
+        root of the album to the node itself. Raises InvalidArgument if the chain is
+        deeper than `max_depth`.
+        """
+        raise NotImplementedError()
+
     async def create_nodes(self, nodes: List[FileSystemNode]) -> None:
         raise NotImplementedError()
 
@@ -106,20 +227,249 @@ class FileSystemDataProvider(ABC):
     async def delete_nodes(self, nodes: List[UUID]) -> None:
         raise NotImplementedError()
 
+    async def update_node_image(
+        self,
+        node_id: UUID,
+        image: Optional[FileImageData],
+        modification_time: datetime,
+    ) -> None:
+        """
+        Sets the image data of a node whose picture was processed in background,
+        clearing its processing state.
+        """
+        raise NotImplementedError()
+
+    async def update_nodes_images(
+        self,
+        images: Dict[UUID, Optional[FileImageData]],
+        modification_time: datetime,
+    ) -> None:
+        """
+        Sets the image data of many nodes at once, by id, like `update_node_image`.
+        Nodes that don't exist anymore are ignored.
+        """
+        raise NotImplementedError()
+
+    async def clone_nodes(
+        self,
+        nodes: List[FileSystemNode],
+        target_parent_id: Optional[UUID],
+        creation_time: datetime,
+    ) -> List[FileSystemNode]:
+        """
+        Clones the given nodes under the target parent, including all their
+        descendants, and returns the clones of the given nodes.
+        """
+        raise NotImplementedError()
+
+
+class ContentsDataProvider(ABC):
+    """
+    Stores the contents shared by files with the same hash, by album, counting the
+    nodes that reference them.
+    """
+
+    async def get_contents(
+        self, album_id: UUID, contents_hashes: Iterable[str]
+    ) -> Dict[str, StoredContent]:
+        raise NotImplementedError()
+
+    async def add_references(self, contents: List[StoredContent]) -> None:
+        """
+        Stores the given contents, or increments the references of those that are
+        already stored by the number of references of the given items, setting
+        their image data if it was not set.
+        """
+        raise NotImplementedError()
+
+    async def release_references(
+        self, album_id: UUID, references: Dict[str, int]
+    ) -> List[StoredContent]:
+        """
+        Decrements the references of the contents with the given hashes, by the
+        given numbers. Contents that are not referenced anymore are deleted and
+        returned, so their blobs can be deleted.
+        """
+        raise NotImplementedError()
+
+    async def update_content_image(
+        self, album_id: UUID, content_hash: str, image: FileImageData
+    ) -> None:
+        """
+        Sets the image data of a content whose picture was processed, if it was not
+        set already.
+        """
+        raise NotImplementedError()
+
+    def iter_album_contents(self, album_id: UUID) -> AsyncIterator[StoredContent]:
+        """
+        Returns an iterator of all contents stored for an album, which are read
+        page by page while they are consumed.
+        """
+        raise NotImplementedError()
+
+
+def clone_nodes_tree(
+    nodes: List[FileSystemNode],
+    target_parent_id: Optional[UUID],
+    creation_time: datetime,
+) -> List[FileSystemNode]:
+    """
+    Returns copies of the given nodes with new ids, preserving their hierarchy.
+    Nodes whose parent is not included in the given list are attached to the target
+    parent. The order of the given nodes is preserved.
+    """
+    new_ids = {node.id: uuid4() for node in nodes}
+    etag = creation_time.isoformat()
+
+    return [
+        replace(
+            node,
+            id=new_ids[node.id],
+            parent_id=(
+                new_ids[node.parent_id]
+                if node.parent_id in new_ids
+                else target_parent_id
+            ),
+            creation_time=creation_time,
+            last_modified_time=creation_time,
+            etag=etag,
+            items=[],
+        )
+        for node in nodes
+    ]
+
+
+def get_image_data(metadata: ImageMetadata) -> FileImageData:
+    medium_size_picture = next(
+        (item for item in metadata.versions if item.size_name == "m"), None
+    )
+    thumbnail_size_picture = next(
+        (item for item in metadata.versions if item.size_name == "s"), None
+    )
+
+    assert (
+        medium_size_picture is not None
+    ), "`m` size must be configured in the gallerist"
+
+    assert (
+        thumbnail_size_picture is not None
+    ), "`s` size must be configured in the gallerist"
+
+    assert medium_size_picture.file_name is not None
+    assert thumbnail_size_picture.file_name is not None
+
+    return FileImageData(
+        medium_image_name=medium_size_picture.file_name,
+        small_image_name=thumbnail_size_picture.file_name,
+        image_width=metadata.width,
+        image_height=metadata.height,
+    )
+
+
+def get_blobs_names(
+    file_id: str, file_extension: Optional[str], image: Optional[FileImageData]
+) -> Set[str]:
+    """
+    Returns the names of the blobs of a file, including the versions of its picture.
+    """
+    names = {file_id + (file_extension or "")}
+
+    if image is not None:
+        names.add(image.medium_image_name)
+        names.add(image.small_image_name)
+    return names
+
+
+def get_hashed_files(
+    nodes: Iterable[FileSystemNode],
+) -> Dict[UUID, List[FileSystemNode]]:
+    """
+    Returns the files having a content hash among the given nodes, by album.
+    """
+    files: Dict[UUID, List[FileSystemNode]] = {}
+
+    for node in nodes:
+        if (
+            node.node_type == FileSystemNodeType.FILE
+            and node.content_hash is not None
+            and node.file_id is not None
+        ):
+            files.setdefault(node.album_id, []).append(node)
+    return files
+
+
+def get_nodes_etag(nodes: Iterable[FileSystemNode]) -> str:
+    """
+    Returns the entity tag of a list of nodes, which changes when any node is
+    added, removed, or modified.
+    """
+    return get_versions_etag({node.id: node.etag for node in nodes})
+
+
+def get_node_etag(node: FileSystemNode) -> str:
+    """
+    Returns the entity tag of a node including its children.
+    """
+    return get_nodes_etag([node, *(node.items or [])])
+
+
+def validate_page_size(page_size: int) -> None:
+    if page_size < 1 or page_size > MAX_NODES_PAGE_SIZE:
+        raise InvalidArgument(
+            f"The page size must be between 1 and {MAX_NODES_PAGE_SIZE}."
+        )
+
 
 handled_pictures = {"image/jpeg", "image/pjpeg", "image/png"}
 
 
+def get_nodes_changes(
+    nodes: Iterable[FileSystemNode], change_type: NodeChangeType, time: datetime
+) -> Dict[UUID, List[NodeChange]]:
+    """
+    Returns the changes of the given nodes, by album.
+    """
+    changes: Dict[UUID, List[NodeChange]] = {}
+
+    for node in nodes:
+        # root nodes can have the id of the album as parent id
+        parent_id = node.parent_id if node.parent_id != node.album_id else None
+        changes.setdefault(node.album_id, []).append(
+            NodeChange(node.id, parent_id, change_type, time)
+        )
+
+    return changes
+
+
 class FileSystemHandler:
     def __init__(
         self,
         fs_data_provider: FileSystemDataProvider,
+        contents_data_provider: ContentsDataProvider,
+        blobs_service: BlobsService,
         pictures_handler: PicturesHandler,
+        pictures_queue: PicturesQueue,
+        settings: Settings,
+        changes_log: ChangesLog,
     ) -> None:
         super().__init__()
 
         self.pictures_handler = pictures_handler
+        self.pictures_queue = pictures_queue
         self.fs_data_provider = fs_data_provider
+        self.contents_data_provider = contents_data_provider
+        self.blobs_service = blobs_service
+        self.settings = settings
+        self.changes_log = changes_log
+
+    async def _log_changes(
+        self, nodes: Iterable[FileSystemNode], change_type: NodeChangeType
+    ) -> None:
+        for album_id, changes in get_nodes_changes(
+            nodes, change_type, datetime.utcnow()
+        ).items():
+            await self.changes_log.append(album_id, changes)
 
     async def get_node(self, node_id: UUID) -> FileSystemNode:
         node = await self.fs_data_provider.get_node(node_id, include_children=True)
@@ -144,14 +494,18 @@ class FileSystemHandler:
         # raise not implemented
         update_time = datetime.utcnow()
 
+        change_type = NodeChangeType.UPDATED
         node.name = data.name
         if data.parent_id is not None:
+            if data.parent_id != node.parent_id:
+                change_type = NodeChangeType.MOVED
             node.parent_id = data.parent_id
 
         node.last_modified_time = update_time
         node.etag = update_time.isoformat()
 
         await self.fs_data_provider.update_nodes([node])
+        await self._log_changes([node], change_type)
         return node
 
     async def update_nodes(
@@ -164,61 +518,81 @@ class FileSystemHandler:
     async def get_node_children(self, node_id: UUID) -> List[FileSystemNode]:
         return await self.fs_data_provider.get_node_children(node_id)
 
-    async def get_node_path(self, node_id: UUID) -> List[FileSystemNodePathFragment]:
-        return await self.fs_data_provider.get_node_path(node_id)
-
-    async def get_full_node_path(
-        self, node_id: UUID
-    ) -> List[FileSystemNodePathFragment]:
-        parts = await self.fs_data_provider.get_node_path(node_id)
+    async def get_node_children_page(
+        self,
+        node_id: UUID,
+        page_size: int = DEFAULT_NODES_PAGE_SIZE,
+        continuation_token: Optional[str] = None,
+    ) -> NodesPage:
+        validate_page_size(page_size)
+        return await self.fs_data_provider.get_node_children_page(
+            node_id, page_size, continuation_token
+        )
 
-        if not parts:
-            return parts
+    async def get_current_node_etag(self, node_id: UUID) -> str:
+        """
+        Returns the current entity tag of a node including its children, reading
+        only their etags.
+        """
+        node = await self.fs_data_provider.get_node(node_id, include_children=False)
 
-        while parts[0].parent_id is not None:
-            # continue to get the parents
-            next_parts = await self.fs_data_provider.get_node_path(parts[0].parent_id)
-            parts = next_parts + parts
+        if node is None:
+            raise ObjectNotFound()
 
-        return parts
+        versions = {node.id: node.etag}
 
-    @log_dep()
-    async def process_image(
-        self, datum: CreateNodeInput, container_name: str, file_extension: str
-    ) -> FileImageData:
-        metadata = await self.pictures_handler.process_picture(
-            container_name, f"{datum.file_id}{file_extension}"
-        )
-        medium_size_picture = next(
-            (item for item in metadata.versions if item.size_name == "m"), None
-        )
-        thumbnail_size_picture = next(
-            (item for item in metadata.versions if item.size_name == "s"), None
-        )
+        if node.node_type == FileSystemNodeType.FOLDER:
+            versions.update(
+                await self.fs_data_provider.get_node_children_etags(node_id)
+            )
 
-        assert (
-            medium_size_picture is not None
-        ), "`m` size must be configured in the gallerist"
+        return get_versions_etag(versions)
 
-        assert (
-            thumbnail_size_picture is not None
-        ), "`s` size must be configured in the gallerist"
+    async def get_current_node_children_etag(self, node_id: UUID) -> str:
+        return get_versions_etag(
+            await self.fs_data_provider.get_node_children_etags(node_id)
+        )
 
-        assert medium_size_picture.file_name is not None
-        assert thumbnail_size_picture.file_name is not None
+    async def get_node_path(self, node_id: UUID) -> List[FileSystemNodePathFragment]:
+        return await self.fs_data_provider.get_node_path(node_id)
 
-        return FileImageData(
-            medium_image_name=medium_size_picture.file_name,
-            small_image_name=thumbnail_size_picture.file_name,
-            image_width=metadata.width,
-            image_height=metadata.height,
+    async def get_full_node_path(
+        self, node_id: UUID
+    ) -> List[FileSystemNodePathFragment]:
+        return await self.fs_data_provider.get_node_full_path(
+            node_id, self.settings.vfs_max_depth
         )
 
-    async def create_nodes(self, data: List[CreateNodeInput]) -> List[FileSystemNode]:
+    @log_dep()
+    async def process_image(self, container_name: str, file_name: str) -> FileImageData:
+        metadata = await self.pictures_handler.process_picture(
+            container_name, file_name
+        )
+        return get_image_data(metadata)
+
+    async def _try_process_image(
+        self, container_name: str, file_name: str
+    ) -> Optional[FileImageData]:
+        # errors are isolated by item: a picture that cannot be processed is
+        # stored like any other file, without medium and small versions
+        try:
+            return await self.process_image(container_name, file_name)
+        except Exception:
+            logger.exception("Failed to process picture %s", file_name)
+            return None
+
+    def _get_new_nodes(
+        self, data: List[CreateNodeInput]
+    ) -> Tuple[List[FileSystemNode], List[int]]:
+        """
+        Returns new nodes for the given input, and the indexes of those that are
+        pictures that can be resized.
+        """
         nodes: List[FileSystemNode] = []
         creation_time = datetime.utcnow()
+        pictures: List[int] = []
 
-        for datum in data:
+        for index, datum in enumerate(data):
             file_extension = None
             node_type = datum.node_type or FileSystemNodeType.FOLDER
             if node_type == FileSystemNodeType.FOLDER:
@@ -227,12 +601,8 @@ class FileSystemHandler:
                 mime_type = datum.file_mime or DEFAULT_MIME
                 file_extension = get_file_extension_from_name(datum.name)
 
-            image_data: Optional[FileImageData] = None
-
             if mime_type in handled_pictures and file_extension is not None:
-                image_data = await self.process_image(
-                    datum, str(datum.album_id), file_extension
-                )
+                pictures.append(index)
 
             slug = slugify(datum.name)
 
@@ -253,15 +623,294 @@ class FileSystemHandler:
                 creation_time=creation_time,
                 hidden=False,
                 items=[],
-                image=image_data,
+                content_hash=(
+                    datum.content_hash
+                    if self.settings.content_deduplication
+                    and node_type == FileSystemNodeType.FILE
+                    else None
+                ),
             )
             nodes.append(node)
 
+        return nodes, pictures
+
+    async def _reuse_contents(
+        self, nodes: List[FileSystemNode]
+    ) -> Dict[UUID, Set[str]]:
+        """
+        Makes new nodes share the blobs of the stored contents with the same hash,
+        together with the versions of their pictures, if they were processed.
+        Files repeated in the given nodes share the blob of the first of them.
+        Returns the names of the blobs that are not referenced anymore, by album.
+        """
+        superseded: Dict[UUID, Set[str]] = {}
+
+        for album_id, files in get_hashed_files(nodes).items():
+            contents = await self.contents_data_provider.get_contents(
+                album_id, {node.content_hash for node in files if node.content_hash}
+            )
+            first_files: Dict[str, FileSystemNode] = {}
+
+            for node in files:
+                assert node.content_hash is not None and node.file_id is not None
+                content = contents.get(node.content_hash)
+                blob_name = node.file_id + (node.file_extension or "")
+
+                if content is not None:
+                    node.file_id = content.file_id
+                    node.file_extension = content.file_extension
+                    node.image = content.image
+                else:
+                    first_file = first_files.setdefault(node.content_hash, node)
+                    node.file_id = first_file.file_id
+                    node.file_extension = first_file.file_extension
+
+                if blob_name != node.file_id + (node.file_extension or ""):
+                    superseded.setdefault(album_id, set()).add(blob_name)
+
+        return superseded
+
+    async def _try_delete_blobs(self, album_id: UUID, blobs_names: Set[str]) -> None:
+        try:
+            await self.blobs_service.delete_blobs(str(album_id), sorted(blobs_names))
+        except Exception:
+            # nodes are stored anyway, leaving orphaned blobs
+            logger.exception("Failed to delete blobs of album %s", album_id)
+
+    async def _add_references(self, nodes: List[FileSystemNode]) -> None:
+        for album_id, files in get_hashed_files(nodes).items():
+            contents: Dict[str, StoredContent] = {}
+
+            for node in files:
+                assert node.content_hash is not None and node.file_id is not None
+                content = contents.get(node.content_hash)
+
+                if content is None:
+                    contents[node.content_hash] = StoredContent(
+                        album_id=album_id,
+                        content_hash=node.content_hash,
+                        file_id=node.file_id,
+                        file_extension=node.file_extension,
+                        image=node.image,
+                        references=1,
+                    )
+                else:
+                    content.references += 1
+
+            await self.contents_data_provider.add_references(list(contents.values()))
+
+    async def _release_references(self, nodes: List[FileSystemNode]) -> None:
+        """
+        Releases the contents referenced by deleted nodes, deleting the blobs that
+        are not used anymore: those of contents without references, and those
+        belonging only to deleted nodes, like versions of pictures that were
+        processed again for a node.
+        """
+        for album_id, files in get_hashed_files(nodes).items():
+            references: Dict[str, int] = {}
+
+            for node in files:
+                assert node.content_hash is not None
+                references[node.content_hash] = references.get(node.content_hash, 0) + 1
+
+            contents = await self.contents_data_provider.get_contents(
+                album_id, references.keys()
+            )
+            released = await self.contents_data_provider.release_references(
+                album_id, references
+            )
+            blobs_names: Set[str] = set()
+
+            for content in released:
+                blobs_names.update(
+                    get_blobs_names(
+                        content.file_id, content.file_extension, content.image
+                    )
+                )
+
+            for node in files:
+                assert node.content_hash is not None and node.file_id is not None
+                content = contents.get(node.content_hash)
+                shared_names = (
+                    get_blobs_names(
+                        content.file_id, content.file_extension, content.image
+                    )
+                    if content is not None
+                    else set()
+                )
+                blobs_names.update(
+                    get_blobs_names(node.file_id, node.file_extension, node.image)
+                    - shared_names
+                )
+
+            if blobs_names:
+                await self._try_delete_blobs(album_id, blobs_names)
+
+    async def _get_subtrees_nodes(
+        self, nodes: List[FileSystemNode]
+    ) -> List[FileSystemNode]:
+        items = {node.id: node for node in nodes}
+
+        for node in nodes:
+            if node.node_type == FileSystemNodeType.FOLDER:
+                for descendant in await self.fs_data_provider.get_node_descendants(
+                    node.id
+                ):
+                    items[descendant.id] = descendant
+
+        return list(items.values())
+
+    async def _enqueue_pictures(self, nodes: List[FileSystemNode]) -> None:
+        try:
+            await self.pictures_queue.enqueue(
+                [
+                    PictureTaskInput(
+                        node_id=node.id,
+                        container_name=str(node.album_id),
+                        file_name=f"{node.file_id}{node.file_extension}",
+                    )
+                    for node in nodes
+                ]
+            )
+        except Exception:
+            # nodes are already stored as being processed, and nothing would
+            # process them: their pictures are processed immediately instead
+            logger.exception("Failed to enqueue %s pictures", len(nodes))
+            await self._process_pictures(nodes)
+            await self._store_pictures_images(nodes)
+
+    async def _process_pictures(self, nodes: List[FileSystemNode]) -> None:
+        # pictures are resized concurrently, up to the configured limit
+        images_data = await gather_limited(
+            self.settings.image_processing_concurrency,
+            (
+                self._try_process_image(
+                    str(node.album_id), f"{node.file_id}{node.file_extension}"
+                )
+                for node in nodes
+            ),
+        )
+
+        for node, image_data in zip(nodes, images_data):
+            node.image = image_data
+
+    async def create_nodes(self, data: List[CreateNodeInput]) -> List[FileSystemNode]:
+        nodes, pictures_indexes = self._get_new_nodes(data)
+        superseded = await self._reuse_contents(nodes)
+
+        # pictures whose versions are shared with other nodes are not processed
+        pictures = [
+            nodes[index] for index in pictures_indexes if nodes[index].image is None
+        ]
+
+        if pictures and self.settings.background_pictures_processing:
+            # nodes are stored immediately, and their pictures are processed by the
+            # background pipeline, which sets their image data when done
+            for node in pictures:
+                node.processing = True
+
+            await self._store_new_nodes(nodes, superseded)
+            await self._enqueue_pictures(pictures)
+            return nodes
+
+        if pictures:
+            await self._process_pictures(pictures)
+
+        await self._store_new_nodes(nodes, superseded)
+        return nodes
+
+    async def _store_new_nodes(
+        self, nodes: List[FileSystemNode], superseded: Dict[UUID, Set[str]]
+    ) -> None:
+        await self.fs_data_provider.create_nodes(nodes)
+        await self._add_references(nodes)
+        await self._log_changes(nodes, NodeChangeType.CREATED)
+
+        # files uploaded with contents that were already stored are deleted, once
+        # the nodes reference the stored blobs
+        for album_id, blobs_names in superseded.items():
+            await self._try_delete_blobs(album_id, blobs_names)
+
+    async def reserve_nodes(self, data: List[CreateNodeInput]) -> List[FileSystemNode]:
+        """
+        Stores nodes for files that are still being uploaded, in a single batch.
+        Pictures are marked as being processed, and are processed when uploads are
+        completed, calling `process_pictures`.
+        """
+        nodes, pictures_indexes = self._get_new_nodes(data)
+        # uploads are initialized with the blobs of stored contents, so files that
+        # are still being uploaded are not superseded by them
+        await self._reuse_contents(nodes)
+
+        for index in pictures_indexes:
+            if nodes[index].image is None:
+                nodes[index].processing = True
+
         await self.fs_data_provider.create_nodes(nodes)
+        await self._add_references(nodes)
+        await self._log_changes(nodes, NodeChangeType.CREATED)
         return nodes
 
+    async def process_pictures(self, nodes_ids: List[UUID]) -> List[FileSystemNode]:
+        """
+        Processes the pictures of reserved nodes, whose files have been uploaded.
+        Nodes that are not waiting for processing are ignored.
+        """
+        pictures = [
+            node
+            for node in await self.fs_data_provider.get_nodes(nodes_ids)
+            if node.processing
+        ]
+
+        if not pictures:
+            return []
+
+        if self.settings.background_pictures_processing:
+            await self._enqueue_pictures(pictures)
+            return pictures
+
+        await self._process_pictures(pictures)
+        await self._store_pictures_images(pictures)
+        return pictures
+
+    async def _store_pictures_images(self, pictures: List[FileSystemNode]) -> None:
+        modification_time = datetime.utcnow()
+
+        await self.fs_data_provider.update_nodes_images(
+            {node.id: node.image for node in pictures}, modification_time
+        )
+
+        # pictures with the same contents share their versions: each content is
+        # updated once, sequentially, since data providers like SQL sessions don't
+        # support concurrent operations
+        contents_images: Dict[Tuple[UUID, str], FileImageData] = {}
+
+        for node in pictures:
+            node.processing = False
+            node.etag = modification_time.isoformat()
+            node.last_modified_time = modification_time
+
+            if node.content_hash is not None and node.image is not None:
+                contents_images[(node.album_id, node.content_hash)] = node.image
+
+        for (album_id, content_hash), image in contents_images.items():
+            await self.contents_data_provider.update_content_image(
+                album_id, content_hash, image
+            )
+
+        await self._log_changes(pictures, NodeChangeType.UPDATED)
+
     async def delete_nodes(self, nodes_ids: List[UUID]) -> None:
+        # nodes are read to log their changes by album
+        nodes = await self.fs_data_provider.get_nodes(nodes_ids)
+        # descendants of deleted folders are deleted with them, and have their own
+        # changes, like the references of their contents are released
+        deleted_nodes = await self._get_subtrees_nodes(nodes)
         await self.fs_data_provider.delete_nodes(nodes_ids)
+        await self._log_changes(deleted_nodes, NodeChangeType.DELETED)
+
+        if self.settings.content_deduplication:
+            await self._release_references(deleted_nodes)
 
     async def _initialize_copy_operation(
         self, data: CopyOperationInput, validate_source_operation: bool = False
@@ -361,53 +1010,24 @@ class FileSystemHandler:
             node.parent_id = data.target_parent_id
 
         await self.fs_data_provider.update_nodes(nodes_to_move)
+        await self._log_changes(nodes_to_move, NodeChangeType.MOVED)
 
         return nodes_to_move
 
-    async def paste_nodes(
-        self, data: CopyOperationInput, source_operation: bool = True
-    ) -> List[FileSystemNode]:
-        creation_time = datetime.utcnow()
+    async def paste_nodes(self, data: CopyOperationInput) -> List[FileSystemNode]:
         nodes_to_paste = await self._initialize_copy_operation(
-            data, validate_source_operation=source_operation
+            data, validate_source_operation=True
         )
-        cloned_folders_by_original_id: Dict[UUID, UUID] = {}
-
-        for node in nodes_to_paste:
-            new_id = uuid4()
 
-            if node.node_type == FileSystemNodeType.FOLDER:
-                cloned_folders_by_original_id[node.id] = new_id
-
-            node.id = new_id
-            node.creation_time = creation_time
-            node.last_modified_time = creation_time
-            node.etag = creation_time.isoformat()
-            node.parent_id = data.target_parent_id
-
-        await self.fs_data_provider.create_nodes(nodes_to_paste)
+        clones = await self.fs_data_provider.clone_nodes(
+            nodes_to_paste, data.target_parent_id, datetime.utcnow()
+        )
+        # parents precede their children, so clients can apply changes in order
+        created_nodes = await self._get_subtrees_nodes(clones)
+        await self._log_changes(created_nodes, NodeChangeType.CREATED)
 
-        if cloned_folders_by_original_id:
-            for original_node_id, new_node_id in cloned_folders_by_original_id.items():
-                children = await self.fs_data_provider.get_node_children(
-                    original_node_id
-                )
-                await self.paste_nodes(
-                    CopyOperationInput(
-                        album_id=data.album_id,
-                        source_parent_id=original_node_id,
-                        target_parent_id=new_node_id,
-                        nodes=[
-                            UpdateNodeInput(
-                                id=child.id,
-                                name=child.name,
-                                etag=child.etag,
-                                parent_id=original_node_id,
-                            )
-                            for child in children
-                        ],
-                    ),
-                    source_operation=False,
-                )
+        if self.settings.content_deduplication:
+            # copies of files share the blobs of the original files
+            await self._add_references(created_nodes)
 
-        return nodes_to_paste
+        return clones
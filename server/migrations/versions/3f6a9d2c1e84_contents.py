@@ -0,0 +1,62 @@
+"""contents
+
+Revision ID: 3f6a9d2c1e84
+Revises: 8c4d21e7b5f0
+Create Date: 2026-10-18 16:41:09.274163
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from data.sql.uuid import UUID
+
+
+# revision identifiers, used by Alembic.
+revision = "3f6a9d2c1e84"
+down_revision = "8c4d21e7b5f0"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "contents",
+        sa.Column("album_id", UUID(), nullable=False),
+        sa.Column("content_hash", sa.String(length=64), nullable=False),
+        sa.Column("file_id", sa.String(length=255), nullable=False),
+        sa.Column("file_extension", sa.String(length=50), nullable=True),
+        sa.Column("medium_image_name", sa.String(length=255), nullable=True),
+        sa.Column("small_image_name", sa.String(length=255), nullable=True),
+        sa.Column("image_width", sa.Integer(), nullable=True),
+        sa.Column("image_height", sa.Integer(), nullable=True),
+        sa.Column("references_count", sa.Integer(), nullable=False),
+        sa.Column(
+            "created_at",
+            sa.DateTime(),
+            server_default=sa.text("(CURRENT_TIMESTAMP)"),
+            nullable=False,
+        ),
+        sa.Column(
+            "updated_at",
+            sa.DateTime(),
+            server_default=sa.text("(CURRENT_TIMESTAMP)"),
+            nullable=False,
+        ),
+        sa.Column(
+            "etag",
+            sa.String(length=50),
+            server_default=sa.text("(CURRENT_TIMESTAMP)"),
+            nullable=False,
+        ),
+        sa.ForeignKeyConstraint(["album_id"], ["albums.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("album_id", "content_hash"),
+    )
+    op.add_column(
+        "nodes", sa.Column("content_hash", sa.String(length=64), nullable=True)
+    )
+
+
+def downgrade():
+    with op.batch_alter_table("nodes") as batch_op:
+        batch_op.drop_column("content_hash")
+
+    op.drop_table("contents")
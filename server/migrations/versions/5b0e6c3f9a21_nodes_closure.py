@@ -0,0 +1,56 @@
+"""nodes closure table
+
+Revision ID: 5b0e6c3f9a21
+Revises: 2734ed11b75e
+Create Date: 2026-10-18 10:55:12.418203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from data.sql.uuid import UUID
+
+
+# revision identifiers, used by Alembic.
+revision = "5b0e6c3f9a21"
+down_revision = "2734ed11b75e"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "nodes_closure",
+        sa.Column("ancestor_id", UUID(), nullable=False),
+        sa.Column("descendant_id", UUID(), nullable=False),
+        sa.Column("depth", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["ancestor_id"], ["nodes.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["descendant_id"], ["nodes.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("ancestor_id", "descendant_id"),
+    )
+    op.create_index(
+        op.f("ix_nodes_closure_descendant_id"),
+        "nodes_closure",
+        ["descendant_id"],
+        unique=False,
+    )
+
+    # backfill the closure table for existing nodes
+    op.execute(
+        """
+        WITH RECURSIVE closure(ancestor_id, descendant_id, depth) AS (
+            SELECT id, id, 0 FROM nodes
+            UNION ALL
+            SELECT N.parent_id, C.descendant_id, C.depth + 1
+            FROM closure C
+            INNER JOIN nodes N ON N.id = C.ancestor_id
+            WHERE N.parent_id IS NOT NULL
+        )
+        INSERT INTO nodes_closure (ancestor_id, descendant_id, depth)
+        SELECT ancestor_id, descendant_id, depth FROM closure;
+        """
+    )
+
+
+def downgrade():
+    op.drop_index(op.f("ix_nodes_closure_descendant_id"), table_name="nodes_closure")
+    op.drop_table("nodes_closure")
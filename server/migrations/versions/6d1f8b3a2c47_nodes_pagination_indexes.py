@@ -0,0 +1,41 @@
+"""nodes pagination indexes
+
+Revision ID: 6d1f8b3a2c47
+Revises: 3f6a9d2c1e84
+Create Date: 2026-10-18 18:12:37.508214
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "6d1f8b3a2c47"
+down_revision = "3f6a9d2c1e84"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # composite indexes replace the indexes on album_id and parent_id, which are
+    # their prefixes, and support keyset pagination of nodes sorted by name
+    op.create_index(
+        op.f("ix_nodes_parent_id_name_id"),
+        "nodes",
+        ["parent_id", "name", "id"],
+        unique=False,
+    )
+    op.create_index(
+        op.f("ix_nodes_album_id_parent_id_name_id"),
+        "nodes",
+        ["album_id", "parent_id", "name", "id"],
+        unique=False,
+    )
+    op.drop_index(op.f("ix_nodes_parent_id"), table_name="nodes")
+    op.drop_index(op.f("ix_nodes_album_id"), table_name="nodes")
+
+
+def downgrade():
+    op.create_index(op.f("ix_nodes_album_id"), "nodes", ["album_id"], unique=False)
+    op.create_index(op.f("ix_nodes_parent_id"), "nodes", ["parent_id"], unique=False)
+    op.drop_index(op.f("ix_nodes_album_id_parent_id_name_id"), table_name="nodes")
+    op.drop_index(op.f("ix_nodes_parent_id_name_id"), table_name="nodes")
@@ -0,0 +1,33 @@
+"""nodes processing flag
+
+Revision ID: 8c4d21e7b5f0
+Revises: 5b0e6c3f9a21
+Create Date: 2026-10-18 14:02:37.519844
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "8c4d21e7b5f0"
+down_revision = "5b0e6c3f9a21"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        "nodes",
+        sa.Column(
+            "processing",
+            sa.Boolean(),
+            nullable=False,
+            server_default=sa.false(),
+        ),
+    )
+
+
+def downgrade():
+    with op.batch_alter_table("nodes") as batch_op:
+        batch_op.drop_column("processing")
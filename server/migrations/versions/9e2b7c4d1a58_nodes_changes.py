@@ -0,0 +1,43 @@
+"""nodes changes
+
+Revision ID: 9e2b7c4d1a58
+Revises: 6d1f8b3a2c47
+Create Date: 2026-10-18 21:07:52.113846
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from data.sql.uuid import UUID
+
+
+# revision identifiers, used by Alembic.
+revision = "9e2b7c4d1a58"
+down_revision = "6d1f8b3a2c47"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "nodes_changes",
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("album_id", UUID(), nullable=False),
+        sa.Column("node_id", UUID(), nullable=False),
+        sa.Column("parent_id", UUID(), nullable=True),
+        sa.Column("change_type", sa.String(length=20), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(["album_id"], ["albums.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+        sqlite_autoincrement=True,
+    )
+    op.create_index(
+        op.f("ix_nodes_changes_album_id_id"),
+        "nodes_changes",
+        ["album_id", "id"],
+        unique=False,
+    )
+
+
+def downgrade():
+    op.drop_index(op.f("ix_nodes_changes_album_id_id"), table_name="nodes_changes")
+    op.drop_table("nodes_changes")
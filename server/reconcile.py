@@ -0,0 +1,135 @@
+"""
+This module contains a job that reconciles the blobs of albums with the nodes of
+their virtual file systems, reporting orphan blobs (blobs not referenced by any
+node), missing blobs (nodes whose blobs don't exist), and orphan nodes (nodes whose
+parent doesn't exist).
+
+To report discrepancies of all albums:
+    $ python reconcile.py
+
+To report discrepancies of a single album, deleting orphan nodes and orphan blobs
+that were not modified in the last 48 hours:
+    $ python reconcile.py --album <album_id> --clean --min-age-hours 48
+"""
+import argparse
+import asyncio
+from contextlib import AsyncExitStack
+from datetime import timedelta
+from typing import List
+from uuid import UUID
+
+from azure.data.tables.aio import TableServiceClient
+from azure.storage.blob.aio import BlobServiceClient
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from app.program import load_configuration
+from data.azstorage.albums import TableAPIAlbumsDataProvider
+from data.azstorage.blobs import AzureStorageBlobsService
+from data.azstorage.contents import TableAPIContentsDataProvider
+from data.azstorage.vfs import TableAPIFileSystemDataProvider
+from data.sql.albums import SQLAlbumsDataProvider
+from data.sql.contents import SQLContentsDataProvider
+from data.sql.vfs import SQLFileSystemDataProvider
+from domain.reconciliation import Discrepancy, ReconciliationHandler
+from domain.settings import Settings
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Reconciles the blobs of albums with their nodes."
+    )
+    parser.add_argument("--album", type=UUID, help="id of the album to reconcile")
+    parser.add_argument(
+        "--clean", action="store_true", help="delete orphan blobs and nodes"
+    )
+    parser.add_argument(
+        "--min-age-hours",
+        type=float,
+        default=24,
+        help="ignore blobs and nodes created more recently than this",
+    )
+    return parser.parse_args()
+
+
+def print_discrepancy(discrepancy: Discrepancy) -> None:
+    print(
+        discrepancy.kind.value,
+        discrepancy.album_id,
+        discrepancy.node_id or "",
+        discrepancy.blob_name or "",
+        sep="\t",
+    )
+
+
+async def main() -> None:
+    args = parse_args()
+    settings = Settings.from_configuration(load_configuration())
+
+    async with AsyncExitStack() as stack:
+        blob_service_client = await stack.enter_async_context(
+            BlobServiceClient.from_connection_string(settings.storage_connection_string)
+        )
+        blobs_service = AzureStorageBlobsService(blob_service_client, settings)
+
+        if settings.db_connection_string:
+            engine = create_async_engine(settings.db_connection_string)
+            stack.push_async_callback(engine.dispose)
+            session = await stack.enter_async_context(
+                AsyncSession(engine, expire_on_commit=False)
+            )
+            handler = ReconciliationHandler(
+                SQLAlbumsDataProvider(session),
+                SQLFileSystemDataProvider(session),
+                SQLContentsDataProvider(session),
+                blobs_service,
+            )
+        else:
+            table_service_client = await stack.enter_async_context(
+                TableServiceClient.from_connection_string(
+                    conn_str=settings.storage_connection_string
+                )
+            )
+            handler = ReconciliationHandler(
+                TableAPIAlbumsDataProvider(table_service_client),
+                TableAPIFileSystemDataProvider(table_service_client),
+                TableAPIContentsDataProvider(table_service_client),
+                blobs_service,
+            )
+
+        albums_ids: List[UUID]
+        if args.album:
+            albums_ids = [args.album]
+        else:
+            albums = await handler.albums_data_provider.get_albums()
+            albums_ids = [album.id for album in albums]
+
+        min_age = timedelta(hours=args.min_age_hours)
+        failures = 0
+
+        for album_id in albums_ids:
+            try:
+                report = await handler.reconcile_album(
+                    album_id, args.clean, min_age, print_discrepancy
+                )
+            except Exception as exc:
+                # a failure in one album must not prevent reconciling the others
+                print(f"Failed to reconcile album {album_id}: {exc!r}")
+                failures += 1
+                continue
+
+            print(
+                f"Album {album_id}: {report.nodes} nodes, {report.blobs} blobs, "
+                f"{report.orphan_blobs} orphan blobs "
+                f"({report.orphan_blobs_size} bytes), "
+                f"{report.missing_blobs} missing blobs, "
+                f"{report.orphan_nodes} orphan nodes, "
+                f"{report.deleted_blobs} deleted blobs, "
+                f"{report.deleted_nodes} deleted nodes."
+            )
+
+    if failures:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,33 @@
+"""
+This module contains data migrations for deployments that use the Table API of the
+Storage Account as persistence layer for the virtual file system.
+
+To backfill the secondary index of nodes, for nodes created before it was
+introduced:
+    $ python tablemigrations.py
+"""
+import asyncio
+
+from azure.data.tables.aio import TableServiceClient
+
+from app.program import load_configuration
+from data.azstorage.vfs import TableAPIFileSystemDataProvider, backfill_nodes_index
+from domain.settings import Settings
+
+
+async def main() -> None:
+    settings = Settings.from_configuration(load_configuration())
+
+    async with TableServiceClient.from_connection_string(
+        conn_str=settings.storage_connection_string
+    ) as table_service_client:
+        await table_service_client.create_table_if_not_exists(
+            TableAPIFileSystemDataProvider.index_table_name
+        )
+        count = await backfill_nodes_index(table_service_client)
+
+    print(f"Indexed {count} nodes.")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
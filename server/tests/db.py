@@ -0,0 +1,73 @@
+from datetime import datetime
+from typing import Optional
+from uuid import UUID, uuid4
+
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from data.sql.dbmodel import AlbumEntity, StorageEntity, metadata
+from domain.albums import DEFAULT_STORAGE
+from domain.vfs import FileSystemNode, FileSystemNodeType
+
+
+async def create_session(db_path) -> AsyncSession:
+    """
+    Creates a SQLite database with the application tables at the given path,
+    returning a session bound to it.
+    """
+    engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+
+    async with engine.begin() as connection:
+        await connection.run_sync(metadata.create_all)
+
+    return sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)()
+
+
+async def create_album(session: AsyncSession) -> UUID:
+    album_id = uuid4()
+
+    async with session:
+        session.add_all(
+            [
+                StorageEntity(
+                    id=str(DEFAULT_STORAGE), name="Default", key_secret_id=""
+                ),
+                AlbumEntity(
+                    id=str(album_id),
+                    storage_id=str(DEFAULT_STORAGE),
+                    name="Test",
+                    slug="test",
+                    public=False,
+                ),
+            ]
+        )
+        await session.commit()
+
+    return album_id
+
+
+def new_node(
+    album_id: UUID,
+    parent_id: Optional[UUID],
+    name: str,
+    node_type: FileSystemNodeType = FileSystemNodeType.FOLDER,
+) -> FileSystemNode:
+    now = datetime.utcnow()
+    return FileSystemNode(
+        id=uuid4(),
+        album_id=album_id,
+        parent_id=parent_id,
+        node_type=node_type,
+        name=name,
+        slug=name.lower(),
+        type="folder" if node_type == FileSystemNodeType.FOLDER else "image/jpeg",
+        file_id=None if node_type == FileSystemNodeType.FOLDER else str(uuid4()),
+        file_extension=None if node_type == FileSystemNodeType.FOLDER else ".jpg",
+        file_size=None if node_type == FileSystemNodeType.FOLDER else 100,
+        icon=None,
+        etag=now.isoformat(),
+        last_modified_time=now,
+        creation_time=now,
+        hidden=False,
+        items=[],
+    )
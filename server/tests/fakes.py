@@ -0,0 +1,73 @@
+"""
+Fakes and helpers shared by tests of the domain handlers, replacing the services
+that require Azure Storage or process pictures.
+"""
+import asyncio
+from datetime import timedelta
+from types import SimpleNamespace
+from typing import List
+
+from data.sql.changes import SQLChangesDataProvider
+from domain.changes import ChangesLog
+from domain.settings import Settings
+
+# connection string of a storage account that is never contacted by tests
+CONNECTION_STRING = (
+    "DefaultEndpointsProtocol=https;AccountName=foo;"
+    "AccountKey=Zm9v;EndpointSuffix=core.windows.net"
+)
+
+
+def get_settings(**kwargs) -> Settings:
+    options = {
+        "storage_account_name": "test",
+        "storage_account_key": "test",
+        "db_connection_string": "",
+        "monitoring_key": "",
+    }
+    options.update(kwargs)
+    return Settings(**options)
+
+
+def get_changes_log(session, settle_time: float = 0) -> ChangesLog:
+    changes_log = ChangesLog(SQLChangesDataProvider(session), get_settings())
+    # changes are returned immediately, unless a test verifies how they settle
+    changes_log.settle_time = timedelta(seconds=settle_time)
+    return changes_log
+
+
+class FakeBlobsService:
+    def __init__(self) -> None:
+        self.signed: List[str] = []
+        self.deleted: List[str] = []
+
+    def get_admin_blob_sas(self, container_name: str, file_name: str) -> str:
+        self.signed.append(f"{container_name}/{file_name}")
+        return f"token-{file_name}"
+
+    async def delete_blobs(self, container_name: str, files_names: List[str]) -> None:
+        self.deleted.extend(f"{container_name}/{name}" for name in files_names)
+
+
+class FakePicturesHandler:
+    def __init__(self) -> None:
+        self.running = 0
+        self.max_running = 0
+
+    async def process_picture(self, container_name: str, file_name: str):
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        await asyncio.sleep(0.01)
+        self.running -= 1
+
+        if file_name.startswith("broken"):
+            raise ValueError("Invalid picture")
+
+        return SimpleNamespace(
+            width=4000,
+            height=3000,
+            versions=[
+                SimpleNamespace(size_name="m", file_name=f"m-{file_name}"),
+                SimpleNamespace(size_name="s", file_name=f"s-{file_name}"),
+            ],
+        )
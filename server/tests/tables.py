@@ -0,0 +1,345 @@
+"""
+In-memory implementation of the subset of the asynchronous Table API clients used
+by the application, to test data providers without a Storage Account.
+"""
+import operator
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from azure.core import MatchConditions
+from azure.core.exceptions import (
+    ResourceExistsError,
+    ResourceModifiedError,
+    ResourceNotFoundError,
+)
+from azure.data.tables import TableEntity, TableTransactionError, UpdateMode
+
+_operators = {
+    "eq": operator.eq,
+    "ne": operator.ne,
+    "gt": operator.gt,
+    "ge": operator.ge,
+    "lt": operator.lt,
+    "le": operator.le,
+}
+
+_token = re.compile(r"\s*(?:(\(|\))|(\w+) (eq|ne|gt|ge|lt|le) '([^']*)'|(and|or)\b)")
+
+
+def _tokenize(query_filter: str) -> List[tuple]:
+    tokens = []
+    position = 0
+    query_filter = query_filter.rstrip()
+
+    while position < len(query_filter):
+        match = _token.match(query_filter, position)
+        if match is None:
+            raise ValueError(f"Unsupported filter: {query_filter}")
+        parenthesis, name, operator_name, value, keyword = match.groups()
+        if parenthesis or keyword:
+            tokens.append((parenthesis or keyword,))
+        else:
+            tokens.append((name, operator_name, value))
+        position = match.end()
+
+    return tokens
+
+
+def _matches(entity: dict, query_filter: str) -> bool:
+    """
+    Evaluates a filter of conditions on string properties, grouped with and / or
+    and parentheses, giving precedence to and, like the Table API.
+    """
+    tokens = _tokenize(query_filter)
+    position = 0
+
+    def peek() -> Optional[str]:
+        if position < len(tokens) and len(tokens[position]) == 1:
+            return tokens[position][0]
+        return None
+
+    def parse_or() -> bool:
+        nonlocal position
+        result = parse_and()
+        while peek() == "or":
+            position += 1
+            result = parse_and() or result
+        return result
+
+    def parse_and() -> bool:
+        nonlocal position
+        result = parse_operand()
+        while peek() == "and":
+            position += 1
+            result = parse_operand() and result
+        return result
+
+    def parse_operand() -> bool:
+        nonlocal position
+        if position >= len(tokens):
+            raise ValueError(f"Unsupported filter: {query_filter}")
+
+        token = tokens[position]
+        position += 1
+
+        if token == ("(",):
+            result = parse_or()
+            if peek() != ")":
+                raise ValueError(f"Unsupported filter: {query_filter}")
+            position += 1
+            return result
+
+        if len(token) != 3:
+            raise ValueError(f"Unsupported filter: {query_filter}")
+
+        name, operator_name, value = token
+        return name in entity and _operators[operator_name](str(entity[name]), value)
+
+    result = parse_or()
+
+    if position != len(tokens):
+        raise ValueError(f"Unsupported filter: {query_filter}")
+    return result
+
+
+class FakePageIterator:
+    """
+    Iterates pages of entities like the Table API, which returns the keys of the
+    next entity as continuation token.
+    """
+
+    def __init__(
+        self,
+        entities: List[dict],
+        select: Optional[List[str]],
+        results_per_page: int,
+        continuation_token: Optional[dict],
+    ) -> None:
+        self.entities = entities
+        self.select = select
+        self.results_per_page = results_per_page
+        self.continuation_token = continuation_token
+        self._index = 0
+
+        if continuation_token:
+            start = (continuation_token["PartitionKey"], continuation_token["RowKey"])
+            self._index = next(
+                (
+                    index
+                    for index, entity in enumerate(entities)
+                    if (entity["PartitionKey"], entity["RowKey"]) >= start
+                ),
+                len(entities),
+            )
+
+    def __aiter__(self) -> "FakePageIterator":
+        return self
+
+    async def __anext__(self):
+        if self._index >= len(self.entities) and self.continuation_token is None:
+            raise StopAsyncIteration()
+
+        page = self.entities[self._index : self._index + self.results_per_page]
+        self._index += len(page)
+
+        if self._index < len(self.entities):
+            entity = self.entities[self._index]
+            self.continuation_token = {
+                "PartitionKey": entity["PartitionKey"],
+                "RowKey": entity["RowKey"],
+            }
+        else:
+            self.continuation_token = None
+
+        return _iterate(
+            [
+                {key: entity[key] for key in self.select if key in entity}
+                if self.select
+                else dict(entity)
+                for entity in page
+            ]
+        )
+
+
+class FakeItemPaged:
+    def __init__(
+        self, entities: List[dict], select: Optional[List[str]], results_per_page: int
+    ) -> None:
+        self.entities = entities
+        self.select = select
+        self.results_per_page = results_per_page
+
+    def by_page(self, continuation_token: Optional[dict] = None) -> FakePageIterator:
+        return FakePageIterator(
+            self.entities, self.select, self.results_per_page, continuation_token
+        )
+
+    async def __aiter__(self):
+        async for page in self.by_page():
+            async for entity in page:
+                yield entity
+
+
+async def _iterate(items: List[dict]):
+    for item in items:
+        yield item
+
+
+class FakeTableClient:
+    def __init__(self, table_name: str) -> None:
+        self.table_name = table_name
+        self.entities: Dict[Tuple[str, str], dict] = {}
+        self.etags: Dict[Tuple[str, str], str] = {}
+        self.calls: Counter = Counter()
+        self._version = 0
+
+    def _touch(self, key: Tuple[str, str]) -> None:
+        self._version += 1
+        self.etags[key] = f'W/"{self._version}"'
+
+    def _check_etag(self, key: Tuple[str, str], kwargs: dict) -> None:
+        if kwargs.get("match_condition") == MatchConditions.IfNotModified and (
+            self.etags.get(key) != kwargs.get("etag")
+        ):
+            raise ResourceModifiedError("Precondition Failed")
+
+    def _sorted(self, entities: Iterable[dict], select: Optional[List[str]]):
+        for entity in sorted(
+            entities, key=lambda item: (item["PartitionKey"], item["RowKey"])
+        ):
+            yield {
+                key: entity[key] for key in select if key in entity
+            } if select else dict(entity)
+
+    async def get_entity(self, partition_key: str, row_key: str, **kwargs) -> dict:
+        self.calls["get_entity"] += 1
+        key = (partition_key, row_key)
+        try:
+            entity = TableEntity(self.entities[key])
+        except KeyError:
+            raise ResourceNotFoundError("Not Found")
+        entity._metadata = {"etag": self.etags.get(key), "timestamp": None}
+        return entity
+
+    async def create_entity(self, entity: dict, **kwargs) -> None:
+        self.calls["create_entity"] += 1
+        self._create(entity)
+
+    async def update_entity(
+        self, entity: dict, mode=UpdateMode.MERGE, **kwargs
+    ) -> None:
+        self.calls["update_entity"] += 1
+        key = (entity["PartitionKey"], entity["RowKey"])
+        if key not in self.entities:
+            raise ResourceNotFoundError("Not found")
+        self._check_etag(key, kwargs)
+        values = {name: value for name, value in entity.items() if value is not None}
+        if mode == UpdateMode.MERGE:
+            self.entities[key].update(values)
+        else:
+            self.entities[key] = values
+        self._touch(key)
+
+    async def upsert_entity(self, entity: dict, **kwargs) -> None:
+        self.calls["upsert_entity"] += 1
+        key = (entity["PartitionKey"], entity["RowKey"])
+        self.entities[key] = dict(entity)
+        self._touch(key)
+
+    async def delete_entity(self, partition_key: str, row_key: str, **kwargs) -> None:
+        self.calls["delete_entity"] += 1
+        key = (partition_key, row_key)
+        if key in self.entities:
+            self._check_etag(key, kwargs)
+        self.entities.pop(key, None)
+
+    def _create(self, entity: dict) -> None:
+        key = (entity["PartitionKey"], entity["RowKey"])
+        if key in self.entities:
+            raise ResourceExistsError("Conflict")
+        self.entities[key] = {
+            name: value for name, value in entity.items() if value is not None
+        }
+        self._touch(key)
+
+    async def submit_transaction(self, operations) -> None:
+        self.calls["submit_transaction"] += 1
+        operations = list(operations)
+
+        if len(operations) > 100:
+            raise TableTransactionError(message="Too many operations in transaction")
+
+        if len({entity["PartitionKey"] for _, entity in operations}) > 1:
+            raise TableTransactionError(message="Operations span multiple partitions")
+
+        if len({entity["RowKey"] for _, entity in operations}) < len(operations):
+            raise TableTransactionError(message="Multiple operations on an entity")
+
+        for kind, entity in operations:
+            key = (entity["PartitionKey"], entity["RowKey"])
+            if kind in ("delete", "update") and key not in self.entities:
+                raise TableTransactionError(message="ResourceNotFound")
+            if kind == "create" and key in self.entities:
+                raise TableTransactionError(message="EntityAlreadyExists")
+
+        for kind, entity in operations:
+            key = (entity["PartitionKey"], entity["RowKey"])
+            if kind == "delete":
+                del self.entities[key]
+            elif kind == "update":
+                # updates of transactions merge properties by default
+                self.entities[key].update(
+                    {name: value for name, value in entity.items() if value is not None}
+                )
+                self._touch(key)
+            else:
+                self.entities[key] = {
+                    name: value for name, value in entity.items() if value is not None
+                }
+                self._touch(key)
+
+    def query_entities(
+        self, query_filter: str, select=None, results_per_page=None, **kwargs
+    ) -> "FakeItemPaged":
+        self.calls["query_entities"] += 1
+
+        if query_filter.startswith("PartitionKey eq "):
+            self.calls["partition_queries"] += 1
+        else:
+            self.calls["table_scans"] += 1
+
+        return FakeItemPaged(
+            list(
+                self._sorted(
+                    [
+                        item
+                        for item in self.entities.values()
+                        if _matches(item, query_filter)
+                    ],
+                    None,
+                )
+            ),
+            select,
+            # like the Table API, which returns at most 1000 entities per page
+            min(results_per_page or 1000, 1000),
+        )
+
+    async def list_entities(self, select=None, **kwargs):
+        self.calls["list_entities"] += 1
+
+        for entity in self._sorted(list(self.entities.values()), select):
+            yield entity
+
+
+class FakeTableServiceClient:
+    def __init__(self) -> None:
+        self.tables: Dict[str, FakeTableClient] = {}
+
+    def get_table_client(self, table_name: str) -> FakeTableClient:
+        if table_name not in self.tables:
+            self.tables[table_name] = FakeTableClient(table_name)
+        return self.tables[table_name]
+
+    async def create_table_if_not_exists(self, table_name: str) -> FakeTableClient:
+        return self.get_table_client(table_name)
@@ -0,0 +1,158 @@
+import asyncio
+import io
+import zipfile
+from typing import AsyncIterator, Dict
+
+import pytest
+from essentials.exceptions import ObjectNotFound
+
+from core.errors import TooManyRequestsError
+from data.sql.vfs import SQLFileSystemDataProvider
+from domain.archives import Archive, ArchivesHandler, ArchiveStreamsLimiter
+from domain.vfs import FileSystemNodeType
+from tests.db import create_album, create_session, new_node
+from tests.fakes import get_settings
+
+
+class FakeBlobsService:
+    def __init__(self) -> None:
+        self.blobs: Dict[str, bytes] = {}
+
+    async def read_blob(
+        self, container_name: str, file_name: str
+    ) -> AsyncIterator[bytes]:
+        data = self.blobs[f"{container_name}/{file_name}"]
+
+        for index in range(0, len(data), 1000):
+            yield data[index : index + 1000]
+
+
+async def read_archive(handler: ArchivesHandler, node_id) -> zipfile.ZipFile:
+    archive = await handler.get_archive(node_id)
+    chunks = [chunk async for chunk in archive.read()]
+
+    assert all(chunks)
+    return zipfile.ZipFile(io.BytesIO(b"".join(chunks)))
+
+
+@pytest.mark.asyncio
+async def test_get_archive_of_folder(tmp_path):
+    session = await create_session(tmp_path / "test.db")
+    album_id = await create_album(session)
+    provider = SQLFileSystemDataProvider(session)
+    blobs_service = FakeBlobsService()
+
+    root = new_node(album_id, None, "Holidays")
+    subfolder = new_node(album_id, root.id, "Beach")
+    files = [
+        new_node(album_id, root.id, "a.jpg", FileSystemNodeType.FILE),
+        new_node(album_id, root.id, "a.jpg", FileSystemNodeType.FILE),
+        new_node(album_id, subfolder.id, "../b.jpg", FileSystemNodeType.FILE),
+    ]
+    await provider.create_nodes([root, subfolder] + files)
+
+    for index, node in enumerate(files):
+        data = bytes([index]) * (2500 + index)
+        node.file_size = len(data)
+        blobs_service.blobs[f"{album_id}/{node.file_id}{node.file_extension}"] = data
+
+    await provider.update_nodes(files)
+
+    limiter = ArchiveStreamsLimiter(get_settings())
+    handler = ArchivesHandler(provider, blobs_service, limiter)  # type: ignore
+
+    archive = await handler.get_archive(root.id)
+    assert archive.name == "Holidays.zip"
+    assert limiter.active == 1
+
+    stream = archive.read()
+    chunks = [await stream.__anext__()]
+    assert limiter.active == 1
+
+    chunks.extend([chunk async for chunk in stream])
+    zip_file = zipfile.ZipFile(io.BytesIO(b"".join(chunks)))
+    assert limiter.active == 0
+    assert zip_file.testzip() is None
+    assert sorted(zip_file.namelist()) == [
+        "Holidays/Beach/.._b.jpg",
+        "Holidays/a (2).jpg",
+        "Holidays/a.jpg",
+    ]
+    assert zip_file.read("Holidays/Beach/.._b.jpg") == bytes([2]) * 2502
+    assert all(info.compress_type == zipfile.ZIP_STORED for info in zip_file.infolist())
+
+    single_file = await read_archive(handler, files[0].id)
+    assert single_file.namelist() == ["a.jpg"]
+
+    with pytest.raises(ObjectNotFound):
+        await handler.get_archive(album_id)
+
+
+@pytest.mark.asyncio
+async def test_get_archive_limits_concurrent_streams(tmp_path):
+    session = await create_session(tmp_path / "test.db")
+    album_id = await create_album(session)
+    provider = SQLFileSystemDataProvider(session)
+    root = new_node(album_id, None, "Empty")
+    await provider.create_nodes([root])
+
+    limiter = ArchiveStreamsLimiter(get_settings(max_archive_streams=2))
+    handler = ArchivesHandler(provider, FakeBlobsService(), limiter)  # type: ignore
+
+    # requests arriving together, each with its own scoped services, reserve their
+    # streams when they are handled
+    handlers = [
+        ArchivesHandler(
+            SQLFileSystemDataProvider(await create_session(tmp_path / "test.db")),
+            FakeBlobsService(),  # type: ignore
+            limiter,
+        )
+        for _ in range(3)
+    ]
+    results = await asyncio.gather(
+        *(item.get_archive(root.id) for item in handlers), return_exceptions=True
+    )
+
+    archives = [result for result in results if isinstance(result, Archive)]
+
+    assert len(archives) == 2
+    assert sum(isinstance(result, TooManyRequestsError) for result in results) == 1
+    assert limiter.active == 2
+
+    async for _ in archives[0].read():
+        pass
+
+    assert limiter.active == 1
+    await handler.get_archive(root.id)
+    assert limiter.active == 2
+
+
+@pytest.mark.asyncio
+async def test_archives_not_read_do_not_hold_streams(tmp_path):
+    session = await create_session(tmp_path / "test.db")
+    album_id = await create_album(session)
+    provider = SQLFileSystemDataProvider(session)
+    root = new_node(album_id, None, "Empty")
+    await provider.create_nodes([root])
+
+    limiter = ArchiveStreamsLimiter(get_settings(max_archive_streams=1))
+    limiter.reservation_timeout = 0.5
+    handler = ArchivesHandler(provider, FakeBlobsService(), limiter)  # type: ignore
+
+    # for example, when clients disconnect before the body of responses is sent
+    archive = await handler.get_archive(root.id)
+
+    with pytest.raises(TooManyRequestsError):
+        await handler.get_archive(root.id)
+
+    await asyncio.sleep(0.6)
+    assert limiter.active == 0
+
+    # archives read after the timeout are counted again while they are streamed
+    stream = archive.read()
+    await stream.__anext__()
+    assert limiter.active == 1
+
+    async for _ in stream:
+        pass
+    assert limiter.active == 0
@@ -0,0 +1,350 @@
+from dataclasses import asdict, replace
+from datetime import datetime, timezone
+from uuid import uuid4
+
+import pytest
+
+from data.azstorage.vfs import (
+    TableAPIFileSystemDataProvider,
+    backfill_nodes_index,
+    entity_to_node,
+    get_partitioned_batches,
+    node_to_entity,
+)
+from domain.vfs import FileImageData, FileSystemNodeType
+from tests.db import new_node
+from tests.tables import FakeTableServiceClient
+
+
+def test_get_partitioned_batches():
+    album_id = uuid4()
+    first_parent = new_node(album_id, None, "First")
+    second_parent = new_node(album_id, None, "Second")
+
+    operations = [
+        ("create", node_to_entity(new_node(album_id, first_parent.id, f"A{i}")))
+        for i in range(250)
+    ] + [
+        ("create", node_to_entity(new_node(album_id, second_parent.id, f"B{i}")))
+        for i in range(10)
+    ]
+
+    batches = get_partitioned_batches(operations)
+
+    assert [len(batch) for batch in batches] == [100, 100, 50, 10]
+
+    for batch in batches:
+        assert len({entity["PartitionKey"] for _, entity in batch}) == 1
+
+    assert sum(batches, []) == operations
+
+
+@pytest.mark.asyncio
+async def test_get_node_uses_index():
+    service_client = FakeTableServiceClient()
+    provider = TableAPIFileSystemDataProvider(service_client)
+    album_id = uuid4()
+
+    folder = new_node(album_id, None, "Folder")
+    files = [
+        new_node(album_id, folder.id, f"{i}.jpg", FileSystemNodeType.FILE)
+        for i in range(150)
+    ]
+    await provider.create_nodes([folder] + files)
+
+    node = await provider.get_node(files[120].id, False)
+
+    assert node is not None
+    assert node.id == files[120].id
+    assert node.parent_id == folder.id
+    assert provider.table_client.calls["table_scans"] == 0
+
+    assert await provider.get_node(uuid4(), False) is None
+    assert [item.id for item in await provider.get_node_full_path(node.id)] == [
+        folder.id,
+        node.id,
+    ]
+    assert [item.id for item in await provider.get_node_path(node.id)] == [
+        folder.id,
+        node.id,
+    ]
+    assert provider.table_client.calls["table_scans"] == 0
+
+
+@pytest.mark.asyncio
+async def test_backfill_nodes_index():
+    service_client = FakeTableServiceClient()
+    provider = TableAPIFileSystemDataProvider(service_client)
+    album_id = uuid4()
+
+    nodes = [new_node(album_id, None, f"Folder {i}") for i in range(20)]
+    await provider.create_nodes(nodes)
+
+    # simulate nodes created before the index was introduced
+    provider.index_client.entities.clear()
+
+    # nodes that are not indexed are not found, without scanning the table
+    assert await provider.get_node(nodes[5].id, False) is None
+    assert provider.table_client.calls["table_scans"] == 0
+
+    assert await backfill_nodes_index(service_client) == 20
+
+    node = await provider.get_node(nodes[5].id, False)
+    assert node is not None
+    assert provider.table_client.calls["table_scans"] == 0
+
+
+@pytest.mark.asyncio
+async def test_delete_nodes_deletes_descendants_and_index():
+    service_client = FakeTableServiceClient()
+    provider = TableAPIFileSystemDataProvider(service_client)
+    album_id = uuid4()
+
+    a = new_node(album_id, None, "A")
+    b = new_node(album_id, a.id, "B")
+    c = new_node(album_id, b.id, "C", FileSystemNodeType.FILE)
+    d = new_node(album_id, None, "D")
+    await provider.create_nodes([a, b, c, d])
+
+    # simulate a node created before the index was introduced
+    await provider.index_client.delete_entity(
+        partition_key=str(b.id)[:2], row_key=str(b.id)
+    )
+
+    await provider.delete_nodes([a.id])
+
+    assert [entity["RowKey"] for entity in provider.table_client.entities.values()] == [
+        str(d.id)
+    ]
+    assert [entity["RowKey"] for entity in provider.index_client.entities.values()] == [
+        str(d.id)
+    ]
+
+
+@pytest.mark.asyncio
+async def test_delete_folder_with_its_descendants():
+    provider = TableAPIFileSystemDataProvider(FakeTableServiceClient())
+    album_id = uuid4()
+
+    a = new_node(album_id, None, "A")
+    b = new_node(album_id, a.id, "B")
+    c = new_node(album_id, b.id, "C", FileSystemNodeType.FILE)
+    await provider.create_nodes([a, b, c])
+
+    # descendants of other deleted nodes, and repeated ids, are deleted once
+    await provider.delete_nodes([a.id, c.id, b.id, a.id])
+
+    assert provider.table_client.entities == {}
+    assert provider.index_client.entities == {}
+
+
+@pytest.mark.asyncio
+async def test_update_nodes_moves_across_partitions():
+    service_client = FakeTableServiceClient()
+    provider = TableAPIFileSystemDataProvider(service_client)
+    album_id = uuid4()
+
+    source = new_node(album_id, None, "Source")
+    target = new_node(album_id, None, "Target")
+    files = [
+        new_node(album_id, source.id, f"{i}.jpg", FileSystemNodeType.FILE)
+        for i in range(250)
+    ]
+    await provider.create_nodes([source, target] + files)
+
+    for node in files:
+        node.parent_id = target.id
+
+    # a node moved to the root of the album, and one renamed in place
+    root_node = await provider.get_node(target.id, False)
+    assert root_node is not None
+    root_node.parent_id = None
+    root_node.name = "Renamed"
+
+    await provider.update_nodes(files + [root_node])
+
+    assert await provider.get_node_children(source.id) == []
+    assert len(await provider.get_node_children(target.id)) == 250
+
+    moved = await provider.get_node(files[200].id, False)
+    assert moved is not None
+    assert moved.parent_id == target.id
+
+    renamed = await provider.get_node(target.id, False)
+    assert renamed is not None
+    assert renamed.name == "Renamed"
+    assert provider.table_client.calls["table_scans"] == 0
+
+
+@pytest.mark.asyncio
+async def test_update_node_image():
+    service_client = FakeTableServiceClient()
+    provider = TableAPIFileSystemDataProvider(service_client)
+    album_id = uuid4()
+
+    node = new_node(album_id, None, "1.jpg", FileSystemNodeType.FILE)
+    node.processing = True
+    await provider.create_nodes([node])
+
+    stored = await provider.get_node(node.id, False)
+    assert stored is not None
+    assert stored.processing is True
+    assert stored.image is None
+
+    modification_time = datetime.utcnow()
+    await provider.update_node_image(
+        node.id,
+        FileImageData(
+            medium_image_name="m.jpg",
+            small_image_name="s.jpg",
+            image_width=400,
+            image_height=300,
+        ),
+        modification_time,
+    )
+
+    updated = await provider.get_node(node.id, False)
+    assert updated is not None
+    assert updated.name == "1.jpg"
+    assert updated.processing is False
+    assert updated.image is not None
+    assert updated.image.medium_image_name == "m.jpg"
+    assert updated.etag == modification_time.isoformat()
+
+    # nodes deleted while their pictures are processed are ignored
+    await provider.update_node_image(uuid4(), None, modification_time)
+
+
+@pytest.mark.asyncio
+async def test_update_nodes_images_in_batches():
+    service_client = FakeTableServiceClient()
+    provider = TableAPIFileSystemDataProvider(service_client)
+    album_id = uuid4()
+    nodes = [
+        new_node(album_id, None, f"{i}.jpg", FileSystemNodeType.FILE) for i in range(20)
+    ]
+
+    for node in nodes:
+        node.processing = True
+
+    await provider.create_nodes(nodes)
+    await provider.delete_nodes([nodes[0].id])
+
+    modification_time = datetime.utcnow()
+    transactions = service_client.get_table_client("nodes").calls["submit_transaction"]
+    images = {
+        node.id: FileImageData(
+            medium_image_name=f"m-{node.name}",
+            small_image_name=f"s-{node.name}",
+            image_width=400,
+            image_height=300,
+        )
+        for node in nodes[1:]
+    }
+    await provider.update_nodes_images(images, modification_time)
+
+    assert (
+        service_client.get_table_client("nodes").calls["submit_transaction"]
+        == transactions + 1
+    )
+
+    for node in nodes[1:]:
+        updated = await provider.get_node(node.id, False)
+        assert updated is not None
+        assert updated.name == node.name
+        assert updated.processing is False
+        assert updated.image == images[node.id]
+        assert updated.etag == modification_time.isoformat()
+
+    # nodes deleted while their pictures are processed are ignored
+    images[nodes[0].id] = None
+    await provider.update_nodes_images(images, modification_time)
+
+    assert await provider.get_node(nodes[0].id, False) is None
+
+
+@pytest.mark.asyncio
+async def test_get_nodes_queries_by_partition():
+    service_client = FakeTableServiceClient()
+    provider = TableAPIFileSystemDataProvider(service_client)
+    album_id = uuid4()
+
+    first_folder = new_node(album_id, None, "First")
+    second_folder = new_node(album_id, None, "Second")
+    first_files = [
+        new_node(album_id, first_folder.id, f"{i}.mp3", FileSystemNodeType.FILE)
+        for i in range(50)
+    ]
+    second_files = [
+        new_node(album_id, second_folder.id, f"{i}.mp3", FileSystemNodeType.FILE)
+        for i in range(5)
+    ]
+    await provider.create_nodes([first_folder, second_folder])
+    await provider.create_nodes(first_files + second_files)
+
+    requested = first_files[:30] + second_files[:3]
+    nodes = await provider.get_nodes(
+        [node.id for node in requested]
+        + [uuid4() for _ in range(20)]
+        + [requested[0].id]
+    )
+
+    assert sorted(node.id for node in nodes) == sorted(node.id for node in requested)
+    # one query for the first folder, which is read at once, one for the second
+    assert provider.table_client.calls["partition_queries"] == 2
+    # ids of nodes that are not indexed don't cause scans of the table
+    assert provider.table_client.calls["table_scans"] == 0
+    assert provider.index_client.calls["table_scans"] == 0
+    assert await provider.get_nodes([]) == []
+
+
+@pytest.mark.asyncio
+async def test_iter_album_nodes():
+    provider = TableAPIFileSystemDataProvider(FakeTableServiceClient())
+    album_id = uuid4()
+    folder = new_node(album_id, None, "Folder")
+    files = [
+        new_node(album_id, folder.id, f"{i}.mp3", FileSystemNodeType.FILE)
+        for i in range(3)
+    ]
+    await provider.create_nodes([folder, new_node(uuid4(), None, "Other")])
+    await provider.create_nodes(files)
+
+    nodes = [node async for node in provider.iter_album_nodes(album_id)]
+
+    assert sorted(node.id for node in nodes) == sorted(
+        node.id for node in [folder, *files]
+    )
+
+
+def test_entity_to_node():
+    node = new_node(uuid4(), uuid4(), "a.jpg", FileSystemNodeType.FILE)
+    node.hidden = True
+    node.image = FileImageData("a_medium.jpg", "a_small.jpg", 800, 600)
+    entity = {
+        key: value for key, value in node_to_entity(node).items() if value is not None
+    }
+
+    assert entity_to_node(entity) == node
+
+    # values written by previous versions, and selected properties that are not set
+    entity.update(
+        Hidden="False", CreationTime="2021-03-01T10:00:00Z", FileSize=None, Icon=None
+    )
+    legacy_node = entity_to_node(entity)
+
+    assert legacy_node.hidden is False
+    assert legacy_node.creation_time == datetime(2021, 3, 1, 10, tzinfo=timezone.utc)
+    assert legacy_node.file_size is None
+    assert legacy_node.icon is None
+
+
+def test_nodes_use_slots():
+    node = new_node(uuid4(), None, "Folder")
+
+    assert not hasattr(node, "__dict__")
+    assert asdict(node)["name"] == "Folder"
+    assert replace(node, name="Other").name == "Other"
+
+    with pytest.raises(AttributeError):
+        node.other = True  # type: ignore
@@ -0,0 +1,250 @@
+from datetime import datetime
+
+import pytest
+from rodi import Container
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.caching import ReadCache
+from data.queues.sqlite import SQLitePicturesQueue
+from data.sql.albums import SQLAlbumsDataProvider
+from data.sql.contents import SQLContentsDataProvider
+from data.sql.vfs import SQLFileSystemDataProvider
+from domain.albums import AlbumsDataProvider
+from domain.caching import (
+    CachedAlbumsDataProvider,
+    CachedFileSystemDataProvider,
+    register_data_providers,
+)
+from domain.vfs import (
+    CopyOperationInput,
+    CreateNodeInput,
+    FileImageData,
+    FileSystemDataProvider,
+    FileSystemHandler,
+    FileSystemNodeType,
+    UpdateNodeInput,
+)
+from tests.db import create_album, create_session, new_node
+from tests.fakes import (
+    FakeBlobsService,
+    FakePicturesHandler,
+    get_changes_log,
+    get_settings,
+)
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.time = 0.0
+
+    def __call__(self) -> float:
+        return self.time
+
+
+async def read_value(value):
+    return value
+
+
+@pytest.mark.asyncio
+async def test_read_cache_expires_values():
+    clock = FakeClock()
+    cache = ReadCache(max_cost=10, ttl=30, clock=clock)
+
+    assert await cache.get_or_read("a", lambda: read_value([1]), len) == [1]
+    assert await cache.get_or_read("a", lambda: read_value([2]), len) == [1]
+
+    clock.time = 30
+
+    assert await cache.get_or_read("a", lambda: read_value([3]), len) == [3]
+    assert cache.metrics.hits == 1
+    assert cache.metrics.misses == 2
+
+    # None is never cached
+    await cache.get_or_read("b", lambda: read_value(None), len)
+    assert "b" not in cache
+
+
+@pytest.mark.asyncio
+async def test_read_cache_evicts_least_recently_used_values():
+    cache = ReadCache(max_cost=5)
+
+    await cache.get_or_read("a", lambda: read_value([1, 2]), len)
+    await cache.get_or_read("b", lambda: read_value([1, 2]), len)
+    await cache.get_or_read("a", lambda: read_value([]), len)
+    await cache.get_or_read("c", lambda: read_value([1, 2]), len)
+
+    assert "a" in cache
+    assert "b" not in cache
+    assert "c" in cache
+    assert cache.cost == 4
+    assert cache.metrics.evictions == 1
+
+    # values costing more than the maximum are not cached
+    await cache.get_or_read("d", lambda: read_value([1] * 6), len)
+    assert "d" not in cache
+    assert cache.cost == 4
+
+
+@pytest.mark.asyncio
+async def test_read_cache_ignores_values_read_during_invalidations():
+    cache = ReadCache()
+
+    async def read_while_changed():
+        # a change is applied while the value is read
+        cache.invalidate("a")
+        return [1]
+
+    await cache.get_or_read("a", read_while_changed, len)
+
+    assert "a" not in cache
+
+    await cache.get_or_read("a", lambda: read_value([1]), len)
+    cache.invalidate("a")
+
+    assert "a" not in cache
+    assert cache.metrics.invalidations == 1
+
+
+async def get_handler(tmp_path):
+    session = await create_session(tmp_path / "test.db")
+    album_id = await create_album(session)
+    cache = ReadCache()
+    provider = CachedFileSystemDataProvider(SQLFileSystemDataProvider(session), cache)
+    handler = FileSystemHandler(
+        provider,
+        SQLContentsDataProvider(session),
+        FakeBlobsService(),  # type: ignore
+        FakePicturesHandler(),  # type: ignore
+        SQLitePicturesQueue(str(tmp_path / "queue.db")),
+        get_settings(),
+        get_changes_log(session),
+    )
+    return handler, provider, cache, album_id
+
+
+def get_names(nodes):
+    return sorted(node.name for node in nodes)
+
+
+@pytest.mark.asyncio
+async def test_changes_invalidate_affected_listings(tmp_path):
+    handler, provider, cache, album_id = await get_handler(tmp_path)
+    first = new_node(album_id, None, "First")
+    second = new_node(album_id, None, "Second")
+    await provider.create_nodes([first, second])
+
+    assert get_names(await provider.get_album_nodes(album_id)) == ["First", "Second"]
+    assert get_names(await handler.get_node_children(first.id)) == []
+    assert get_names(await handler.get_node_children(second.id)) == []
+
+    [child] = await handler.create_nodes(
+        [CreateNodeInput(name="Child", album_id=album_id, parent_id=first.id)]
+    )
+
+    assert get_names(await handler.get_node_children(first.id)) == ["Child"]
+    # listings not affected by the change are still cached
+    assert ("children", second.id) in cache
+    assert ("album_nodes", album_id) in cache
+
+    await handler.move_nodes(
+        CopyOperationInput(
+            album_id=album_id,
+            source_parent_id=first.id,
+            target_parent_id=second.id,
+            nodes=[UpdateNodeInput(id=child.id, name=child.name, etag=child.etag)],
+        )
+    )
+
+    assert get_names(await handler.get_node_children(first.id)) == []
+    assert get_names(await handler.get_node_children(second.id)) == ["Child"]
+
+    await handler.paste_nodes(
+        CopyOperationInput(
+            album_id=album_id,
+            source_parent_id=None,
+            target_parent_id=second.id,
+            nodes=[UpdateNodeInput(id=first.id, name=first.name, etag=first.etag)],
+        )
+    )
+
+    assert get_names(await handler.get_node_children(second.id)) == ["Child", "First"]
+    assert ("album_nodes", album_id) in cache
+
+    await handler.update_node(child.id, UpdateNodeInput(id=child.id, name="Renamed"))
+
+    assert get_names(await handler.get_node_children(second.id)) == [
+        "First",
+        "Renamed",
+    ]
+
+    await handler.delete_nodes([first.id])
+
+    assert get_names(await provider.get_album_nodes(album_id)) == ["Second"]
+
+
+@pytest.mark.asyncio
+async def test_update_node_image_invalidates_listing(tmp_path):
+    handler, provider, cache, album_id = await get_handler(tmp_path)
+    folder = new_node(album_id, None, "Folder")
+    await provider.create_nodes([folder])
+    [picture] = await handler.reserve_nodes(
+        [
+            CreateNodeInput(
+                name="a.jpg",
+                album_id=album_id,
+                parent_id=folder.id,
+                file_id="a",
+                file_mime="image/jpeg",
+                file_size=100,
+                node_type=FileSystemNodeType.FILE,
+            )
+        ]
+    )
+
+    [item] = await provider.get_node_children(folder.id)
+    assert item.processing is True
+
+    image = FileImageData("m-a.jpg", "s-a.jpg", 400, 300)
+    await provider.update_node_image(picture.id, image, datetime.utcnow())
+
+    [item] = await provider.get_node_children(folder.id)
+    assert item.processing is False
+    assert item.image == image
+
+
+@pytest.mark.asyncio
+async def test_cached_items_are_copies(tmp_path):
+    session = await create_session(tmp_path / "test.db")
+    album_id = await create_album(session)
+    provider = CachedAlbumsDataProvider(SQLAlbumsDataProvider(session), ReadCache())
+
+    album = await provider.get_album(album_id)
+    assert album is not None
+    album.name = "Changed"
+
+    assert (await provider.get_album(album_id)).name == "Test"  # type: ignore
+
+    await provider.update_album(album)
+
+    assert (await provider.get_album(album_id)).name == "Changed"  # type: ignore
+    assert [item.name for item in await provider.get_albums()] == ["Changed"]
+
+
+def test_register_data_providers():
+    container = Container()
+    register_data_providers(
+        container,
+        get_settings(read_cache_size=100),
+        SQLAlbumsDataProvider,
+        SQLFileSystemDataProvider,
+    )
+    container.add_instance(object(), declared_class=AsyncSession)
+    services = container.build_provider()
+
+    first = services.get(FileSystemDataProvider)
+    second = services.get(FileSystemDataProvider)
+
+    assert isinstance(first, CachedFileSystemDataProvider)
+    assert isinstance(services.get(AlbumsDataProvider), CachedAlbumsDataProvider)
+    # the cache is shared by all scopes
+    assert first.cache is second.cache
@@ -0,0 +1,351 @@
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+import pytest
+from essentials.exceptions import InvalidArgument
+
+from core.tokens import decode_continuation_token, encode_continuation_token
+from data.azstorage.changes import TableAPIChangesDataProvider
+from data.queues.sqlite import SQLitePicturesQueue
+from data.sql.albums import SQLAlbumsDataProvider
+from data.sql.changes import SQLChangesDataProvider
+from data.sql.contents import SQLContentsDataProvider
+from data.sql.vfs import SQLFileSystemDataProvider
+from domain.albums import AlbumsHandler
+from domain.changes import (
+    CHANGES_COMPACTION_INTERVAL,
+    ChangesLog,
+    NodeChange,
+    NodeChangeType,
+)
+from domain.trees import AlbumTreesCache
+from domain.vfs import (
+    CopyOperationInput,
+    CreateNodeInput,
+    FileSystemHandler,
+    FileSystemNodeType,
+    UpdateNodeInput,
+)
+from tests.db import create_album, create_session
+from tests.fakes import (
+    FakeBlobsService,
+    FakePicturesHandler,
+    get_changes_log,
+    get_settings,
+)
+from tests.tables import FakeTableServiceClient
+
+
+def new_change(change_type=NodeChangeType.CREATED, time=None):
+    return NodeChange(uuid4(), None, change_type, time or datetime.utcnow())
+
+
+async def check_changes_provider(provider, album_id):
+    old_changes = [new_change(time=datetime(2020, 1, 1)) for _ in range(3)]
+    changes = [new_change() for _ in range(4)]
+    other_album_id = uuid4()
+
+    now = datetime.utcnow()
+
+    assert await provider.get_last_sequence(album_id, now) == 0
+
+    first_sequence = await provider.append_changes(album_id, old_changes)
+    last_sequence = await provider.append_changes(album_id, changes)
+
+    assert last_sequence == first_sequence + 4
+    assert (
+        await provider.get_last_sequence(album_id, now - timedelta(minutes=1))
+        == first_sequence
+    )
+    assert (
+        await provider.get_last_sequence(album_id, now + timedelta(minutes=1))
+        == last_sequence
+    )
+    assert await provider.get_last_sequence(album_id, datetime.max) == last_sequence
+
+    stored = await provider.get_changes(album_id, 0, 100)
+
+    assert [item.node_id for item in stored] == [
+        change.node_id for change in old_changes + changes
+    ]
+    assert [item.sequence for item in stored] == sorted(
+        {item.sequence for item in stored}
+    )
+    assert stored[-1].sequence == last_sequence
+    assert stored[0].change_type == NodeChangeType.CREATED
+    assert stored[0].time == datetime(2020, 1, 1)
+
+    following = await provider.get_changes(album_id, stored[2].sequence, 2)
+
+    assert following == stored[3:5]
+
+    await provider.delete_changes(album_id, datetime(2021, 1, 1))
+
+    assert await provider.get_changes(album_id, 0, 100) == stored[3:]
+    assert await provider.get_changes(other_album_id, 0, 100) == []
+    assert (
+        await provider.get_last_sequence(album_id, now + timedelta(minutes=1))
+        == last_sequence
+    )
+
+
+@pytest.mark.asyncio
+async def test_sql_changes_provider(tmp_path):
+    session = await create_session(tmp_path / "test.db")
+    album_id = await create_album(session)
+
+    await check_changes_provider(SQLChangesDataProvider(session), album_id)
+
+
+@pytest.mark.asyncio
+async def test_table_changes_provider():
+    await check_changes_provider(
+        TableAPIChangesDataProvider(FakeTableServiceClient()), uuid4()
+    )
+
+
+@pytest.mark.asyncio
+async def test_table_changes_sequences_are_contiguous():
+    provider = TableAPIChangesDataProvider(FakeTableServiceClient())
+    album_id = uuid4()
+    changes = [new_change() for _ in range(150)]
+
+    assert await provider.append_changes(album_id, changes) == 150
+    assert [change.sequence for change in changes] == list(range(1, 151))
+    # changes are stored in transactions of at most 100 operations
+    assert provider.table_client.calls["submit_transaction"] == 2
+
+
+@pytest.mark.asyncio
+async def test_table_changes_are_read_across_pages():
+    provider = TableAPIChangesDataProvider(FakeTableServiceClient())
+    album_id = uuid4()
+    await provider.append_changes(album_id, [new_change() for _ in range(1200)])
+
+    changes = await provider.get_changes(album_id, 0, 1001)
+
+    assert [change.sequence for change in changes] == list(range(1, 1002))
+
+
+@pytest.mark.asyncio
+async def test_changes_are_compacted_automatically():
+    provider = TableAPIChangesDataProvider(FakeTableServiceClient())
+    changes_log = ChangesLog(provider, get_settings(changes_retention_hours=1))
+    album_id = uuid4()
+    old_time = datetime.utcnow() - timedelta(hours=2)
+
+    await changes_log.append(
+        album_id,
+        [new_change(time=old_time) for _ in range(CHANGES_COMPACTION_INTERVAL - 1)],
+    )
+
+    assert len(await provider.get_changes(album_id, 0, 1000)) == 499
+
+    await changes_log.append(album_id, [new_change()])
+
+    assert [
+        change.sequence for change in await provider.get_changes(album_id, 0, 1000)
+    ] == [CHANGES_COMPACTION_INTERVAL]
+
+
+@pytest.mark.asyncio
+async def test_changes_tokens():
+    changes_log = get_changes_log(None)
+    changes_log.data_provider = TableAPIChangesDataProvider(FakeTableServiceClient())
+    album_id = uuid4()
+
+    page = await changes_log.get_changes(album_id, None)
+
+    assert page.items == [] and not page.reset
+
+    with pytest.raises(InvalidArgument):
+        await changes_log.get_changes(uuid4(), page.token)
+
+    with pytest.raises(InvalidArgument):
+        await changes_log.get_changes(album_id, encode_continuation_token({"a": 1}))
+
+    # changes might have been deleted after tokens older than the retention time
+    position = decode_continuation_token(page.token)
+    position["t"] = (datetime.utcnow() - timedelta(days=30)).isoformat()
+
+    page = await changes_log.get_changes(album_id, encode_continuation_token(position))
+
+    assert page.reset
+    assert not (await changes_log.get_changes(album_id, page.token)).reset
+
+
+@pytest.mark.asyncio
+async def test_recent_changes_are_returned_when_settled():
+    changes_log = get_changes_log(None, settle_time=60)
+    changes_log.data_provider = TableAPIChangesDataProvider(FakeTableServiceClient())
+    album_id = uuid4()
+    token = (await changes_log.get_changes(album_id, None)).token
+    settled_time = datetime.utcnow() - timedelta(minutes=2)
+
+    await changes_log.append(
+        album_id,
+        [new_change(time=settled_time), new_change(), new_change(time=settled_time)],
+    )
+
+    page = await changes_log.get_changes(album_id, token)
+
+    # changes are returned in order, up to the first one that is not settled
+    assert [item.sequence for item in page.items] == [1]
+    assert not page.has_more
+
+    changes_log.settle_time = timedelta(0)
+    page = await changes_log.get_changes(album_id, page.token, limit=1)
+
+    assert [item.sequence for item in page.items] == [2]
+    assert page.has_more
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("count", [1, 3])
+async def test_first_token_follows_settled_changes(count):
+    changes_log = get_changes_log(None, settle_time=60)
+    changes_log.data_provider = TableAPIChangesDataProvider(FakeTableServiceClient())
+    album_id = uuid4()
+    settled_time = datetime.utcnow() - timedelta(minutes=2)
+
+    await changes_log.append(
+        album_id, [new_change(time=settled_time) for _ in range(count)]
+    )
+    # stored after the following change, which is not settled
+    await changes_log.append(album_id, [new_change(), new_change(time=settled_time)])
+
+    token = (await changes_log.get_changes(album_id, None)).token
+
+    assert decode_continuation_token(token)["s"] == count
+
+    changes_log.settle_time = timedelta(0)
+    page = await changes_log.get_changes(album_id, token)
+
+    assert [item.sequence for item in page.items] == [count + 1, count + 2]
+
+
+@pytest.mark.asyncio
+async def test_album_changes(tmp_path):
+    session = await create_session(tmp_path / "test.db")
+    album_id = await create_album(session)
+    fs_data_provider = SQLFileSystemDataProvider(session)
+    changes_log = get_changes_log(session)
+    fs_handler = FileSystemHandler(
+        fs_data_provider,
+        SQLContentsDataProvider(session),
+        FakeBlobsService(),  # type: ignore
+        FakePicturesHandler(),  # type: ignore
+        SQLitePicturesQueue(str(tmp_path / "queue.db")),
+        get_settings(),
+        changes_log,
+    )
+    handler = AlbumsHandler(
+        SQLAlbumsDataProvider(session),
+        FakeBlobsService(),  # type: ignore
+        fs_data_provider,
+        get_settings(),
+        None,  # type: ignore
+        AlbumTreesCache(),
+        changes_log,
+    )
+
+    token = (await handler.get_album_changes(album_id)).token
+
+    folder, other_folder, picture, other_picture = await fs_handler.create_nodes(
+        [
+            CreateNodeInput(
+                name=name,
+                album_id=album_id,
+                parent_id=None,
+                file_id=None,
+                file_size=None,
+                file_mime=None,
+                node_type=FileSystemNodeType.FOLDER,
+            )
+            for name in ["A", "B"]
+        ]
+        + [
+            CreateNodeInput(
+                name=name,
+                album_id=album_id,
+                parent_id=None,
+                file_id=str(uuid4()),
+                file_size=100,
+                file_mime="text/plain",
+                node_type=FileSystemNodeType.FILE,
+            )
+            for name in ["1.txt", "2.txt"]
+        ]
+    )
+
+    page = await handler.get_album_changes(album_id, token)
+
+    assert [item.node_id for item in page.items] == [
+        folder.id,
+        other_folder.id,
+        picture.id,
+        other_picture.id,
+    ]
+    assert {item.change_type for item in page.items} == {NodeChangeType.CREATED}
+    assert page.items[0].node.name == "A"  # type: ignore
+
+    token = page.token
+    picture = await fs_handler.update_node(
+        picture.id,
+        UpdateNodeInput(id=picture.id, name="3.txt", etag=None, parent_id=None),
+    )
+    await fs_handler.move_nodes(
+        CopyOperationInput(
+            album_id=album_id,
+            source_parent_id=None,
+            target_parent_id=folder.id,
+            nodes=[UpdateNodeInput(id=picture.id, name="3.txt", etag=picture.etag)],
+        )
+    )
+    await fs_handler.update_node(
+        other_picture.id,
+        UpdateNodeInput(
+            id=other_picture.id, name="2.txt", etag=None, parent_id=other_folder.id
+        ),
+    )
+    await fs_handler.delete_nodes([other_folder.id])
+
+    page = await handler.get_album_changes(album_id, token)
+
+    # only the last change of each node is returned, with its current state;
+    # descendants of deleted folders have their own changes
+    assert [(item.node_id, item.change_type) for item in page.items] == [
+        (picture.id, NodeChangeType.MOVED),
+        (other_folder.id, NodeChangeType.DELETED),
+        (other_picture.id, NodeChangeType.DELETED),
+    ]
+    assert page.items[0].parent_id == folder.id
+    assert page.items[0].node.name == "3.txt"  # type: ignore
+    assert page.items[2].node is None
+    assert page.items[2].parent_id == other_folder.id
+
+    page = await handler.get_album_changes(album_id, page.token)
+
+    assert page.items == []
+
+    [target] = await fs_handler.create_nodes(
+        [CreateNodeInput(name="C", album_id=album_id, parent_id=None)]
+    )
+    token = (await handler.get_album_changes(album_id, page.token)).token
+    [copy] = await fs_handler.paste_nodes(
+        CopyOperationInput(
+            album_id=album_id,
+            source_parent_id=None,
+            target_parent_id=target.id,
+            nodes=[UpdateNodeInput(id=folder.id, name="A", etag=folder.etag)],
+        )
+    )
+    page = await handler.get_album_changes(album_id, token)
+
+    # pasted folders are created with their descendants, parents first
+    assert [(item.parent_id, item.change_type) for item in page.items] == [
+        (target.id, NodeChangeType.CREATED),
+        (copy.id, NodeChangeType.CREATED),
+    ]
+    assert page.items[0].node_id == copy.id
+    assert page.items[1].node.name == "3.txt"  # type: ignore
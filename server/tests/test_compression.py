@@ -0,0 +1,183 @@
+import gzip
+import json
+
+import pytest
+from blacksheep import Request, Response
+from blacksheep.contents import Content
+from blacksheep.server.responses import json as json_response
+
+from app.compression import (
+    CompressionMiddleware,
+    PrecompressedFilesMiddleware,
+    parse_accept_encoding,
+    select_encoding,
+)
+
+
+def get_request(accept_encoding=None, tail=None) -> Request:
+    request = Request(
+        "GET",
+        b"/",
+        [(b"Accept-Encoding", accept_encoding.encode())] if accept_encoding else [],
+    )
+    if tail is not None:
+        request.route_values = {"tail": tail}
+    return request
+
+
+def test_parse_accept_encoding():
+    assert parse_accept_encoding("gzip, deflate, br;q=0.5, *;q=0") == {
+        "gzip": 1.0,
+        "deflate": 1.0,
+        "br": 0.5,
+        "*": 0.0,
+    }
+
+
+@pytest.mark.parametrize(
+    "accept_encoding,expected_encoding",
+    [
+        (None, None),
+        ("gzip", "gzip"),
+        ("deflate", None),
+        ("gzip;q=0", None),
+        ("*", "br"),
+        ("br;q=0.5, gzip", "gzip"),
+        ("gzip, br", "br"),
+    ],
+)
+def test_select_encoding(accept_encoding, expected_encoding):
+    selected = select_encoding(get_request(accept_encoding), ["br", "gzip"])
+
+    assert (selected[0] if selected else None) == expected_encoding
+
+
+async def call(middleware, request: Request, response: Response) -> Response:
+    async def handler(request):
+        return response
+
+    return await middleware(request, handler)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("executor_min_size", [0, 1024 * 1024])
+async def test_compression_middleware(executor_min_size):
+    middleware = CompressionMiddleware(executor_min_size=executor_min_size)
+    middleware._encodings.pop("br", None)
+    data = [{"name": f"{i}.jpg", "type": "image/jpeg"} for i in range(100)]
+    response = json_response(data)
+    response.add_header(b"ETag", b'"a"')
+
+    response = await call(middleware, get_request("gzip, br"), response)
+
+    assert response.get_first_header(b"Content-Encoding") == b"gzip"
+    assert response.get_first_header(b"Vary") == b"Accept-Encoding"
+    assert response.get_first_header(b"ETag") == b'W/"a"'
+    assert json.loads(gzip.decompress(response.content.body)) == data
+
+
+@pytest.mark.asyncio
+async def test_compression_middleware_ignored_responses():
+    middleware = CompressionMiddleware(min_size=100)
+    body = b"a" * 1000
+
+    for accept_encoding, response, vary in [
+        (None, Response(200, None, Content(b"text/plain", body)), True),
+        ("gzip", Response(200, None, Content(b"text/plain", body[:99])), True),
+        ("gzip", Response(200, None, Content(b"image/jpeg", body)), False),
+        ("gzip", Response(404, None, Content(b"text/plain", body)), False),
+        ("gzip", Response(304, None, None), False),
+    ]:
+        response = await call(middleware, get_request(accept_encoding), response)
+
+        assert response.get_first_header(b"Content-Encoding") is None
+        # responses that could be compressed vary by encoding for caches
+        assert response.get_headers(b"Vary") == ([b"Accept-Encoding"] if vary else [])
+
+
+@pytest.mark.asyncio
+async def test_compression_middleware_does_not_repeat_vary():
+    middleware = CompressionMiddleware(min_size=100)
+    response = Response(
+        200, [(b"Vary", b"Origin, accept-encoding")], Content(b"text/plain", b"a" * 100)
+    )
+
+    response = await call(middleware, get_request("gzip"), response)
+
+    assert response.get_first_header(b"Content-Encoding") == b"gzip"
+    assert response.get_headers(b"Vary") == [b"Origin, accept-encoding"]
+
+
+@pytest.fixture
+def static_folder(tmp_path):
+    (tmp_path / "index.html").write_text("<html></html>")
+    (tmp_path / "index.html.br").write_bytes(b"br")
+    (tmp_path / "app.js").write_text("var a;")
+    (tmp_path / "app.js.gz").write_bytes(b"gz")
+    (tmp_path / "other.js").write_text("var b;")
+    return tmp_path
+
+
+def get_file_response(content_type: bytes, body: bytes) -> Response:
+    return Response(200, [(b"Accept-Ranges", b"bytes")], Content(content_type, body))
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "tail,accept_encoding,content_type,expected_encoding,expected_body,vary",
+    [
+        ("app.js", "gzip, br", b"application/javascript", "gzip", b"gz", True),
+        ("app.js", "br", b"application/javascript", None, b"var a;", True),
+        ("app.js", None, b"application/javascript", None, b"var a;", True),
+        ("other.js", "gzip, br", b"application/javascript", None, b"var a;", False),
+        ("", "gzip, br", b"text/html", "br", b"br", True),
+        # the fallback document is served for paths of the SPA
+        ("albums/1", "br", b"text/html", "br", b"br", True),
+        # files that are not served are replaced by the fallback document
+        ("app.js", "gzip", b"text/html", None, b"var a;", False),
+        ("../index.html", "br", b"text/html", None, b"var a;", False),
+    ],
+)
+async def test_precompressed_files_middleware(
+    static_folder,
+    tail,
+    accept_encoding,
+    content_type,
+    expected_encoding,
+    expected_body,
+    vary,
+):
+    middleware = PrecompressedFilesMiddleware(
+        str(static_folder), fallback_document="index.html"
+    )
+    response = await call(
+        middleware,
+        get_request(accept_encoding, tail),
+        get_file_response(content_type, b"var a;"),
+    )
+
+    assert response.content.type == content_type
+    assert await response.read() == expected_body
+    # files with precompressed versions vary by encoding, even when not compressed
+    assert response.get_headers(b"Vary") == ([b"Accept-Encoding"] if vary else [])
+
+    if expected_encoding is None:
+        assert response.get_first_header(b"Content-Encoding") is None
+        assert response.get_first_header(b"Accept-Ranges") == b"bytes"
+    else:
+        assert response.get_first_header(b"Content-Encoding") == (
+            expected_encoding.encode()
+        )
+        assert response.get_first_header(b"Accept-Ranges") is None
+
+
+@pytest.mark.asyncio
+async def test_precompressed_files_middleware_ignores_other_routes(static_folder):
+    middleware = PrecompressedFilesMiddleware(str(static_folder))
+    response = await call(
+        middleware,
+        get_request("gzip"),
+        get_file_response(b"application/javascript", b"var a;"),
+    )
+
+    assert response.get_first_header(b"Content-Encoding") is None
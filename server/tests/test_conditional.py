@@ -0,0 +1,169 @@
+from datetime import datetime
+from uuid import uuid4
+
+import pytest
+from blacksheep import Request
+
+from app.conditional import get_conditional_response
+from core.etags import etag_matches, get_versions_etag
+from data.azstorage.vfs import TableAPIFileSystemDataProvider
+from data.queues.sqlite import SQLitePicturesQueue
+from data.sql.contents import SQLContentsDataProvider
+from data.sql.vfs import SQLFileSystemDataProvider
+from domain.vfs import (
+    FileSystemHandler,
+    FileSystemNodeType,
+    get_node_etag,
+    get_nodes_etag,
+)
+from tests.db import create_album, create_session, new_node
+from tests.fakes import (
+    FakeBlobsService,
+    FakePicturesHandler,
+    get_changes_log,
+    get_settings,
+)
+from tests.tables import FakeTableServiceClient
+
+
+def test_versions_etag():
+    first, second = uuid4(), uuid4()
+    etag = get_versions_etag({first: "1", second: "2"})
+
+    assert etag.startswith('"') and etag.endswith('"')
+    assert etag == get_versions_etag({second: "2", first: "1"})
+    assert etag != get_versions_etag({first: "1", second: "3"})
+    assert etag != get_versions_etag({first: "1"})
+
+
+@pytest.mark.parametrize(
+    "if_none_match,expected_result",
+    [
+        ('"a"', True),
+        ('W/"a"', True),
+        ('"b", "a"', True),
+        ("*", True),
+        ('"b"', False),
+        ("a", False),
+    ],
+)
+def test_etag_matches(if_none_match, expected_result):
+    assert etag_matches(if_none_match, '"a"') is expected_result
+
+
+async def get_conditional(if_none_match=None, current_etag=None):
+    reads = []
+
+    async def get_content():
+        reads.append(1)
+        return {"value": 1}
+
+    async def get_current_etag():
+        return current_etag
+
+    response = await get_conditional_response(
+        Request(
+            "GET",
+            b"/",
+            [(b"If-None-Match", if_none_match.encode())] if if_none_match else [],
+        ),
+        get_content,
+        lambda content: '"a"',
+        get_current_etag if current_etag else None,
+    )
+    return response, reads
+
+
+@pytest.mark.asyncio
+async def test_conditional_response():
+    response, reads = await get_conditional()
+
+    assert response.status == 200
+    assert response.get_first_header(b"ETag") == b'"a"'
+    assert await response.json() == {"value": 1}
+    assert reads == [1]
+
+    # the content is not read when the current etag matches
+    response, reads = await get_conditional('"a"', '"a"')
+
+    assert response.status == 304
+    assert response.get_first_header(b"ETag") == b'"a"'
+    assert reads == []
+
+    # without a cheap check, the etag of the content is compared
+    response, reads = await get_conditional('"a"')
+
+    assert response.status == 304
+    assert reads == [1]
+
+    response, reads = await get_conditional('"b"', '"a"')
+
+    assert response.status == 200
+    assert reads == [1]
+
+
+def check_nodes_etags(nodes, etags):
+    assert etags == {node.id: node.etag for node in nodes}
+
+
+async def check_etags_provider(provider, album_id):
+    folder = new_node(album_id, None, "Folder")
+    files = [
+        new_node(album_id, folder.id, f"{i}.jpg", FileSystemNodeType.FILE)
+        for i in range(3)
+    ]
+    await provider.create_nodes([folder])
+    await provider.create_nodes(files)
+
+    check_nodes_etags([folder], await provider.get_album_nodes_etags(album_id))
+    check_nodes_etags(files, await provider.get_node_children_etags(folder.id))
+    assert await provider.get_node_children_etags(files[0].id) == {}
+
+
+@pytest.mark.asyncio
+async def test_sql_nodes_etags(tmp_path):
+    session = await create_session(tmp_path / "test.db")
+    album_id = await create_album(session)
+
+    await check_etags_provider(SQLFileSystemDataProvider(session), album_id)
+
+
+@pytest.mark.asyncio
+async def test_table_nodes_etags():
+    await check_etags_provider(
+        TableAPIFileSystemDataProvider(FakeTableServiceClient()), uuid4()
+    )
+
+
+@pytest.mark.asyncio
+async def test_current_etags_match_etags_of_content(tmp_path):
+    session = await create_session(tmp_path / "test.db")
+    album_id = await create_album(session)
+    provider = SQLFileSystemDataProvider(session)
+    handler = FileSystemHandler(
+        provider,
+        SQLContentsDataProvider(session),
+        FakeBlobsService(),  # type: ignore
+        FakePicturesHandler(),  # type: ignore
+        SQLitePicturesQueue(str(tmp_path / "queue.db")),
+        get_settings(),
+        get_changes_log(session),
+    )
+    folder = new_node(album_id, None, "Folder")
+    picture = new_node(album_id, folder.id, "a.jpg", FileSystemNodeType.FILE)
+    await provider.create_nodes([folder, picture])
+
+    etag = await handler.get_current_node_etag(folder.id)
+    children_etag = await handler.get_current_node_children_etag(folder.id)
+
+    assert etag == get_node_etag(await handler.get_node(folder.id))
+    assert children_etag == get_nodes_etag(await handler.get_node_children(folder.id))
+    assert await handler.get_current_node_etag(picture.id) == get_node_etag(
+        await handler.get_node(picture.id)
+    )
+
+    # changes of children change the etag of their parent
+    await provider.update_node_image(picture.id, None, datetime(2030, 1, 1))
+
+    assert await handler.get_current_node_etag(folder.id) != etag
+    assert await handler.get_current_node_children_etag(folder.id) != children_etag
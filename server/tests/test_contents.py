@@ -0,0 +1,288 @@
+from uuid import uuid4
+
+import pytest
+
+from data.azstorage.contents import TableAPIContentsDataProvider
+from data.queues.sqlite import SQLitePicturesQueue
+from data.sql.contents import SQLContentsDataProvider
+from data.sql.vfs import SQLFileSystemDataProvider
+from domain.vfs import (
+    CopyOperationInput,
+    CreateNodeInput,
+    FileImageData,
+    FileSystemHandler,
+    FileSystemNodeType,
+    StoredContent,
+    UpdateNodeInput,
+)
+from tests.db import create_album, create_session, new_node
+from tests.fakes import (
+    FakeBlobsService,
+    FakePicturesHandler,
+    get_changes_log,
+    get_settings,
+)
+from tests.tables import FakeTableServiceClient
+
+IMAGE = FileImageData(
+    medium_image_name="m.jpg",
+    small_image_name="s.jpg",
+    image_width=400,
+    image_height=300,
+)
+
+
+def get_hash(value: int) -> str:
+    return f"{value:064x}"
+
+
+def new_content(album_id, value: int, references: int = 1, image=None):
+    return StoredContent(
+        album_id=album_id,
+        content_hash=get_hash(value),
+        file_id=f"file-{value}",
+        file_extension=".jpg",
+        image=image,
+        references=references,
+    )
+
+
+async def check_contents_provider(provider, album_id):
+    await provider.add_references(
+        [new_content(album_id, 1), new_content(album_id, 2, references=2)]
+    )
+    await provider.add_references([new_content(album_id, 1, references=2, image=IMAGE)])
+
+    contents = await provider.get_contents(album_id, [get_hash(1), get_hash(3)])
+
+    assert list(contents) == [get_hash(1)]
+    assert contents[get_hash(1)].references == 3
+    assert contents[get_hash(1)].file_id == "file-1"
+    assert contents[get_hash(1)].image == IMAGE
+
+    # the image of contents is set only once
+    other_image = FileImageData("m2.jpg", "s2.jpg", 10, 10)
+    await provider.update_content_image(album_id, get_hash(1), other_image)
+    await provider.update_content_image(album_id, get_hash(2), other_image)
+
+    contents = await provider.get_contents(album_id, [get_hash(1), get_hash(2)])
+
+    assert contents[get_hash(1)].image == IMAGE
+    assert contents[get_hash(2)].image == other_image
+
+    released = await provider.release_references(
+        album_id, {get_hash(1): 1, get_hash(2): 2}
+    )
+
+    assert [content.content_hash for content in released] == [get_hash(2)]
+    assert released[0].file_id == "file-2"
+
+    contents = await provider.get_contents(album_id, [get_hash(1), get_hash(2)])
+
+    assert list(contents) == [get_hash(1)]
+    assert contents[get_hash(1)].references == 2
+
+
+@pytest.mark.asyncio
+async def test_sql_contents_provider(tmp_path):
+    session = await create_session(tmp_path / "test.db")
+    album_id = await create_album(session)
+
+    await check_contents_provider(SQLContentsDataProvider(session), album_id)
+
+
+@pytest.mark.asyncio
+async def test_sql_contents_provider_without_upserts(tmp_path, monkeypatch):
+    session = await create_session(tmp_path / "test.db")
+    album_id = await create_album(session)
+    provider = SQLContentsDataProvider(session)
+    monkeypatch.setattr(provider, "_get_insert", lambda: None)
+
+    await check_contents_provider(provider, album_id)
+
+
+@pytest.mark.asyncio
+async def test_table_contents_provider():
+    await check_contents_provider(
+        TableAPIContentsDataProvider(FakeTableServiceClient()), uuid4()  # type: ignore
+    )
+
+
+@pytest.mark.asyncio
+async def test_table_contents_provider_retries_on_conflicts():
+    album_id = uuid4()
+    provider = TableAPIContentsDataProvider(FakeTableServiceClient())  # type: ignore
+    table_client = provider.table_client
+    await provider.add_references([new_content(album_id, 1)])
+
+    get_entity = table_client.get_entity
+    conflicts = 0
+
+    async def get_entity_with_concurrent_update(*args, **kwargs):
+        nonlocal conflicts
+        entity = await get_entity(*args, **kwargs)
+
+        if conflicts < 2:
+            # another request adds a reference after the entity is read
+            conflicts += 1
+            await table_client.upsert_entity(
+                {**entity, "References": entity["References"] + 1}
+            )
+
+        return entity
+
+    table_client.get_entity = get_entity_with_concurrent_update  # type: ignore
+    await provider.add_references([new_content(album_id, 1)])
+
+    contents = await provider.get_contents(album_id, [get_hash(1)])
+
+    assert conflicts == 2
+    assert contents[get_hash(1)].references == 4
+
+
+async def get_handler(tmp_path):
+    session = await create_session(tmp_path / "test.db")
+    album_id = await create_album(session)
+    provider = SQLFileSystemDataProvider(session)
+    contents_provider = SQLContentsDataProvider(session)
+    blobs_service = FakeBlobsService()
+    pictures_handler = FakePicturesHandler()
+    handler = FileSystemHandler(
+        provider,
+        contents_provider,
+        blobs_service,  # type: ignore
+        pictures_handler,  # type: ignore
+        SQLitePicturesQueue(str(tmp_path / "queue.db")),
+        get_settings(content_deduplication=True),
+        get_changes_log(session),
+    )
+    return handler, provider, contents_provider, blobs_service, album_id
+
+
+def get_file_input(album_id, parent_id, name: str, value: int) -> CreateNodeInput:
+    return CreateNodeInput(
+        name=name,
+        album_id=album_id,
+        parent_id=parent_id,
+        file_id=str(uuid4()),
+        file_size=100,
+        file_mime="image/jpeg",
+        node_type=FileSystemNodeType.FILE,
+        content_hash=get_hash(value),
+    )
+
+
+@pytest.mark.asyncio
+async def test_files_with_same_content_share_blobs(tmp_path):
+    handler, provider, contents_provider, blobs_service, album_id = await get_handler(
+        tmp_path
+    )
+    pictures_handler = handler.pictures_handler
+
+    [first] = await handler.create_nodes(
+        [get_file_input(album_id, None, "first.jpg", 1)]
+    )
+
+    assert first.image is not None
+    assert pictures_handler.max_running == 1  # type: ignore
+
+    folder = new_node(album_id, None, "Folder")
+    await provider.create_nodes([folder])
+
+    pictures_handler.max_running = 0  # type: ignore
+    second_input = get_file_input(album_id, folder.id, "second.JPG", 1)
+    [second] = await handler.create_nodes([second_input])
+
+    # the blob and picture versions of the first file are reused
+    assert pictures_handler.max_running == 0  # type: ignore
+    assert second.file_id == first.file_id
+    assert second.file_extension == first.file_extension
+    assert second.image == first.image
+    assert second.content_hash == get_hash(1)
+
+    contents = await contents_provider.get_contents(album_id, [get_hash(1)])
+    assert contents[get_hash(1)].references == 2
+
+    # the blob uploaded for the second file is not referenced
+    assert blobs_service.deleted == [f"{album_id}/{second_input.file_id}.jpg"]
+    blobs_service.deleted.clear()
+
+    await handler.delete_nodes([first.id])
+
+    assert blobs_service.deleted == []
+
+    await handler.delete_nodes([folder.id])
+
+    assert sorted(blobs_service.deleted) == sorted(
+        f"{album_id}/{name}"
+        for name in [
+            f"{first.file_id}.jpg",
+            f"m-{first.file_id}.jpg",
+            f"s-{first.file_id}.jpg",
+        ]
+    )
+    assert await contents_provider.get_contents(album_id, [get_hash(1)]) == {}
+
+
+@pytest.mark.asyncio
+async def test_copies_of_files_reference_contents(tmp_path):
+    handler, provider, contents_provider, blobs_service, album_id = await get_handler(
+        tmp_path
+    )
+    source = new_node(album_id, None, "Source")
+    target = new_node(album_id, None, "Target")
+    await provider.create_nodes([source, target])
+
+    nodes = await handler.create_nodes(
+        [get_file_input(album_id, source.id, f"{i}.jpg", i) for i in range(3)]
+    )
+
+    await handler.paste_nodes(
+        CopyOperationInput(
+            album_id=album_id,
+            source_parent_id=None,
+            target_parent_id=target.id,
+            nodes=[UpdateNodeInput(id=source.id, name=source.name, etag=source.etag)],
+        )
+    )
+
+    hashes = [get_hash(i) for i in range(3)]
+    contents = await contents_provider.get_contents(album_id, hashes)
+
+    assert [contents[key].references for key in hashes] == [2, 2, 2]
+
+    await handler.delete_nodes([target.id])
+
+    assert blobs_service.deleted == []
+
+    await handler.delete_nodes([source.id])
+
+    assert len(blobs_service.deleted) == 9
+    assert f"{album_id}/{nodes[0].file_id}.jpg" in blobs_service.deleted
+    assert await contents_provider.get_contents(album_id, hashes) == {}
+
+
+@pytest.mark.asyncio
+async def test_repeated_files_are_processed_once(tmp_path):
+    handler, provider, contents_provider, blobs_service, album_id = await get_handler(
+        tmp_path
+    )
+
+    nodes = await handler.reserve_nodes(
+        [get_file_input(album_id, None, f"{i}.jpg", 1) for i in range(2)]
+    )
+
+    assert nodes[1].file_id == nodes[0].file_id
+    contents = await contents_provider.get_contents(album_id, [get_hash(1)])
+    assert contents[get_hash(1)].references == 2
+    assert contents[get_hash(1)].image is None
+
+    await handler.process_pictures([nodes[0].id])
+
+    contents = await contents_provider.get_contents(album_id, [get_hash(1)])
+    assert contents[get_hash(1)].image is not None
+
+    [third] = await handler.reserve_nodes([get_file_input(album_id, None, "2.jpg", 1)])
+
+    assert third.processing is False
+    assert third.image == contents[get_hash(1)].image
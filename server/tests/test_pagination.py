@@ -0,0 +1,100 @@
+from uuid import uuid4
+
+import pytest
+from essentials.exceptions import InvalidArgument
+
+from core.tokens import decode_continuation_token, encode_continuation_token
+from data.azstorage.vfs import TableAPIFileSystemDataProvider
+from data.sql.vfs import SQLFileSystemDataProvider
+from domain.vfs import FileSystemNodeType, validate_page_size
+from tests.db import create_album, create_session, new_node
+from tests.tables import FakeTableServiceClient
+
+
+def test_continuation_tokens():
+    position = {"name": "Ünïcode / name", "id": str(uuid4())}
+    token = encode_continuation_token(position)
+
+    assert "=" not in token
+    assert decode_continuation_token(token) == position
+
+
+@pytest.mark.parametrize("token", ["%%%", "bm90IGpzb24", "WzEsMl0"])
+def test_invalid_continuation_tokens(token):
+    with pytest.raises(InvalidArgument):
+        decode_continuation_token(token)
+
+
+@pytest.mark.parametrize("page_size", [0, -1, 1001])
+def test_invalid_page_size(page_size):
+    with pytest.raises(InvalidArgument):
+        validate_page_size(page_size)
+
+
+async def read_pages(get_page, page_size):
+    items = []
+    pages = 0
+    continuation_token = None
+
+    while True:
+        page = await get_page(page_size, continuation_token)
+        pages += 1
+        items.extend(page.items)
+        continuation_token = page.continuation_token
+
+        if continuation_token is None:
+            return items, pages
+
+
+async def check_pagination(provider, album_id, expected_order):
+    folder = new_node(album_id, None, "Folder")
+    files = [
+        new_node(album_id, folder.id, f"{i % 5}.jpg", FileSystemNodeType.FILE)
+        for i in range(23)
+    ]
+    await provider.create_nodes([folder])
+    await provider.create_nodes(files)
+
+    items, pages = await read_pages(
+        lambda size, token: provider.get_node_children_page(folder.id, size, token),
+        5,
+    )
+
+    # pages never repeat nor skip items, even when names are repeated
+    assert pages == 5
+    assert [item.id for item in items] == [item.id for item in expected_order(files)]
+
+    items, pages = await read_pages(
+        lambda size, token: provider.get_album_nodes_page(album_id, size, token), 5
+    )
+
+    assert pages == 1
+    assert [item.id for item in items] == [folder.id]
+
+    with pytest.raises(InvalidArgument):
+        await provider.get_node_children_page(
+            folder.id, 5, encode_continuation_token({"other": 1})
+        )
+
+
+@pytest.mark.asyncio
+async def test_sql_nodes_pagination(tmp_path):
+    session = await create_session(tmp_path / "test.db")
+    album_id = await create_album(session)
+
+    await check_pagination(
+        SQLFileSystemDataProvider(session),
+        album_id,
+        lambda nodes: sorted(nodes, key=lambda node: (node.name, str(node.id))),
+    )
+
+
+@pytest.mark.asyncio
+async def test_table_nodes_pagination():
+    provider = TableAPIFileSystemDataProvider(FakeTableServiceClient())
+
+    # the Table API sorts entities by RowKey, which is the id of nodes
+    await check_pagination(
+        provider, uuid4(), lambda nodes: sorted(nodes, key=lambda node: str(node.id))
+    )
+    assert provider.table_client.calls["table_scans"] == 0
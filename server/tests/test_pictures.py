@@ -0,0 +1,48 @@
+import pickle
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from domain.pictures import GalleristCache, PictureJob
+from domain.services import create_pictures_executor
+from tests.fakes import CONNECTION_STRING, get_settings
+
+
+def test_picture_job_can_cross_process_boundaries():
+    job = PictureJob("AccountName=foo;AccountKey=***", "container", "picture.jpg")
+
+    assert pickle.loads(pickle.dumps(job)) == job
+
+
+def test_create_pictures_executor():
+    executor = create_pictures_executor(get_settings(pictures_workers=2))
+    assert isinstance(executor, ProcessPoolExecutor)
+    executor.shutdown()
+
+    executor = create_pictures_executor(
+        get_settings(pictures_executor="thread", pictures_workers=2)
+    )
+    assert isinstance(executor, ThreadPoolExecutor)
+    executor.shutdown()
+
+
+def test_gallerist_cache_evicts_least_recently_used_containers():
+    cache = GalleristCache(max_size=2)
+
+    first = cache.get(CONNECTION_STRING, "a")
+    second = cache.get(CONNECTION_STRING, "b")
+
+    assert cache.get(CONNECTION_STRING, "a") is first
+
+    third = cache.get(CONNECTION_STRING, "c")
+
+    assert len(cache) == 2
+    assert cache.get(CONNECTION_STRING, "a") is first
+    assert cache.get(CONNECTION_STRING, "c") is third
+    assert cache.get(CONNECTION_STRING, "b") is not second
+
+    # file stores share a single client, and so its pool of connections
+    assert first.store.service is third.store.service
+
+    cache.dispose()
+    assert len(cache) == 0
+    assert cache.get(CONNECTION_STRING, "a") is not first
+    cache.dispose()
@@ -0,0 +1,177 @@
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+import pytest
+from rodi import Container
+
+from data.queues.sqlite import SQLitePicturesQueue
+from data.sql.vfs import SQLFileSystemDataProvider
+from domain.changes import ChangesLog, NodeChangeType
+from domain.pictures import PicturesHandler, PictureTaskInput
+from domain.picturespipeline import PicturesPipeline, get_retry_delay
+from domain.vfs import FileSystemDataProvider, FileSystemNodeType
+from tests.db import create_album, create_session, new_node
+from tests.fakes import FakePicturesHandler, get_changes_log, get_settings
+
+
+async def get_pipeline(tmp_path, **settings):
+    session = await create_session(tmp_path / "test.db")
+    album_id = await create_album(session)
+    fs_data_provider = SQLFileSystemDataProvider(session)
+
+    node = new_node(album_id, None, "1.jpg", FileSystemNodeType.FILE)
+    node.processing = True
+    await fs_data_provider.create_nodes([node])
+
+    queue = SQLitePicturesQueue(str(tmp_path / "queue.db"))
+    await queue.initialize()
+
+    container = Container()
+    container.add_instance(fs_data_provider, FileSystemDataProvider)
+    container.add_instance(FakePicturesHandler(), PicturesHandler)
+    container.add_instance(get_changes_log(session))
+
+    pipeline = PicturesPipeline(queue, get_settings(**settings))
+    await pipeline.start(container.build_provider())
+    # workers are not needed to test how tasks are handled
+    await pipeline.stop()
+    return pipeline, queue, fs_data_provider, node
+
+
+def test_retry_delay_grows_exponentially_up_to_a_limit():
+    assert get_retry_delay(1) == timedelta(seconds=20)
+    assert get_retry_delay(2) == timedelta(seconds=40)
+    assert get_retry_delay(20) == timedelta(hours=1)
+
+
+@pytest.mark.asyncio
+async def test_process_task_updates_node_image(tmp_path):
+    pipeline, queue, fs_data_provider, node = await get_pipeline(tmp_path)
+
+    try:
+        await queue.enqueue([PictureTaskInput(node.id, str(node.album_id), "a.jpg")])
+
+        task = await queue.claim()
+        assert task is not None
+        await pipeline.process_task(task)
+
+        updated = await fs_data_provider.get_node(node.id, False)
+        assert updated.processing is False
+        assert updated.image is not None
+        assert updated.image.medium_image_name == "m-a.jpg"
+        assert updated.image.small_image_name == "s-a.jpg"
+        assert updated.image.image_width == 4000
+        assert updated.etag != node.etag
+
+        # clients observe the new image data in the changes of the album
+        changes = await pipeline._services.get(ChangesLog).data_provider.get_changes(
+            node.album_id, 0, 10
+        )
+        assert [(change.node_id, change.change_type) for change in changes] == [
+            (node.id, NodeChangeType.UPDATED)
+        ]
+
+        # completed tasks are removed from the queue
+        async with queue.connection.execute("SELECT COUNT(*) FROM picture_tasks") as c:
+            assert (await c.fetchone())[0] == 0
+    finally:
+        await queue.dispose()
+
+
+@pytest.mark.asyncio
+async def test_process_task_retries_failed_pictures(tmp_path):
+    pipeline, queue, fs_data_provider, node = await get_pipeline(
+        tmp_path, pictures_max_attempts=2
+    )
+
+    try:
+        await queue.enqueue(
+            [PictureTaskInput(node.id, str(node.album_id), "broken.jpg")]
+        )
+
+        task = await queue.claim()
+        assert task is not None
+        assert task.attempts == 1
+        await pipeline.process_task(task)
+
+        # the task is scheduled again, with a delay
+        assert await queue.claim() is None
+        await queue.connection.execute(
+            "UPDATE picture_tasks SET due_at = ?",
+            ((datetime.utcnow() - timedelta(days=1)).timestamp(),),
+        )
+
+        task = await queue.claim()
+        assert task is not None
+        assert task.attempts == 2
+        assert (await fs_data_provider.get_node(node.id, False)).processing is True
+
+        await pipeline.process_task(task)
+
+        # after the last attempt the node is stored without image data
+        updated = await fs_data_provider.get_node(node.id, False)
+        assert updated.processing is False
+        assert updated.image is None
+
+        async with queue.connection.execute(
+            "SELECT status, last_error FROM picture_tasks"
+        ) as cursor:
+            assert await cursor.fetchone() == ("failed", "Invalid picture")
+    finally:
+        await queue.dispose()
+
+
+@pytest.mark.asyncio
+async def test_queue_reclaims_tasks_with_expired_lease(tmp_path):
+    queue = SQLitePicturesQueue(str(tmp_path / "queue.db"))
+    await queue.initialize()
+
+    try:
+        await queue.enqueue([PictureTaskInput(uuid4(), "c", "a.jpg")])
+
+        task = await queue.claim()
+        assert task is not None
+        assert await queue.claim() is None
+
+        # simulates a worker that stopped without completing the task
+        await queue.connection.execute("UPDATE picture_tasks SET due_at = 0")
+
+        reclaimed = await queue.claim()
+        assert reclaimed is not None
+        assert reclaimed.id == task.id
+        assert reclaimed.attempts == 2
+
+        await queue.complete(reclaimed)
+        assert await queue.claim() is None
+    finally:
+        await queue.dispose()
+
+
+@pytest.mark.asyncio
+async def test_queue_ignores_nodes_with_waiting_tasks(tmp_path):
+    queue = SQLitePicturesQueue(str(tmp_path / "queue.db"))
+    await queue.initialize()
+    node_id = uuid4()
+
+    try:
+        await queue.enqueue(
+            [PictureTaskInput(node_id, "c", "a.jpg") for _ in range(2)]
+            + [PictureTaskInput(uuid4(), "c", "b.jpg")]
+        )
+
+        task = await queue.claim()
+        assert task is not None and task.node_id == node_id
+
+        await queue.enqueue([PictureTaskInput(node_id, "c", "a.jpg")])
+        other_task = await queue.claim()
+
+        assert other_task is not None and other_task.node_id != node_id
+        assert await queue.claim() is None
+
+        # nodes are enqueued again when their tasks are completed
+        await queue.complete(task)
+        await queue.enqueue([PictureTaskInput(node_id, "c", "a.jpg")])
+
+        assert (await queue.claim()).node_id == node_id  # type: ignore
+    finally:
+        await queue.dispose()
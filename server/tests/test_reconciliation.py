@@ -0,0 +1,154 @@
+from datetime import datetime, timedelta
+from typing import Dict, List
+from uuid import uuid4
+
+import pytest
+
+from core.spill import SortedSpill
+from data.sql.albums import SQLAlbumsDataProvider
+from data.sql.contents import SQLContentsDataProvider
+from data.sql.vfs import SQLFileSystemDataProvider
+from domain.blobs import BlobInfo
+from domain.reconciliation import (
+    Discrepancy,
+    DiscrepancyKind,
+    ReconciliationHandler,
+    get_container_blob_name,
+)
+from domain.vfs import FileSystemNodeType, StoredContent
+from tests.db import create_album, create_session, new_node
+from tests.fakes import FakeBlobsService
+
+OLD = datetime.utcnow() - timedelta(days=7)
+
+
+class FakeListBlobsService(FakeBlobsService):
+    def __init__(self) -> None:
+        super().__init__()
+        self.blobs: Dict[str, BlobInfo] = {}
+
+    def add_blob(self, name: str, last_modified: datetime = OLD) -> None:
+        self.blobs[name] = BlobInfo(name, 10, last_modified)
+
+    async def list_blobs(self, container_name: str):
+        for name in sorted(self.blobs):
+            yield self.blobs[name]
+
+    async def delete_blobs(self, container_name: str, files_names: List[str]) -> None:
+        await super().delete_blobs(container_name, files_names)
+
+        for name in files_names:
+            del self.blobs[name]
+
+
+def test_sorted_spill(tmp_path):
+    with SortedSpill(buffer_size=2, directory=str(tmp_path)) as spill:
+        for key, value in [("c", "C"), ("a", "A"), ("b", "B"), ("a", "X")]:
+            spill.add(key, value)
+
+        assert len(spill) == 3
+        assert "b" in spill
+        assert "d" not in spill
+        assert list(spill.items()) == [("a", "A"), ("b", "B"), ("c", "C")]
+
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_get_container_blob_name():
+    assert (
+        get_container_blob_name(
+            "https://example.blob.core.windows.net/abc/some%20file.jpg?sv=1", "abc"
+        )
+        == "some file.jpg"
+    )
+    assert get_container_blob_name("https://example.com/other/a.jpg", "abc") is None
+
+
+async def get_handler(tmp_path):
+    session = await create_session(tmp_path / "test.db")
+    album_id = await create_album(session)
+    fs_provider = SQLFileSystemDataProvider(session)
+    contents_provider = SQLContentsDataProvider(session)
+    blobs_service = FakeListBlobsService()
+    handler = ReconciliationHandler(
+        SQLAlbumsDataProvider(session),
+        fs_provider,
+        contents_provider,
+        blobs_service,  # type: ignore
+    )
+    return handler, fs_provider, contents_provider, blobs_service, album_id
+
+
+def new_file(album_id, parent_id, name: str):
+    node = new_node(album_id, parent_id, name, FileSystemNodeType.FILE)
+    node.creation_time = OLD
+    return node
+
+
+@pytest.mark.asyncio
+async def test_reconcile_album(tmp_path):
+    (
+        handler,
+        fs_provider,
+        contents_provider,
+        blobs_service,
+        album_id,
+    ) = await get_handler(tmp_path)
+    folder = new_node(album_id, None, "Folder")
+    present = new_file(album_id, folder.id, "present.jpg")
+    missing = new_file(album_id, folder.id, "missing.jpg")
+    recent = new_file(album_id, None, "recent.jpg")
+    recent.creation_time = datetime.utcnow()
+    orphan = new_file(album_id, uuid4(), "orphan.jpg")
+    # for example, created in a folder while the folder is deleted
+    recent_orphan = new_file(album_id, uuid4(), "recent-orphan.jpg")
+    recent_orphan.creation_time = datetime.utcnow()
+    await fs_provider.create_nodes(
+        [folder, present, missing, recent, orphan, recent_orphan]
+    )
+    await contents_provider.add_references(
+        [StoredContent(album_id, "0" * 64, "content", ".png", None, 0)]
+    )
+
+    blobs_service.add_blob(f"{present.file_id}.jpg")
+    blobs_service.add_blob(f"{orphan.file_id}.jpg")
+    blobs_service.add_blob("content.png")
+    blobs_service.add_blob("old-orphan.jpg")
+    blobs_service.add_blob("new-orphan.jpg", datetime.utcnow())
+
+    discrepancies: List[Discrepancy] = []
+    report = await handler.reconcile_album(album_id, notify=discrepancies.append)
+
+    assert report.nodes == 6
+    assert report.blobs == 5
+    assert report.orphan_blobs == 1
+    assert report.orphan_blobs_size == 10
+    assert report.missing_blobs == 1
+    assert report.orphan_nodes == 1
+    assert report.deleted_blobs == 0
+    assert report.deleted_nodes == 0
+    assert sorted(discrepancies, key=lambda item: item.kind.value) == [
+        Discrepancy(
+            DiscrepancyKind.MISSING_BLOB,
+            album_id,
+            node_id=missing.id,
+            blob_name=f"{missing.file_id}.jpg",
+        ),
+        Discrepancy(DiscrepancyKind.ORPHAN_BLOB, album_id, blob_name="old-orphan.jpg"),
+        Discrepancy(DiscrepancyKind.ORPHAN_NODE, album_id, node_id=orphan.id),
+    ]
+
+    report = await handler.reconcile_album(album_id, clean=True)
+
+    assert report.deleted_blobs == 1
+    assert report.deleted_nodes == 1
+    assert blobs_service.deleted == [f"{album_id}/old-orphan.jpg"]
+    assert await fs_provider.get_node(orphan.id, False) is None
+    assert await fs_provider.get_node(recent_orphan.id, False) is not None
+
+    # the blob of the deleted orphan node is deleted by the next run
+    report = await handler.reconcile_album(album_id, clean=True)
+
+    assert report.orphan_nodes == 0
+    assert report.deleted_blobs == 1
+    assert blobs_service.deleted[-1] == f"{album_id}/{orphan.file_id}.jpg"
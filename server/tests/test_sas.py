@@ -0,0 +1,74 @@
+from datetime import datetime, timedelta
+
+import pytest
+from azure.storage.blob.aio import BlobServiceClient
+
+from data.azstorage.blobs import AzureStorageBlobsService
+from data.azstorage.sas import SASCache, get_bucket_expiry
+from tests.fakes import CONNECTION_STRING, get_settings
+
+
+def test_get_bucket_expiry():
+    bucket = timedelta(minutes=30)
+    validity = timedelta(hours=2)
+
+    first = get_bucket_expiry(datetime(2022, 1, 1, 10, 1), validity, bucket)
+    second = get_bucket_expiry(datetime(2022, 1, 1, 10, 29), validity, bucket)
+    third = get_bucket_expiry(datetime(2022, 1, 1, 10, 31), validity, bucket)
+
+    assert first == second == datetime(2022, 1, 1, 12, 30)
+    assert third == datetime(2022, 1, 1, 13, 0)
+    assert get_bucket_expiry(datetime(2022, 1, 1, 10), validity, bucket) == (
+        datetime(2022, 1, 1, 12)
+    )
+
+
+def test_sas_cache_reuses_tokens_in_the_same_bucket():
+    cache = SASCache(max_size=2)
+    issued = []
+
+    def factory(expiry: datetime) -> str:
+        issued.append(expiry)
+        return f"token-{len(issued)}"
+
+    now = datetime(2022, 1, 1, 10, 1)
+    validity = timedelta(hours=2)
+
+    assert cache.get_token("a", validity, factory, now) == "token-1"
+    assert cache.get_token("a", validity, factory, now + timedelta(minutes=5)) == (
+        "token-1"
+    )
+    assert cache.get_token("b", validity, factory, now) == "token-2"
+
+    # a new bucket requires a new token
+    assert cache.get_token("a", validity, factory, now + timedelta(hours=1)) == (
+        "token-3"
+    )
+    assert cache.metrics.hits == 1
+    assert cache.metrics.misses == 3
+    assert cache.metrics.hit_rate == 0.25
+
+    # the least recently used token is evicted
+    assert cache.get_token("c", validity, factory, now) == "token-4"
+    assert len(cache) == 2
+    assert cache.get_token("b", validity, factory, now) == "token-5"
+
+
+@pytest.mark.asyncio
+async def test_read_signatures_are_stable():
+    blob_client = BlobServiceClient.from_connection_string(CONNECTION_STRING)
+    service = AzureStorageBlobsService(
+        blob_client,
+        get_settings(storage_account_name="foo", storage_account_key="Zm9v"),
+    )
+
+    first = service.get_read_blob_sas("album", "file.jpg", "Picture.jpg")
+    assert service.get_read_blob_sas("album", "file.jpg", "Picture.jpg") == first
+    assert service.get_read_blob_sas("album", "other.jpg", "Picture.jpg") != first
+    assert service.get_read_blob_sas("album", "file.jpg", "Other.jpg") != first
+    assert "se=" in first
+
+    context = service.get_read_container_sas("album")
+    assert service.get_read_container_sas("album") == context
+    assert service.sas_cache.metrics.hits == 2
+    await blob_client.close()
@@ -0,0 +1,75 @@
+import json
+from decimal import Decimal
+from uuid import uuid4
+
+import pytest
+from blacksheep.plugins import json as json_plugin
+from blacksheep.plugins.json import default_json_dumps
+
+from app.serialization import configure_json, dumps
+from domain.albums import Album
+from domain.vfs import (
+    CopyOperationInput,
+    FileImageData,
+    FileSystemNodeType,
+    UpdateNodeInput,
+)
+from tests.db import new_node
+from tests.fakes import get_settings
+
+
+def test_dumps_is_consistent_with_default_serializer():
+    album_id = uuid4()
+    folder = new_node(album_id, None, "Folder")
+    picture = new_node(album_id, folder.id, "ä.jpg", FileSystemNodeType.FILE)
+    picture.image = FileImageData("medium.jpg", "small.jpg", 800, 600)
+    folder.items = [picture]
+
+    for value in [
+        [folder],
+        Album(
+            id=album_id,
+            storage_id=uuid4(),
+            name="Album",
+            slug="album",
+            image_url="",
+            description=None,
+            last_modified_time=folder.last_modified_time,
+            creation_time=folder.creation_time,
+            etag=folder.etag,
+            items=[folder],
+            public=False,
+        ),
+        CopyOperationInput(
+            album_id=album_id,
+            source_parent_id=None,
+            target_parent_id=folder.id,
+            nodes=[
+                UpdateNodeInput(id=picture.id, name="b.jpg", etag=None, parent_id=None)
+            ],
+        ),
+        {"size": Decimal("1.5"), "data": b"\x00\x01"},
+    ]:
+        assert json.loads(dumps(value)) == json.loads(default_json_dumps(value))
+
+
+def test_dumps_unsupported_type():
+    with pytest.raises(TypeError):
+        dumps({"value": object()})
+
+
+def test_configure_json():
+    # unlike the default serializer, orjson supports keys that are not strings
+    value = {uuid4(): 1}
+    configure_json(get_settings())
+
+    with pytest.raises(TypeError):
+        json_plugin.dumps(value)
+
+    try:
+        configure_json(get_settings(fast_json=True))
+
+        assert json_plugin.dumps(value) == dumps(value)
+        assert json_plugin.loads('{"a":[1]}') == {"a": [1]}
+    finally:
+        json_plugin.use()
@@ -1,6 +1,6 @@
 from configuration.common import ConfigurationBuilder
 
-from domain.settings import read_account_name_and_key
+from domain.settings import Settings, read_account_name_and_key
 
 
 def test_read_account_name_and_key():
@@ -25,3 +25,21 @@ def test_read_account_name_and_key_using_conn_string():
     name, key = read_account_name_and_key(config)
     assert name == "foo"
     assert key == "***"
+
+
+def test_compression_types_from_environment_variable():
+    builder = ConfigurationBuilder()
+    builder.add_map(
+        {
+            "storage_account_name": "foo",
+            "storage_account_key": "***",
+            "db_connection_string": "",
+            "monitoring_key": "",
+            # environment variables can only set strings
+            "compression_types": "application/json, text/",
+        }
+    )
+
+    settings = Settings.from_configuration(builder.build())
+
+    assert settings.compression_types == ["application/json", "text/"]
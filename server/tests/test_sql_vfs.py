@@ -0,0 +1,213 @@
+from datetime import datetime
+from typing import List
+from uuid import uuid4
+
+import pytest
+from essentials.exceptions import InvalidArgument, ObjectNotFound
+from sqlalchemy.sql.expression import select
+
+from data.sql.dbmodel import NodeClosureEntity
+from data.sql.vfs import SQLFileSystemDataProvider
+from domain.vfs import FileSystemNode, FileSystemNodeType
+from tests.db import create_album, create_session, new_node
+
+
+async def create_chain(
+    provider: SQLFileSystemDataProvider, album_id, depth: int
+) -> List[FileSystemNode]:
+    nodes: List[FileSystemNode] = []
+    parent_id = None
+
+    for i in range(depth):
+        node = new_node(album_id, parent_id, f"Folder {i}")
+        nodes.append(node)
+        parent_id = node.id
+
+    await provider.create_nodes(nodes)
+    return nodes
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("depth", [1, 4, 5, 20])
+async def test_get_node_full_path(tmp_path, depth):
+    session = await create_session(tmp_path / "test.db")
+    album_id = await create_album(session)
+    provider = SQLFileSystemDataProvider(session)
+
+    nodes = await create_chain(provider, album_id, depth)
+
+    path = await provider.get_node_full_path(nodes[-1].id)
+
+    assert [part.id for part in path] == [node.id for node in nodes]
+    assert [part.name for part in path] == [node.name for node in nodes]
+    assert path[0].parent_id is None
+
+
+@pytest.mark.asyncio
+async def test_get_node_full_path_max_depth(tmp_path):
+    session = await create_session(tmp_path / "test.db")
+    album_id = await create_album(session)
+    provider = SQLFileSystemDataProvider(session)
+
+    nodes = await create_chain(provider, album_id, 10)
+
+    path = await provider.get_node_full_path(nodes[-1].id, max_depth=9)
+    assert len(path) == 10
+
+    with pytest.raises(InvalidArgument):
+        await provider.get_node_full_path(nodes[-1].id, max_depth=8)
+
+
+@pytest.mark.asyncio
+async def test_get_node_full_path_not_found(tmp_path):
+    session = await create_session(tmp_path / "test.db")
+    provider = SQLFileSystemDataProvider(session)
+
+    with pytest.raises(ObjectNotFound):
+        await provider.get_node_full_path(uuid4())
+
+
+async def get_closure(session):
+    async with session:
+        results = await session.execute(
+            select(
+                NodeClosureEntity.ancestor_id,
+                NodeClosureEntity.descendant_id,
+                NodeClosureEntity.depth,
+            )
+        )
+        return {(str(a), str(d), depth) for a, d, depth in results}
+
+
+@pytest.mark.asyncio
+async def test_closure_is_kept_in_sync(tmp_path):
+    session = await create_session(tmp_path / "test.db")
+    album_id = await create_album(session)
+    provider = SQLFileSystemDataProvider(session)
+
+    # a -> b -> c, d
+    a = new_node(album_id, None, "A")
+    b = new_node(album_id, a.id, "B")
+    c = new_node(album_id, b.id, "C")
+    d = new_node(album_id, None, "D")
+
+    # parents must precede their children, like foreign keys require
+    await provider.create_nodes([a, b, c])
+    await provider.create_nodes([d])
+
+    assert await get_closure(session) == {
+        (str(a.id), str(a.id), 0),
+        (str(b.id), str(b.id), 0),
+        (str(c.id), str(c.id), 0),
+        (str(d.id), str(d.id), 0),
+        (str(a.id), str(b.id), 1),
+        (str(a.id), str(c.id), 2),
+        (str(b.id), str(c.id), 1),
+    }
+
+    descendants = await provider.get_node_descendants(a.id)
+    assert [node.id for node in descendants] == [b.id, c.id]
+
+    # move b under d
+    b.parent_id = d.id
+    await provider.update_nodes([b])
+
+    assert await get_closure(session) == {
+        (str(a.id), str(a.id), 0),
+        (str(b.id), str(b.id), 0),
+        (str(c.id), str(c.id), 0),
+        (str(d.id), str(d.id), 0),
+        (str(d.id), str(b.id), 1),
+        (str(d.id), str(c.id), 2),
+        (str(b.id), str(c.id), 1),
+    }
+    assert await provider.get_node_descendants(a.id) == []
+
+    path = await provider.get_node_full_path(c.id)
+    assert [part.id for part in path] == [d.id, b.id, c.id]
+
+    await provider.delete_nodes([b.id])
+
+    assert await get_closure(session) == {
+        (str(a.id), str(a.id), 0),
+        (str(d.id), str(d.id), 0),
+    }
+
+
+@pytest.mark.asyncio
+async def test_clone_nodes(tmp_path):
+    session = await create_session(tmp_path / "test.db")
+    album_id = await create_album(session)
+    provider = SQLFileSystemDataProvider(session)
+
+    # a -> b -> c (file), a -> d (file); e is the target
+    a = new_node(album_id, None, "A")
+    b = new_node(album_id, a.id, "B")
+    c = new_node(album_id, b.id, "C", FileSystemNodeType.FILE)
+    d = new_node(album_id, a.id, "D", FileSystemNodeType.FILE)
+    e = new_node(album_id, None, "E")
+    await provider.create_nodes([a, b, c, d, e])
+
+    clones = await provider.clone_nodes([a], e.id, datetime.utcnow())
+
+    assert len(clones) == 1
+    assert clones[0].id != a.id
+    assert clones[0].parent_id == e.id
+
+    cloned_descendants = await provider.get_node_descendants(clones[0].id)
+    assert sorted(node.name for node in cloned_descendants) == ["B", "C", "D"]
+    assert not {node.id for node in cloned_descendants} & {b.id, c.id, d.id}
+
+    cloned_b = next(node for node in cloned_descendants if node.name == "B")
+    cloned_c = next(node for node in cloned_descendants if node.name == "C")
+    assert cloned_c.parent_id == cloned_b.id
+    assert cloned_c.file_id == c.file_id
+
+    path = await provider.get_node_full_path(cloned_c.id)
+    assert [part.name for part in path] == ["E", "A", "B", "C"]
+
+    # the source subtree is unchanged
+    assert len(await provider.get_node_descendants(a.id)) == 3
+
+
+@pytest.mark.asyncio
+async def test_delete_nodes_deletes_subtrees(tmp_path):
+    session = await create_session(tmp_path / "test.db")
+    album_id = await create_album(session)
+    provider = SQLFileSystemDataProvider(session)
+
+    a = new_node(album_id, None, "A")
+    b = new_node(album_id, a.id, "B")
+    c = new_node(album_id, b.id, "C", FileSystemNodeType.FILE)
+    d = new_node(album_id, None, "D")
+    e = new_node(album_id, d.id, "E", FileSystemNodeType.FILE)
+    f = new_node(album_id, None, "F")
+    await provider.create_nodes([a, b, c, d, e, f])
+
+    await provider.delete_nodes([a.id, e.id])
+
+    for node in [a, b, c, e]:
+        assert await provider.get_node(node.id, False) is None
+
+    for node in [d, f]:
+        assert await provider.get_node(node.id, False) is not None
+
+    assert await get_closure(session) == {
+        (str(d.id), str(d.id), 0),
+        (str(f.id), str(f.id), 0),
+    }
+
+
+@pytest.mark.asyncio
+async def test_get_nodes(tmp_path):
+    session = await create_session(tmp_path / "test.db")
+    album_id = await create_album(session)
+    provider = SQLFileSystemDataProvider(session)
+
+    nodes = await create_chain(provider, album_id, 10)
+    requested = nodes[2:7]
+
+    results = await provider.get_nodes([node.id for node in requested] + [uuid4()])
+
+    assert sorted(node.id for node in results) == sorted(node.id for node in requested)
+    assert await provider.get_nodes([]) == []
@@ -0,0 +1,107 @@
+from datetime import datetime
+from uuid import uuid4
+
+import pytest
+
+from data.azstorage.changes import TableAPIChangesDataProvider
+from data.sql.albums import SQLAlbumsDataProvider
+from data.sql.vfs import SQLFileSystemDataProvider
+from domain.albums import AlbumsHandler
+from domain.changes import NodeChange, NodeChangeType
+from domain.trees import AlbumTreesCache, get_album_tree
+from domain.vfs import FileImageData, FileSystemNodeType
+from tests.db import create_album, create_session, new_node
+from tests.fakes import FakeBlobsService, get_changes_log, get_settings
+from tests.tables import FakeTableServiceClient
+
+
+def get_nodes(album_id, root_parent_id=None):
+    folder_b = new_node(album_id, root_parent_id, "B")
+    folder_a = new_node(album_id, root_parent_id, "A")
+    child = new_node(album_id, folder_b.id, "C")
+    picture = new_node(album_id, child.id, "d.jpg", FileSystemNodeType.FILE)
+    picture.image = FileImageData("d_medium.jpg", "d_small.jpg", 800, 600)
+    return [picture, child, folder_b, folder_a]
+
+
+@pytest.mark.parametrize("table_roots", [False, True])
+def test_get_album_tree(table_roots):
+    album_id = uuid4()
+    # the Table API provider reads the album id as parent of root nodes
+    picture, child, folder_b, folder_a = get_nodes(
+        album_id, album_id if table_roots else None
+    )
+
+    tree = get_album_tree(album_id, '"a"', [picture, child, folder_b, folder_a])
+
+    assert tree.ids == [folder_a.id, folder_b.id, child.id, picture.id]
+    assert tree.parents == [-1, -1, 1, 2]
+    assert tree.names == ["A", "B", "C", "d.jpg"]
+    assert tree.node_types == [FileSystemNodeType.FOLDER] * 3 + [
+        FileSystemNodeType.FILE
+    ]
+    assert tree.sizes == [None, None, None, 100]
+    assert tree.image_widths == [None, None, None, 800]
+    assert tree.image_heights == [None, None, None, 600]
+    assert tree.small_images == [None, None, None, "d_small.jpg"]
+    assert tree.medium_images == [None, None, None, "d_medium.jpg"]
+
+
+def test_get_album_tree_excludes_orphan_nodes():
+    album_id = uuid4()
+    picture, child, folder_b, folder_a = get_nodes(album_id)
+    # nodes whose parents were deleted, like the ones reported by reconciliation
+    orphan_folder = new_node(album_id, uuid4(), "Orphan")
+    orphan_file = new_node(album_id, orphan_folder.id, "e.jpg", FileSystemNodeType.FILE)
+
+    tree = get_album_tree(
+        album_id,
+        '"a"',
+        [picture, orphan_file, child, orphan_folder, folder_b, folder_a],
+    )
+
+    assert tree.ids == [folder_a.id, folder_b.id, child.id, picture.id]
+    assert tree.parents == [-1, -1, 1, 2]
+
+
+@pytest.mark.asyncio
+async def test_album_tree_is_cached_by_version(tmp_path):
+    session = await create_session(tmp_path / "test.db")
+    album_id = await create_album(session)
+    provider = SQLFileSystemDataProvider(session)
+    changes_log = get_changes_log(session)
+    changes_log.data_provider = TableAPIChangesDataProvider(FakeTableServiceClient())
+    handler = AlbumsHandler(
+        SQLAlbumsDataProvider(session),
+        FakeBlobsService(),  # type: ignore
+        provider,
+        get_settings(),
+        None,  # type: ignore
+        AlbumTreesCache(),
+        changes_log,
+    )
+    picture, child, folder_b, folder_a = get_nodes(album_id)
+    await provider.create_nodes([folder_b, folder_a, child, picture])
+
+    tree = await handler.get_album_tree(album_id)
+
+    assert tree.names == ["A", "B", "C", "d.jpg"]
+    assert tree.etag == await handler.get_current_album_tree_etag(album_id)
+    assert await handler.get_album_tree(album_id) is tree
+    assert handler.trees_cache.metrics.hits == 1
+
+    # the version of the album is read without reading its nodes
+    assert changes_log.data_provider.table_client.calls["query_entities"] == 0
+
+    # changes of any node of the album are logged, changing its version
+    await provider.update_node_image(picture.id, None, datetime(2030, 1, 1))
+    await changes_log.append(
+        album_id,
+        [NodeChange(picture.id, child.id, NodeChangeType.UPDATED, datetime.utcnow())],
+    )
+
+    changed_tree = await handler.get_album_tree(album_id)
+
+    assert changed_tree is not tree
+    assert changed_tree.etag != tree.etag
+    assert changed_tree.medium_images[3] is None
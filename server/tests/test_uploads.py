@@ -0,0 +1,184 @@
+from typing import List
+
+import pytest
+from essentials.exceptions import InvalidArgument
+
+from data.queues.sqlite import SQLitePicturesQueue
+from data.sql.contents import SQLContentsDataProvider
+from data.sql.vfs import SQLFileSystemDataProvider
+from domain.uploads import InitializeUploadsInput, UploadManifestFile, UploadsHandler
+from domain.vfs import FileSystemHandler, FileSystemNodeType
+from tests.db import create_album, create_session, new_node
+from tests.fakes import (
+    FakeBlobsService,
+    FakePicturesHandler,
+    get_changes_log,
+    get_settings,
+)
+
+
+def get_manifest(count: int) -> List[UploadManifestFile]:
+    return [
+        UploadManifestFile(
+            file_name=f"{i}.jpg", file_size=100 + i, file_type="image/jpeg"
+        )
+        for i in range(count)
+    ]
+
+
+def get_hash(value: int) -> str:
+    return f"{value:064x}"
+
+
+async def get_handler(tmp_path, **kwargs):
+    session = await create_session(tmp_path / "test.db")
+    album_id = await create_album(session)
+    provider = SQLFileSystemDataProvider(session)
+    contents_provider = SQLContentsDataProvider(session)
+    settings = get_settings(**kwargs)
+    blobs_service = FakeBlobsService()
+    fs_handler = FileSystemHandler(
+        provider,
+        contents_provider,
+        blobs_service,  # type: ignore
+        FakePicturesHandler(),  # type: ignore
+        SQLitePicturesQueue(str(tmp_path / "queue.db")),
+        settings,
+        get_changes_log(session),
+    )
+    handler = UploadsHandler(
+        blobs_service, fs_handler, contents_provider, settings  # type: ignore
+    )
+    return handler, blobs_service, provider, album_id
+
+
+@pytest.mark.asyncio
+async def test_initialize_uploads(tmp_path):
+    handler, blobs_service, provider, album_id = await get_handler(tmp_path)
+
+    output = await handler.initialize_uploads(
+        InitializeUploadsInput(container_id=str(album_id), files=get_manifest(5))
+    )
+
+    assert output.base_url == handler.get_container_url(str(album_id))
+    assert len(output.files) == 5
+    assert len({target.file_id for target in output.files}) == 5
+
+    for target in output.files:
+        assert target.file_name == f"{target.file_id}.jpg"
+        assert target.token == f"token-{target.file_name}"
+        assert target.node is None
+
+    assert await provider.get_album_nodes(album_id) == []
+
+
+@pytest.mark.asyncio
+async def test_initialize_uploads_reserves_nodes(tmp_path):
+    handler, blobs_service, provider, album_id = await get_handler(tmp_path)
+    folder = new_node(album_id, None, "Folder")
+    await provider.create_nodes([folder])
+
+    output = await handler.initialize_uploads(
+        InitializeUploadsInput(
+            container_id=str(album_id),
+            files=get_manifest(3),
+            create_nodes=True,
+            parent_id=folder.id,
+        )
+    )
+
+    children = await provider.get_node_children(folder.id)
+
+    assert sorted(node.name for node in children) == ["0.jpg", "1.jpg", "2.jpg"]
+
+    for index, target in enumerate(output.files):
+        assert target.node is not None
+        assert target.node.name == f"{index}.jpg"
+        assert target.node.file_id == target.file_id
+        assert target.node.file_size == 100 + index
+        assert target.node.node_type == FileSystemNodeType.FILE
+        assert target.node.processing is True
+
+
+@pytest.mark.asyncio
+async def test_initialize_uploads_validation(tmp_path):
+    handler, blobs_service, provider, album_id = await get_handler(tmp_path)
+
+    with pytest.raises(InvalidArgument):
+        await handler.initialize_uploads(
+            InitializeUploadsInput(container_id=str(album_id), files=get_manifest(1001))
+        )
+
+    with pytest.raises(InvalidArgument):
+        await handler.initialize_uploads(
+            InitializeUploadsInput(
+                container_id="not-an-album", files=get_manifest(1), create_nodes=True
+            )
+        )
+
+
+@pytest.mark.asyncio
+async def test_initialize_uploads_skips_stored_contents(tmp_path):
+    handler, blobs_service, provider, album_id = await get_handler(
+        tmp_path, content_deduplication=True
+    )
+    manifest = get_manifest(3)
+
+    for index, item in enumerate(manifest):
+        item.content_hash = get_hash(index)
+
+    first = await handler.initialize_uploads(
+        InitializeUploadsInput(
+            container_id=str(album_id), files=manifest, create_nodes=True
+        )
+    )
+
+    assert all(target.uploaded is False for target in first.files)
+    assert len(blobs_service.signed) == 3
+
+    # the same files are uploaded again, with a new file and a repeated one
+    second_manifest = get_manifest(5)
+
+    for index, item in enumerate(second_manifest):
+        item.content_hash = get_hash(index if index < 4 else 3)
+
+    second = await handler.initialize_uploads(
+        InitializeUploadsInput(
+            container_id=str(album_id), files=second_manifest, create_nodes=True
+        )
+    )
+
+    assert [target.uploaded for target in second.files] == [
+        True,
+        True,
+        True,
+        False,
+        True,
+    ]
+    assert len(blobs_service.signed) == 4
+
+    for target, previous in zip(second.files[:3], first.files):
+        assert target.file_id == previous.file_id
+        assert target.file_name == previous.file_name
+        assert target.token == ""
+
+    assert second.files[4].file_id == second.files[3].file_id
+
+    for target in second.files:
+        assert target.node is not None
+        assert target.node.file_id == target.file_id
+
+    assert len(await provider.get_album_nodes(album_id)) == 8
+
+
+@pytest.mark.asyncio
+async def test_initialize_uploads_content_hash_validation(tmp_path):
+    item = UploadManifestFile(
+        file_name="a.jpg", file_size=1, file_type="image/jpeg", content_hash="A" * 64
+    )
+    assert item.content_hash == "a" * 64
+
+    with pytest.raises(ValueError):
+        UploadManifestFile(
+            file_name="a.jpg", file_size=1, file_type="image/jpeg", content_hash="x"
+        )
@@ -0,0 +1,204 @@
+from uuid import uuid4
+
+import pytest
+
+from data.queues.sqlite import SQLitePicturesQueue
+from data.sql.contents import SQLContentsDataProvider
+from data.sql.vfs import SQLFileSystemDataProvider
+from domain.vfs import CreateNodeInput, FileSystemHandler, FileSystemNodeType
+from tests.db import create_album, create_session
+from tests.fakes import (
+    FakeBlobsService,
+    FakePicturesHandler,
+    get_changes_log,
+    get_settings,
+)
+
+
+@pytest.mark.asyncio
+async def test_create_nodes_processes_pictures_concurrently(tmp_path):
+    session = await create_session(tmp_path / "test.db")
+    album_id = await create_album(session)
+    pictures_handler = FakePicturesHandler()
+    handler = FileSystemHandler(
+        SQLFileSystemDataProvider(session),
+        SQLContentsDataProvider(session),
+        FakeBlobsService(),  # type: ignore
+        pictures_handler,  # type: ignore
+        SQLitePicturesQueue(str(tmp_path / "queue.db")),
+        get_settings(image_processing_concurrency=3),
+        get_changes_log(session),
+    )
+
+    data = [
+        CreateNodeInput(
+            name=f"{i}.jpg",
+            album_id=album_id,
+            parent_id=None,
+            file_id="broken" if i == 4 else str(uuid4()),
+            file_size=100,
+            file_mime="image/jpeg",
+            node_type=FileSystemNodeType.FILE,
+        )
+        for i in range(10)
+    ] + [CreateNodeInput(name="Folder", album_id=album_id, parent_id=None)]
+
+    nodes = await handler.create_nodes(data)
+
+    assert pictures_handler.max_running == 3
+    assert [node.name for node in nodes] == [item.name for item in data]
+
+    for index, node in enumerate(nodes[:10]):
+        if index == 4:
+            assert node.image is None
+        else:
+            assert node.image is not None
+            assert node.image.medium_image_name == f"m-{node.file_id}.jpg"
+            assert node.image.image_width == 4000
+
+    assert nodes[10].node_type == FileSystemNodeType.FOLDER
+    assert nodes[10].image is None
+
+
+@pytest.mark.asyncio
+async def test_create_nodes_enqueues_pictures_in_background_mode(tmp_path):
+    session = await create_session(tmp_path / "test.db")
+    album_id = await create_album(session)
+    pictures_handler = FakePicturesHandler()
+    queue = SQLitePicturesQueue(str(tmp_path / "queue.db"))
+    await queue.initialize()
+
+    try:
+        handler = FileSystemHandler(
+            SQLFileSystemDataProvider(session),
+            SQLContentsDataProvider(session),
+            FakeBlobsService(),  # type: ignore
+            pictures_handler,  # type: ignore
+            queue,
+            get_settings(background_pictures_processing=True),
+            get_changes_log(session),
+        )
+
+        file_id = str(uuid4())
+        nodes = await handler.create_nodes(
+            [
+                CreateNodeInput(
+                    name="1.jpg",
+                    album_id=album_id,
+                    parent_id=None,
+                    file_id=file_id,
+                    file_size=100,
+                    file_mime="image/jpeg",
+                    node_type=FileSystemNodeType.FILE,
+                ),
+                CreateNodeInput(name="Folder", album_id=album_id, parent_id=None),
+            ]
+        )
+
+        assert pictures_handler.max_running == 0
+        assert nodes[0].processing is True
+        assert nodes[0].image is None
+        assert nodes[1].processing is False
+
+        task = await queue.claim()
+        assert task is not None
+        assert task.node_id == nodes[0].id
+        assert task.container_name == str(album_id)
+        assert task.file_name == f"{file_id}.jpg"
+        assert await queue.claim() is None
+
+        stored = await SQLFileSystemDataProvider(session).get_node(nodes[0].id, False)
+        assert stored.processing is True
+
+    finally:
+        await queue.dispose()
+
+
+class FailingPicturesQueue:
+    async def enqueue(self, tasks) -> None:
+        raise ConnectionError("The queue is not available")
+
+
+@pytest.mark.asyncio
+async def test_create_nodes_processes_pictures_if_they_cannot_be_enqueued(tmp_path):
+    session = await create_session(tmp_path / "test.db")
+    album_id = await create_album(session)
+    provider = SQLFileSystemDataProvider(session)
+    handler = FileSystemHandler(
+        provider,
+        SQLContentsDataProvider(session),
+        FakeBlobsService(),  # type: ignore
+        FakePicturesHandler(),  # type: ignore
+        FailingPicturesQueue(),  # type: ignore
+        get_settings(background_pictures_processing=True),
+        get_changes_log(session),
+    )
+
+    nodes = await handler.create_nodes(
+        [
+            CreateNodeInput(
+                name="1.jpg",
+                album_id=album_id,
+                parent_id=None,
+                file_id=str(uuid4()),
+                file_size=100,
+                file_mime="image/jpeg",
+                node_type=FileSystemNodeType.FILE,
+            )
+        ]
+    )
+
+    stored = await provider.get_node(nodes[0].id, False)
+    assert stored.processing is False
+    assert stored.image is not None
+
+
+@pytest.mark.asyncio
+async def test_reserve_nodes_and_process_pictures(tmp_path):
+    session = await create_session(tmp_path / "test.db")
+    album_id = await create_album(session)
+    pictures_handler = FakePicturesHandler()
+    provider = SQLFileSystemDataProvider(session)
+    handler = FileSystemHandler(
+        provider,
+        SQLContentsDataProvider(session),
+        FakeBlobsService(),  # type: ignore
+        pictures_handler,  # type: ignore
+        SQLitePicturesQueue(str(tmp_path / "queue.db")),
+        get_settings(),
+        get_changes_log(session),
+    )
+
+    nodes = await handler.reserve_nodes(
+        [
+            CreateNodeInput(
+                name=f"{i}.jpg",
+                album_id=album_id,
+                parent_id=None,
+                file_id=str(uuid4()),
+                file_size=100,
+                file_mime="image/jpeg" if i < 3 else "audio/mpeg",
+                node_type=FileSystemNodeType.FILE,
+            )
+            for i in range(4)
+        ]
+    )
+
+    assert pictures_handler.max_running == 0
+    assert [node.processing for node in nodes] == [True, True, True, False]
+
+    processed = await handler.process_pictures([node.id for node in nodes])
+
+    assert sorted(node.id for node in processed) == sorted(
+        node.id for node in nodes[:3]
+    )
+
+    for node in nodes[:3]:
+        stored = await provider.get_node(node.id, False)
+        assert stored is not None
+        assert stored.processing is False
+        assert stored.image is not None
+        assert stored.image.medium_image_name == f"m-{node.file_id}.jpg"
+
+    # pictures already processed are ignored
+    assert await handler.process_pictures([nodes[0].id]) == []